@@ -25,6 +25,7 @@ from txrestserver.access.access import OpenAccessConfig
 from txrestserver.access.basic_access import BasicAccessConfig
 from txrestserver.access.digest_access import DigestAccessConfig
 from txrestserver.access.tls_access import TlsSrpAccessConfig
+from txrestserver.access.token_access import WebTokenAccessConfig
 from txrestserver.realm.checkers import PasswordDictChecker, CryptedPasswordDictChecker, \
     UNIXPasswordDatabaseChecker
 
@@ -100,6 +101,11 @@ _encrypted_cfg = {
 #
 #        curl -4 --digest --user <username>:<password> http://localhost:8888/version
 #
+#   For Web Token authentication, get a token once and pass it with each request:
+#
+#        curl -4 -X POST --user <username>:<password> http://localhost:8888/token
+#        curl -4 -H 'Authorization: Bearer <access_token>' http://localhost:8888/version
+#
 if __name__ == '__main__':
     #
     # Set up access method and credential checker based on command line.  Not all checkers
@@ -136,9 +142,9 @@ if __name__ == '__main__':
     #
     elif config_type == '--tls-srp':
         config = TlsSrpAccessConfig(checker)
-    #
-    # elif config_type == '--webtoken':
-    #     config = WebTokenAccessConfig()
+
+    elif config_type == '--webtoken':
+        config = WebTokenAccessConfig(checker)
     #
     # elif config_type == '--oauth':
     #     config = TODOCanThisBeSupported()
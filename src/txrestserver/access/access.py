@@ -22,7 +22,7 @@ class AuthenticationMethods(IntEnum):
     Digest = 2
     TLS = 3
     TLS_SRP = 4
-    WebToken = 4
+    WebToken = 5
 
 
 DEFAULT_ACCESS_CONTROL = AuthenticationMethods.Open
@@ -33,8 +33,10 @@ class AccessConfig:
     """ Base class for Authentication Access configuration """
     def __init__(self, access_type=DEFAULT_ACCESS_CONTROL, checker=None):
         if access_type not in (AuthenticationMethods.Open, AuthenticationMethods.Basic,
-                               AuthenticationMethods.Digest, AuthenticationMethods.TLS_SRP):
-            raise NotImplementedError('Only Open, Basic, Digest, and TLS-SRP authentication supported at this time')
+                               AuthenticationMethods.Digest, AuthenticationMethods.TLS_SRP,
+                               AuthenticationMethods.WebToken):
+            raise NotImplementedError('Only Open, Basic, Digest, TLS-SRP and Web Token authentication '
+                                      'supported at this time')
 
         self._type = access_type
         self._checker = checker
@@ -0,0 +1,446 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Web token (JWT) access
+
+A client logs in once with its username and password at the token endpoint
+and receives a signed, expiring HS256 JSON Web Token.  Further requests carry
+it as 'Authorization: Bearer <token>' and are authenticated with one HMAC
+check instead of a password hash verification:
+
+    curl -X POST --user admin:admin http://localhost:8888/token
+    curl -H 'Authorization: Bearer eyJ...' http://localhost:8888/version
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from twisted.cred import error as credError
+from twisted.cred.checkers import ICredentialsChecker
+from twisted.cred.credentials import ICredentials
+from twisted.cred.portal import IRealm, Portal
+from twisted.internet import defer
+from twisted.web.guard import BasicCredentialFactory, HTTPAuthSessionWrapper
+from twisted.web.iweb import ICredentialFactory
+from twisted.web.resource import IResource, Resource
+from zope.interface import implementer, Attribute
+
+# pylint: disable=relative-beyond-top-level        # TODO: work on this later
+from .access import AccessConfig, AuthenticationMethods, DEFAULT_AUTH_REALM
+from ..realm.realm import Realm
+
+DEFAULT_TOKEN_TTL = 3600            # Seconds
+DEFAULT_TOKEN_PATH = b'token'
+
+
+class InvalidToken(Exception):
+    """ A web token is malformed, has a bad signature, has expired or was revoked """
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def _encode_json(value):
+    return _b64encode(json.dumps(value, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+
+def _decode_json(data):
+    try:
+        value = json.loads(_b64decode(data))
+
+    except (ValueError, TypeError) as ex:
+        raise InvalidToken('Malformed token') from ex
+
+    if not isinstance(value, dict):
+        raise InvalidToken('Malformed token')
+    return value
+
+
+class WebTokenSigner:
+    """
+    Issues and verifies HS256 JSON Web Tokens
+
+    Several keys can be active at once, each identified by the 'kid' header
+    of the tokens it signed.  To rotate keys, add the new key as the signing
+    key, and remove the old one once the tokens it signed have expired.
+
+    Revoked tokens are remembered by their ID only until they would have
+    expired anyway, and revoking all tokens of a user takes a single
+    timestamp, so the revocation list stays small.
+    """
+    def __init__(self, keys, signing_key=None, ttl=DEFAULT_TOKEN_TTL, timer=time.time):
+        """
+        Signer initialization
+
+        :param keys: (dict) key-id -> secret (bytes, at least 32 bytes recommended)
+        :param signing_key: (str) ID of the key new tokens are signed with, default is
+                            the first key
+        :param ttl: (int) Seconds a token remains valid
+        :param timer: (callable) Clock, returns seconds since the epoch
+        """
+        if not keys:
+            raise ValueError('At least one signing key is required')
+
+        self._keys = {}
+        for kid, secret in keys.items():
+            self.add_key(kid, secret)
+
+        self._signing_key = next(iter(self._keys)) if signing_key is None else signing_key
+        if self._signing_key not in self._keys:
+            raise ValueError('Unknown signing key {!r}'.format(self._signing_key))
+
+        self._ttl = ttl
+        self._max_ttl = ttl             # Of the tokens issued, bounds how long revocations are needed
+        self._timer = timer
+        self._revoked = {}              # token-id -> expiration
+        self._revoked_before = {}       # subject -> tokens issued before this time are revoked
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+
+    @property
+    def ttl(self):
+        """ Seconds a token remains valid """
+        return self._ttl
+
+    @property
+    def signing_key(self):
+        """ ID of the key new tokens are signed with """
+        return self._signing_key
+
+    @property
+    def stats(self):
+        """ Signer statistics """
+        return {
+            'keys': len(self._keys),
+            'issued': self.issued,
+            'verified': self.verified,
+            'rejected': self.rejected,
+            'revoked': len(self._revoked),
+        }
+
+    def add_key(self, kid, secret, signing=False):
+        """
+        Add a key, tokens signed with it are accepted from now on
+
+        :param kid: (str) Key ID
+        :param secret: (bytes) Secret
+        :param signing: (bool) Sign new tokens with this key
+        """
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        if not secret:
+            raise ValueError('Signing keys cannot be empty')
+
+        self._keys[kid] = secret
+        if signing:
+            self._signing_key = kid
+
+    def remove_key(self, kid):
+        """ Remove a key, tokens signed with it are no longer accepted """
+        if kid == self._signing_key:
+            raise ValueError('The signing key cannot be removed')
+        self._keys.pop(kid, None)
+
+    def _signature(self, kid, signing_input):
+        return _b64encode(hmac.new(self._keys[kid], signing_input, hashlib.sha256).digest())
+
+    def issue(self, subject, ttl=None, **claims):
+        """
+        Issue a token
+
+        :param subject: (bytes or str) Avatar ID, usually the username
+        :param ttl: (int) Seconds the token remains valid, default is the signer's ttl
+        :param claims: (dict) Additional claims
+        :return: (bytes) Token
+        """
+        if isinstance(subject, bytes):
+            subject = subject.decode('utf-8')
+
+        now = int(self._timer())
+        ttl = self._ttl if ttl is None else ttl
+        self._max_ttl = max(self._max_ttl, ttl)
+        payload = dict(claims, sub=subject, iat=now, exp=now + ttl,
+                       jti=_b64encode(os.urandom(12)).decode('ascii'))
+
+        kid = self._signing_key
+        signing_input = _encode_json({'alg': 'HS256', 'typ': 'JWT', 'kid': kid}) + b'.' + _encode_json(payload)
+        self.issued += 1
+        return signing_input + b'.' + self._signature(kid, signing_input)
+
+    def verify(self, token):
+        """
+        Verify a token
+
+        :param token: (bytes) Token
+        :return: (dict) Claims of the token
+        :raises: InvalidToken
+        """
+        try:
+            claims = self._verify(token)
+
+        except InvalidToken:
+            self.rejected += 1
+            raise
+
+        self.verified += 1
+        return claims
+
+    def _verify(self, token):
+        if isinstance(token, str):
+            token = token.encode('ascii')
+
+        parts = token.split(b'.')
+        if len(parts) != 3:
+            raise InvalidToken('Malformed token')
+
+        header = _decode_json(parts[0])
+        # Only our own algorithm is accepted, never 'none' or a public key algorithm
+        kid = header.get('kid')
+        if header.get('alg') != 'HS256' or not isinstance(kid, str) or kid not in self._keys:
+            raise InvalidToken('Unsupported token algorithm or key')
+
+        signing_input = token.rsplit(b'.', 1)[0]
+        if not hmac.compare_digest(self._signature(kid, signing_input), parts[2]):
+            raise InvalidToken('Bad token signature')
+
+        claims = _decode_json(parts[1])
+        now = self._timer()
+        try:
+            expired = claims['exp'] <= now
+            revoked = claims['jti'] in self._revoked or \
+                claims['iat'] < self._revoked_before.get(claims['sub'], float('-inf'))
+
+        except (KeyError, TypeError) as ex:
+            raise InvalidToken('Malformed token') from ex
+
+        if expired:
+            raise InvalidToken('Token expired')
+        if revoked:
+            raise InvalidToken('Token revoked')
+        return claims
+
+    def revoke(self, token):
+        """
+        Revoke a token.  Tokens that do not verify are ignored.
+
+        :param token: (bytes) Token
+        """
+        try:
+            claims = self._verify(token)
+
+        except InvalidToken:
+            return
+
+        self._prune()
+        self._revoked[claims['jti']] = claims['exp']
+
+    def revoke_subject(self, subject):
+        """ Revoke all tokens issued to a subject (user) so far """
+        if isinstance(subject, bytes):
+            subject = subject.decode('utf-8')
+
+        # Tokens carry whole seconds, so those issued later in this second are revoked too
+        self._revoked_before[subject] = int(self._timer()) + 1
+        self._prune()
+
+    def _prune(self):
+        """ Forget revocations of tokens that have expired anyway """
+        now = self._timer()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        self._revoked_before = {sub: before for sub, before in self._revoked_before.items()
+                                if before + self._max_ttl > now}
+
+
+class ITokenCredentials(ICredentials):             # pylint: disable=inherit-non-class,too-many-ancestors
+    """ A bearer token """
+    token = Attribute('The token (bytes)')
+
+
+@implementer(ITokenCredentials)
+class TokenCredentials:
+    """ Bearer token credentials """
+    def __init__(self, token):
+        self.token = token
+
+
+@implementer(ICredentialFactory)
+class BearerCredentialFactory:
+    """ Reads 'Authorization: Bearer <token>' request headers """
+    scheme = b'bearer'
+
+    def __init__(self, auth_realm=DEFAULT_AUTH_REALM):
+        self._auth_realm = auth_realm
+
+    def getChallenge(self, _request):                   # pylint: disable=invalid-name
+        """ WWW-Authenticate parameters of the 401 response """
+        return {'realm': self._auth_realm}
+
+    @staticmethod
+    def decode(response, _request):
+        """ Credentials of the Authorization header value that follows the scheme """
+        token = response.strip()
+        if not token:
+            raise credError.LoginFailed('Missing bearer token')
+        return TokenCredentials(token)
+
+
+@implementer(ICredentialsChecker)
+class TokenChecker:
+    """ Credentials checker for bearer tokens, the avatar ID is the token subject """
+    credentialInterfaces = (ITokenCredentials,)
+
+    def __init__(self, signer):
+        """
+        :param signer: (WebTokenSigner) Verifies the tokens
+        """
+        self._signer = signer
+
+    def requestAvatarId(self, credentials):              # pylint: disable=invalid-name
+        """
+        Validate credentials and produce an avatar ID.
+
+        :param credentials: (TokenCredentials) Bearer token
+        :return: (Deferred) Fires with the avatar ID (bytes), or fails with UnauthorizedLogin
+        """
+        try:
+            claims = self._signer.verify(credentials.token)
+
+        except InvalidToken as ex:
+            return defer.fail(credError.UnauthorizedLogin(str(ex)))
+
+        return defer.succeed(claims['sub'].encode('utf-8'))
+
+
+class TokenIssuerResource(Resource):
+    """ Issues a token to an authenticated user with a POST request """
+    isLeaf = True
+
+    def __init__(self, signer, avatar_id):
+        super().__init__()
+        self._signer = signer
+        self._avatar_id = avatar_id
+
+    def render_POST(self, request):                    # pylint: disable=invalid-name
+        """ Returns the token in an OAuth 2 style token response """
+        token = self._signer.issue(self._avatar_id)
+        request.responseHeaders.addRawHeader(b'content-type', b'application/json')
+        request.responseHeaders.addRawHeader(b'cache-control', b'no-store')
+        return json.dumps({
+            'access_token': token.decode('ascii'),
+            'token_type': 'Bearer',
+            'expires_in': self._signer.ttl,
+        }).encode('utf-8')
+
+
+@implementer(IRealm)
+class _TokenIssuerRealm:
+    """ Realm of the token path, the avatar of an authenticated user is a TokenIssuerResource """
+    def __init__(self, signer):
+        self._signer = signer
+
+    def requestAvatar(self, avatar_id, _mind, *interfaces):         # pylint: disable=invalid-name
+        """
+        Return avatar which provides one of the given interfaces.
+
+        @param avatar_id: a string that identifies an avatar, as returned by
+            L{ICredentialsChecker.requestAvatarId<twisted.cred.checkers.ICredentialsChecker.requestAvatarId>}
+            (via a Deferred).
+        @param _mind: usually None.  See the description of mind in L{Portal.login}.
+        @param interfaces: the interface(s) the returned avatar should implement.
+                           Only C{IResource} is supported.
+
+        @returns: a tuple of (interface, avatarAspect, logout).  The avatarAspect
+            is a L{TokenIssuerResource} that issues tokens to C{avatar_id}.
+        """
+        if IResource in interfaces:
+            return IResource, TokenIssuerResource(self._signer, avatar_id), lambda: None
+
+        raise NotImplementedError("None of the requested interfaces are supported")
+
+
+class _WebTokenResource(Resource):
+    """ Sends requests for the token path to the token issuer and all others to the API """
+    def __init__(self, token_path, issuer, api):
+        super().__init__()
+        self._token_path = token_path
+        self._issuer = issuer
+        self._api = api
+
+    def getChildWithDefault(self, path, request):         # pylint: disable=invalid-name
+        if path == self._token_path and not request.postpath:
+            return self._issuer.getChildWithDefault(path, request)
+        return self._api.getChildWithDefault(path, request)
+
+    def render(self, request):
+        return self._api.render(request)
+
+
+class WebTokenAccessConfig(AccessConfig):
+    """
+    Class to help simplify configuration of access credentials for the
+    Web Token (bearer JWT) access method
+
+    Tokens are issued at the token path (POST /token by default) to users who
+    authenticate there with HTTP Basic authentication against the checker.
+    The API itself accepts only bearer tokens.
+    """
+    def __init__(self, checker, signer=None, auth_realm=DEFAULT_AUTH_REALM, token_path=DEFAULT_TOKEN_PATH):
+        """
+        Initialize Web Token Access Configuration
+
+        :param checker: Credentials checker for the username and password login
+        :param signer: (WebTokenSigner) Issues and verifies tokens, default is a signer
+                       with a random key, so tokens do not survive a restart
+        :param auth_realm:  (bytes) Authentication Realm/domain
+        :param token_path: (bytes) Path of the token endpoint, which hides any API route
+                           with the same path
+        """
+        if checker is None:
+            raise ValueError('Web Token Authentication requires a credentials checker')
+
+        self._signer = signer if signer is not None else WebTokenSigner({'default': os.urandom(32)})
+        self._auth_realm = auth_realm
+        self._token_path = token_path
+        super().__init__(AuthenticationMethods.WebToken, checker)
+
+    @property
+    def signer(self):
+        """ Token signer, for key rotation and revocation """
+        return self._signer
+
+    def secure_resource(self, api_resource):
+        """
+        Wrap the provide API resource with an HTTP Authentication Session Wrapper
+
+        :param api_resource: API resource to wrap
+
+        :return: Resource, wrapped as requested
+        """
+        realm = Realm(api_resource, self._checker.users)
+        api = HTTPAuthSessionWrapper(Portal(realm, [TokenChecker(self._signer)]),
+                                     [BearerCredentialFactory(self._auth_realm)])
+
+        issuer = HTTPAuthSessionWrapper(Portal(_TokenIssuerRealm(self._signer), [self._checker]),
+                                        [BasicCredentialFactory(self._auth_realm)])
+
+        return _WebTokenResource(self._token_path, issuer, api)
@@ -0,0 +1,68 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Support for running the REST server on the asyncio event loop
+
+Twisted's asyncio reactor runs Twisted on top of an asyncio event loop so that
+'async def' route handlers can await asyncio-native libraries (database
+drivers and such).  The reactor has to be installed before anything imports
+twisted.internet.reactor, which includes txrestserver.rest_server:
+
+    from txrestserver.asyncio_reactor import install_asyncio_reactor
+    install_asyncio_reactor()
+
+    from txrestserver.rest_server import RestServer
+    server = RestServer(api=MyRestAPI(), asyncio_handlers=True)
+"""
+import asyncio
+import sys
+
+from twisted.internet.error import ReactorAlreadyInstalledError
+
+
+def install_asyncio_reactor(event_loop=None):
+    """
+    Install the Twisted asyncio reactor
+
+    :param event_loop: (asyncio.AbstractEventLoop) Event loop to run on, by default
+                       a new event loop, which is also made the current one
+    :return: The reactor
+    """
+    if 'twisted.internet.reactor' in sys.modules:
+        if is_asyncio_reactor():
+            return sys.modules['twisted.internet.reactor']
+        raise ReactorAlreadyInstalledError('A reactor other than the asyncio reactor is already '
+                                           'installed, install_asyncio_reactor() must be called '
+                                           'before twisted.internet.reactor is imported')
+
+    # Imported here, this module is imported before a reactor is installed
+    from twisted.internet import asyncioreactor     # pylint: disable=import-outside-toplevel
+
+    if event_loop is None:
+        event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(event_loop)
+
+    asyncioreactor.install(event_loop)
+    return sys.modules['twisted.internet.reactor']
+
+
+def is_asyncio_reactor():
+    """ True if the installed reactor runs on an asyncio event loop """
+    reactor = sys.modules.get('twisted.internet.reactor')
+    if reactor is None:
+        return False
+
+    # Only needed once a reactor is installed
+    from twisted.internet.asyncioreactor import AsyncioSelectorReactor  # pylint: disable=import-outside-toplevel
+    return isinstance(reactor, AsyncioSelectorReactor)
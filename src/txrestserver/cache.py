@@ -0,0 +1,132 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Size bounded, least-recently-used cache that keeps hit/miss counters.
+    Entries optionally expire a fixed time after they were added.
+    """
+
+    def __init__(self, max_size, ttl=None, timer=time.monotonic):
+        """
+        Cache initialization
+
+        :param max_size: (int) Maximum number of entries to keep
+        :param ttl: (float) Seconds an entry remains valid, None if entries do not expire
+        :param timer: (callable) Clock used for expiration, returns seconds
+        """
+        if max_size <= 0:
+            raise ValueError('Cache size must be greater than zero')
+
+        if ttl is not None and ttl <= 0:
+            raise ValueError('Cache time-to-live must be greater than zero')
+
+        self._max_size = max_size
+        self._ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()       # key -> value, or (expiration, value) if ttl is set
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        if self._ttl is None:
+            return key in self._entries
+
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self._timer()
+
+    def __iter__(self):
+        """ Iterate over the keys, least recently used first.  May include expired keys """
+        return iter(list(self._entries))
+
+    @property
+    def max_size(self):
+        """ Maximum number of entries in the cache """
+        return self._max_size
+
+    @property
+    def ttl(self):
+        """ Seconds an entry remains valid, None if entries do not expire """
+        return self._ttl
+
+    @property
+    def stats(self):
+        """ Cache statistics """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self._entries),
+            'max_size': self._max_size,
+        }
+
+    def get(self, key, default=None):
+        """
+        Look up an entry and mark it as the most recently used
+
+        :param key: Cache key
+        :param default: Value to return if the key is not cached
+        """
+        try:
+            value = self._entries[key]
+
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if self._ttl is not None:
+            expiration, value = value
+            if expiration <= self._timer():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Add or replace an entry, evicting the least recently used entry if full """
+        entries = self._entries
+        entries[key] = value if self._ttl is None else (self._timer() + self._ttl, value)
+        entries.move_to_end(key)
+
+        if len(entries) > self._max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        """ Remove an entry """
+        value = self._entries.pop(key, _MISSING)
+        if value is _MISSING:
+            return default
+        return value if self._ttl is None else value[1]
+
+    def clear(self):
+        """ Remove all entries.  Counters are preserved """
+        self._entries.clear()
@@ -0,0 +1,143 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, succeed
+from twisted.protocols.policies import WrappingFactory
+from twisted.python import log as twlog
+
+DEFAULT_STOP_TIMEOUT = 30.0
+
+
+class ConnectionTracker(WrappingFactory):
+    """
+    Tracks the open connections and in-flight requests of a Site so that a
+    server can be stopped without abandoning requests.
+
+    Listen with the tracker in place of the Site.  drain() closes idle
+    keep-alive connections at once, closes busy ones as soon as their last
+    request completes, and aborts whatever is left when the timeout expires.
+    """
+    def __init__(self, site, clock=reactor):
+        """
+        Tracker initialization
+
+        :param site: (Site) Site to track, its request factory is wrapped
+        :param clock: (IReactorTime) Used for the drain timeout
+        """
+        super().__init__(site)
+        self._clock = clock
+        self._in_flight = {}            # connection -> number of requests
+        self._draining = False
+        self._drained = []
+        self.requests = 0
+        self.aborted = 0
+
+        request_factory = site.requestFactory
+
+        def tracked_request(channel, queued):
+            request = request_factory(channel, queued)
+            self._request_started(request)
+            return request
+
+        site.requestFactory = tracked_request
+
+    @property
+    def connections(self):
+        """ Number of open connections """
+        return len(self.protocols)
+
+    @property
+    def in_flight(self):
+        """ Number of requests that have not completed """
+        return sum(self._in_flight.values())
+
+    @property
+    def stats(self):
+        """ Tracker statistics """
+        return {
+            'connections': len(self.protocols),
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'aborted': self.aborted,
+        }
+
+    def _request_started(self, request):
+        # The channel's transport is our ProtocolWrapper for the connection
+        connection = request.channel.transport
+        self._in_flight[connection] = self._in_flight.get(connection, 0) + 1
+        self.requests += 1
+        request.notifyFinish().addBoth(self._request_finished, connection)
+
+    def _request_finished(self, _, connection):
+        remaining = self._in_flight.get(connection, 1) - 1
+        if remaining > 0:
+            self._in_flight[connection] = remaining
+        else:
+            self._in_flight.pop(connection, None)
+            if self._draining:
+                connection.loseConnection()
+
+    def unregisterProtocol(self, p):            # pylint: disable=invalid-name
+        super().unregisterProtocol(p)
+        self._in_flight.pop(p, None)
+
+        if self._draining and not self.protocols:
+            drained, self._drained = self._drained, []
+            for d in drained:
+                d.callback(None)
+
+    def drain(self, timeout=DEFAULT_STOP_TIMEOUT):
+        """
+        Close all connections once their requests have completed.  Stop
+        listening first so that no new connections arrive.
+
+        :param timeout: (float) Seconds to wait before aborting the remaining connections
+        :return: (Deferred) Fires with the number of requests that were aborted
+        """
+        self._draining = True
+        if not self.protocols:
+            return succeed(0)
+
+        for connection in list(self.protocols):
+            if connection not in self._in_flight:
+                connection.loseConnection()
+
+        if not self.protocols:
+            # The connections were lost synchronously
+            return succeed(0)
+
+        drained = Deferred()
+        self._drained.append(drained)
+
+        aborted = []
+
+        def abort():
+            aborted.append(self.in_flight)
+            self.aborted += aborted[0]
+            if aborted[0]:
+                twlog.msg('Aborting {} request(s) still in progress after {} second(s)'.format(
+                    aborted[0], timeout))
+
+            for connection in list(self.protocols):
+                connection.abortConnection()
+
+        abort_call = self._clock.callLater(timeout, abort)
+
+        def done(_):
+            if abort_call.active():
+                abort_call.cancel()
+            return aborted[0] if aborted else 0
+
+        return drained.addCallback(done)
@@ -0,0 +1,162 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+DEFAULT_POOL_SIZE = 4
+
+
+class WorkerPool:
+    """ Bounded thread pool that is started on first use and stopped with the reactor """
+
+    def __init__(self, name, max_threads=DEFAULT_POOL_SIZE):
+        """
+        Pool initialization
+
+        :param name: (str) Pool name, used for thread names and statistics
+        :param max_threads: (int) Maximum number of worker threads
+        """
+        if max_threads <= 0:
+            raise ValueError('A worker pool requires at least one thread')
+
+        self._name = name
+        self._max_threads = max_threads
+        self._pool = None
+        self._shutdown_trigger = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def name(self):
+        """ Pool name """
+        return self._name
+
+    @property
+    def max_threads(self):
+        """ Maximum number of worker threads """
+        return self._max_threads
+
+    @max_threads.setter
+    def max_threads(self, max_threads):
+        if max_threads <= 0:
+            raise ValueError('A worker pool requires at least one thread')
+
+        self._max_threads = max_threads
+        if self._pool is not None:
+            self._pool.adjustPoolsize(minthreads=0, maxthreads=max_threads)
+
+    @property
+    def pending(self):
+        """ Number of calls submitted that have not completed """
+        return self.submitted - self.completed - self.failed
+
+    @property
+    def stats(self):
+        """ Pool statistics """
+        return {
+            'max_threads': self._max_threads,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'pending': self.pending,
+        }
+
+    def run(self, f, *args, **kwargs):
+        """
+        Call a function in a worker thread
+
+        :param f: (callable) Function to call
+        :return: (Deferred) Fires on the reactor thread with the result of the call
+        """
+        if self._pool is None:
+            self._pool = ThreadPool(minthreads=0, maxthreads=self._max_threads,
+                                    name='txrestserver-{}'.format(self._name))
+            self._pool.start()
+            self._shutdown_trigger = reactor.addSystemEventTrigger('during', 'shutdown',   # pylint: disable=no-member
+                                                                   self._shutdown)
+        self.submitted += 1
+        d = deferToThreadPool(reactor, self._pool, f, *args, **kwargs)
+        d.addCallbacks(self._completed, self._failed)
+        return d
+
+    def _completed(self, result):
+        self.completed += 1
+        return result
+
+    def _failed(self, reason):
+        self.failed += 1
+        return reason
+
+    def _shutdown(self):
+        self._shutdown_trigger = None
+        self.stop()
+
+    def stop(self):
+        """ Stop the worker threads.  The pool restarts if it is used again """
+        pool, self._pool = self._pool, None
+        trigger, self._shutdown_trigger = self._shutdown_trigger, None
+
+        if trigger is not None:
+            reactor.removeSystemEventTrigger(trigger)                # pylint: disable=no-member
+
+        if pool is not None:
+            pool.stop()
+
+
+class WorkerPools:
+    """ A collection of named worker pools, created as they are first needed """
+
+    def __init__(self, sizes=None, default_size=DEFAULT_POOL_SIZE):
+        """
+        Initialization
+
+        :param sizes: (dict) pool-name -> maximum number of threads
+        :param default_size: (int) Maximum number of threads for pools not in 'sizes'
+        """
+        self._sizes = dict(sizes or {})
+        self._default_size = default_size
+        self._pools = {}
+
+    def __contains__(self, name):
+        return name in self._pools
+
+    @property
+    def stats(self):
+        """ pool-name -> pool statistics """
+        return {name: pool.stats for name, pool in self._pools.items()}
+
+    def configure(self, name, max_threads):
+        """ Set the maximum number of threads of a named pool """
+        self._sizes[name] = max_threads
+        pool = self._pools.get(name)
+        if pool is not None:
+            pool.max_threads = max_threads
+
+    def get(self, name):
+        """ Get a named pool, creating it if needed """
+        pool = self._pools.get(name)
+        if pool is None:
+            pool = self._pools[name] = WorkerPool(name, self._sizes.get(name, self._default_size))
+        return pool
+
+    def stop(self):
+        """ Stop all pools """
+        for pool in self._pools.values():
+            pool.stop()
+
+
+DEFAULT_POOLS = WorkerPools()
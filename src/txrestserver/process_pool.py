@@ -0,0 +1,235 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Process pool for CPU-bound route handlers
+
+Threads do not help handlers that spend their time in Python code because of
+the GIL, so these run in worker processes instead.  A handler run in a process
+receives a ProcessRequest, a picklable copy of the parts of the request it may
+need, and must itself be picklable: a module level function or a staticmethod.
+"""
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.python import log as twlog
+from twisted.python.failure import Failure
+
+DEFAULT_START_METHOD = 'spawn'      # Forking a process with a running reactor is not safe
+
+
+class ProcessRequest:
+    """ Picklable view of a request, passed to handlers run in a ProcessPool """
+    __slots__ = ('method', 'path', 'args', 'headers', 'content', 'avatar_id', 'client')
+
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.args = dict(request.args)
+        # Raw header names are capitalized, getHeader() looks them up in lower case
+        self.headers = {name.lower(): values for name, values in request.requestHeaders.getAllRawHeaders()}
+        self.avatar_id = getattr(request, 'avatar_id', None)
+
+        address = request.getClientAddress()
+        self.client = getattr(address, 'host', None)
+
+        content = getattr(request, 'content', None)
+        if content is not None:
+            content.seek(0)
+            self.content = content.read()
+            content.seek(0)
+        else:
+            self.content = b''
+
+    def getHeader(self, name):                  # pylint: disable=invalid-name
+        """ First value of a request header, like Request.getHeader() """
+        values = self.headers.get(name.lower() if isinstance(name, bytes) else name.lower().encode())
+        return values[0] if values else None
+
+
+def call_handler(handler, request, args, encoder=None):
+    """
+    Runs in the worker process.  The result is JSON encoded there so that only
+    bytes have to be sent back.
+    """
+    result = handler(request, **args)
+    return encoder.encode(result) if encoder is not None else result
+
+
+class ProcessPool:
+    """
+    Bounded pool of worker processes
+
+    Worker processes are recycled after 'max_tasks_per_worker' tasks each, on
+    average, to release memory that long running handlers leak or fragment.
+    A task that runs past its timeout fails with TimeoutError and, since a
+    running task cannot be interrupted, the processes of the pool are killed
+    and replaced.  Other tasks running at the time fail as well.
+    """
+    def __init__(self, max_workers=None, max_tasks_per_worker=None, timeout=None,
+                 start_method=DEFAULT_START_METHOD, clock=reactor):
+        """
+        Pool initialization
+
+        :param max_workers: (int) Maximum number of worker processes, default is the number of CPUs
+        :param max_tasks_per_worker: (int) Tasks run before the worker processes are replaced,
+                                     None to keep them
+        :param timeout: (float) Default number of seconds a task may take, including the time it
+                         waits for a worker.  None for no limit
+        :param start_method: (str) multiprocessing start method
+        :param clock: (IReactorTime) Used for task timeouts
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        if max_workers <= 0:
+            raise ValueError('A process pool requires at least one worker')
+
+        if max_tasks_per_worker is not None and max_tasks_per_worker <= 0:
+            raise ValueError('Workers must be allowed at least one task')
+
+        self._max_workers = max_workers
+        self._max_tasks_per_worker = max_tasks_per_worker
+        self._timeout = timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._clock = clock
+        self._executor = None
+        self._executor_tasks = 0
+        self._shutdown_trigger = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.recycled = 0
+        self.pending = 0
+        self.peak_pending = 0
+
+    @property
+    def max_workers(self):
+        """ Maximum number of worker processes """
+        return self._max_workers
+
+    @property
+    def stats(self):
+        """ Pool statistics.  'queued' tasks are waiting for a free worker """
+        return {
+            'max_workers': self._max_workers,
+            'max_tasks_per_worker': self._max_tasks_per_worker,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'recycled': self.recycled,
+            'pending': self.pending,
+            'peak_pending': self.peak_pending,
+            'queued': max(0, self.pending - self._max_workers),
+        }
+
+    def _get_executor(self):
+        executor = self._executor
+        if executor is not None and self._max_tasks_per_worker is not None and \
+                self._executor_tasks >= self._max_tasks_per_worker * self._max_workers:
+            self._retire(executor)
+            self.recycled += 1
+            executor = None
+
+        if executor is None:
+            executor = self._executor = ProcessPoolExecutor(self._max_workers, mp_context=self._context)
+            self._executor_tasks = 0
+            if self._shutdown_trigger is None:
+                self._shutdown_trigger = reactor.addSystemEventTrigger(     # pylint: disable=no-member
+                    'during', 'shutdown', self._shutdown)
+        return executor
+
+    def _retire(self, executor, kill=False):
+        """ Stop using an executor, tasks already submitted to it still complete unless killed """
+        if executor is self._executor:
+            self._executor = None
+
+        # The executor has no public way to stop a running task, and forgets its
+        # processes on shutdown
+        processes = list((getattr(executor, '_processes', None) or {}).values()) if kill else ()
+        executor.shutdown(wait=False)
+        for process in processes:
+            process.terminate()
+
+    def run(self, f, *args, timeout=None):
+        """
+        Call a function in a worker process.  The function, its arguments and
+        its result are pickled.
+
+        :param f: (callable) Function to call
+        :param timeout: (float) Seconds the call may take, default is the pool's timeout
+        :return: (Deferred) Fires on the reactor thread with the result of the call
+        """
+        executor = self._get_executor()
+        future = executor.submit(f, *args)
+        self._executor_tasks += 1
+        self.submitted += 1
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+
+        d = Deferred(lambda _: future.cancel())
+        timeout = self._timeout if timeout is None else timeout
+        expire = None if timeout is None else self._clock.callLater(timeout, self._expired, d,
+                                                                     executor, timeout)
+
+        def done(_):
+            reactor.callFromThread(self._done, future, d, expire)     # pylint: disable=no-member
+
+        future.add_done_callback(done)
+        return d
+
+    def _done(self, future, d, expire):
+        self.pending -= 1
+        if expire is not None and expire.active():
+            expire.cancel()
+
+        if future.cancelled():
+            return
+
+        if d.called:
+            return      # Timed out
+
+        exc = future.exception()
+        if exc is None:
+            self.completed += 1
+            d.callback(future.result())
+        else:
+            self.failed += 1
+            d.errback(Failure(exc))
+
+    def _expired(self, d, executor, timeout):
+        if d.called:
+            return
+
+        self.timed_out += 1
+        twlog.msg('Process pool task did not complete within {} second(s), replacing the workers'.format(timeout))
+        self._retire(executor, kill=True)
+        self.recycled += 1
+        d.errback(Failure(TimeoutError('Task did not complete within {} second(s)'.format(timeout))))
+
+    def _shutdown(self):
+        self._shutdown_trigger = None
+        self.stop()
+
+    def stop(self):
+        """ Stop the worker processes once their tasks complete.  The pool restarts if it is used again """
+        trigger, self._shutdown_trigger = self._shutdown_trigger, None
+        if trigger is not None:
+            reactor.removeSystemEventTrigger(trigger)                # pylint: disable=no-member
+
+        if self._executor is not None:
+            self._retire(self._executor)
@@ -13,16 +13,156 @@
 # limitations under the License.
 
 import copy
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+
+from collections import namedtuple
+from collections.abc import Mapping
+
 from twisted.internet import defer
 from twisted.cred import error as credError
 from twisted.cred.credentials import IUsernamePassword, IUsernameHashedPassword, \
     DigestedCredentials, UsernamePassword
 from twisted.cred.checkers import ICredentialsChecker
-from twisted.conch.checkers import UNIXPasswordDatabase, verifyCryptedPassword
+from twisted.conch.checkers import UNIXPasswordDatabase, verifyCryptedPassword, \
+    _pwdGetByName, _shadowGetByName
 from zope.interface import implementer
 
+from ..cache import LRUCache
+from ..pools import DEFAULT_POOLS
+from ..txrestapi.admission import AdmissionLimit, Overloaded
+
+try:
+    import pwd
+except ImportError:
+    pwd = None
+
 # TODO: Add the anonymous (anyone) credentials checker
 
+DEFAULT_CREDENTIAL_CACHE_TTL = 300          # Seconds
+DEFAULT_CREDENTIAL_CACHE_SIZE = 1024
+
+DEFAULT_ACCOUNT_CACHE_TTL = 60              # Seconds
+DEFAULT_ACCOUNT_CACHE_SIZE = 1024
+DEFAULT_ACCOUNT_FILES = ('/etc/passwd', '/etc/shadow')
+DEFAULT_ACCOUNT_STAT_INTERVAL = 1.0         # Seconds
+
+DEFAULT_VERIFY_POOL = 'auth'
+DEFAULT_VERIFY_CONCURRENCY = 4
+DEFAULT_VERIFY_QUEUE = 64
+
+_MISSING = object()
+
+# seteuid() and setegid() change the effective user of the whole process, not
+# of one thread, so lookups that switch to root must not overlap
+_EUID_LOCK = threading.Lock()
+
+
+def _timed(f, *args):
+    """ Runs in a worker thread, returns (result, seconds taken) """
+    started = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - started
+
+
+def _shadow_get_by_name(username):
+    """ conch's /etc/shadow lookup, which runs as root, one lookup at a time """
+    with _EUID_LOCK:
+        return _shadowGetByName(username)
+
+
+class HashVerifier:
+    """
+    Runs password hash verification in a bounded worker pool
+
+    Verifying a crypt hash takes long enough to stall every connection if done
+    on the reactor thread.  At most 'max_concurrent' verifications run at a
+    time and at most 'max_queued' wait for their turn; further logins are
+    refused at once so that a flood of bad logins cannot tie up the workers.
+    """
+    def __init__(self, pool=DEFAULT_VERIFY_POOL, worker_pools=DEFAULT_POOLS,
+                 max_concurrent=DEFAULT_VERIFY_CONCURRENCY, max_queued=DEFAULT_VERIFY_QUEUE):
+        """
+        Verifier initialization
+
+        :param pool: (str) Name of the worker pool that verifications run in
+        :param worker_pools: (WorkerPools) Worker pools
+        :param max_concurrent: (int) Maximum number of verifications running at once
+        :param max_queued: (int) Maximum number of verifications waiting to run
+        """
+        self._pool = pool
+        self._worker_pools = worker_pools
+        self._limit = AdmissionLimit(max_concurrent, max_queued)
+        self.verifications = 0
+        self.verify_time = 0.0
+        self.max_verify_time = 0.0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.rejected = 0
+
+    @property
+    def stats(self):
+        """ Verification statistics, times are in seconds.  Latency includes the time queued """
+        count = self.verifications
+        return {
+            'verifications': count,
+            'verify_time': self.verify_time,
+            'max_verify_time': self.max_verify_time,
+            'mean_verify_time': self.verify_time / count if count else 0.0,
+            'latency': self.latency,
+            'max_latency': self.max_latency,
+            'mean_latency': self.latency / count if count else 0.0,
+            'rejected': self.rejected,
+            'limit': self._limit.stats,
+        }
+
+    def run(self, f, *args):
+        """
+        Call a verification function in the worker pool
+
+        :param f: (callable) Verification function
+        :return: (Deferred) Fires with the result of the call, or fails with
+                            UnauthorizedLogin if too many verifications are in progress
+        """
+        started = time.perf_counter()
+        limit = self._limit
+
+        def admitted(_):
+            d = self._worker_pools.get(self._pool).run(_timed, f, *args)
+
+            def release(result):
+                limit.release()
+                return result
+
+            return d.addBoth(release)
+
+        def completed(result):
+            result, elapsed = result
+            latency = time.perf_counter() - started
+            self.verifications += 1
+            self.verify_time += elapsed
+            self.max_verify_time = max(self.max_verify_time, elapsed)
+            self.latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            return result
+
+        def overloaded(reason):
+            reason.trap(Overloaded)
+            self.rejected += 1
+            raise credError.UnauthorizedLogin('Too many logins in progress')
+
+        d = limit.acquire()
+        d.addCallback(admitted)
+        d.addCallbacks(completed, overloaded)
+        return d
+
+
+DEFAULT_VERIFIER = HashVerifier()
+
 
 @implementer(ICredentialsChecker)
 class PasswordDictChecker:
@@ -80,24 +220,105 @@ class PasswordDictChecker:
 
 @implementer(ICredentialsChecker)
 class CryptedPasswordDictChecker:
-    """ Similar to the PasswordDictChecker, but passwords are one-way encrypted"""
+    """
+    Similar to the PasswordDictChecker, but passwords are one-way encrypted
+
+    HTTP authentication checks the credentials of every request, and verifying
+    a SHA-512 or bcrypt crypt hash takes tens of milliseconds, so hashes are
+    verified by a HashVerifier off the reactor thread and successful
+    verifications are remembered for 'cache_ttl' seconds.  Cache entries are
+    keyed by an HMAC of the username and password under a random per-checker
+    key, so no password is kept, and are ignored once the user's password
+    hash changes.
+    """
     credentialInterfaces = (IUsernamePassword, IUsernameHashedPassword,)
 
-    def __init__(self, users_db, passwords_db):
+    def __init__(self, users_db, passwords_db, cache_ttl=DEFAULT_CREDENTIAL_CACHE_TTL,
+                 cache_size=DEFAULT_CREDENTIAL_CACHE_SIZE, timer=time.monotonic, verifier=DEFAULT_VERIFIER):
         """
         a dict-like object mapping user names to passwords
 
         :param users_db:     (dict) 'username' -> 'full name'
         :param passwords_db: (dict) 'username' -> 'password' (encrpyted)
+        :param cache_ttl:    (float) Seconds a successful verification is remembered, None
+                             or zero to verify every request
+        :param cache_size:   (int) Maximum number of verifications remembered
+        :param timer:        (callable) Clock used for cache expiration, returns seconds
+        :param verifier:     (HashVerifier) Runs the hash verifications
         """
         self._passwords = copy.deepcopy(passwords_db)
         self._users = copy.deepcopy(users_db)
+        self._cache = LRUCache(cache_size, ttl=cache_ttl, timer=timer) if cache_ttl else None
+        self._cache_key = os.urandom(32)
+        self._verifier = verifier
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     @property
     def users(self):
         """ Return a copy of the username -> fullname database """
         return copy.deepcopy(self._users)
 
+    @property
+    def stats(self):
+        """ Cache and verification statistics, see HashVerifier.stats.  The verifier may be shared """
+        lookups = self.cache_hits + self.cache_misses
+        stats = {
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+            'verifier': self._verifier.stats,
+        }
+        if self._cache is not None:
+            stats['cache'] = self._cache.stats
+        return stats
+
+    def set_password(self, username, crypted_password):
+        """
+        Add a user or change a user's password.  Verifications cached for the
+        previous password are no longer used.
+
+        :param username: (bytes) User name
+        :param crypted_password: (str) Password hash, as produced by crypt()
+        """
+        self._passwords[username] = crypted_password
+
+    def remove_user(self, username):
+        """ Remove a user, verifications cached for the user are no longer used """
+        self._passwords.pop(username, None)
+        self._users.pop(username, None)
+
+    def _key(self, username, password):
+        """ HMAC of the credentials, the length prefix keeps username/password boundaries distinct """
+        if isinstance(password, str):
+            password = password.encode('utf-8')
+        if isinstance(username, str):
+            username = username.encode('utf-8')
+        message = len(username).to_bytes(4, 'big') + username + password
+        return hmac.new(self._cache_key, message, hashlib.sha256).digest()
+
+    def _verify(self, username, crypted_password, password):
+        """
+        Check a password, using a cached verification when possible
+
+        :return: (Deferred) Fires with True if the password matches
+        """
+        key = None
+        if self._cache is not None:
+            key = self._key(username, password)
+            # The cached value is the hash that was verified, which is stale if the password changed
+            if self._cache.get(key) == crypted_password:
+                self.cache_hits += 1
+                return defer.succeed(True)
+            self.cache_misses += 1
+
+        def verified(result):
+            if result and key is not None:
+                self._cache.put(key, crypted_password)
+            return result
+
+        return self._verifier.run(verifyCryptedPassword, crypted_password, password).addCallback(verified)
+
     def requestAvatarId(self, credentials):              # pylint: disable=invalid-name
         """
         Validate credentials and produce an avatar ID.
@@ -115,28 +336,255 @@ class CryptedPasswordDictChecker:
         username = credentials.username
 
         if username in self._passwords:
-            if verifyCryptedPassword(self._passwords[username], credentials.password):
-                return defer.succeed(username)
+            def verified(result):
+                if result:
+                    return username
+                raise credError.UnauthorizedLogin("Bad password")
 
-            return defer.fail(credError.UnauthorizedLogin("Bad password"))
+            return self._verify(username, self._passwords[username], credentials.password).addCallback(verified)
 
         return defer.fail(credError.UnauthorizedLogin("No such user"))
 
 
+class UNIXAccount(namedtuple('UNIXAccount', ['name', 'fullname', 'crypted'])):
+    """
+    Password database entry of a UNIX account
+
+    :param name: (str) User name
+    :param fullname: (str) Full name from the GECOS field, the user name if it is empty
+    :param crypted: (tuple) Password hashes to try, in database order
+    """
+    __slots__ = ()
+
+
+class UNIXUsers(Mapping):
+    """
+    Read-only 'username' -> 'full name' mapping of the UNIX accounts, for the realm
+
+    Users are looked up through the checker's account cache, so a user that
+    has just logged in is found without another password database query.
+    Other users are looked up on the calling thread, without the /etc/shadow
+    lookup that switches the process to root.
+    Iterating enumerates the password database, which with NSS backends such
+    as LDAP may be slow or list only the local accounts.
+    """
+    def __init__(self, checker):
+        self._checker = checker
+
+    def __getitem__(self, username):
+        fullname = self._checker.fullname(username)
+        if fullname is None:
+            raise KeyError(username)
+        return fullname
+
+    def __iter__(self):
+        if pwd is None:
+            return iter(())
+        encoding = sys.getfilesystemencoding()
+        return iter([entry.pw_name.encode(encoding) for entry in pwd.getpwall()])
+
+    def __len__(self):
+        return len(pwd.getpwall()) if pwd is not None else 0
+
+
 @implementer(ICredentialsChecker)
 class UNIXPasswordDatabaseChecker(UNIXPasswordDatabase):
-    """ Uses Unix username/password."""
+    """
+    Uses Unix username/password.
+
+    Account lookups may go through NSS, which on hosts with network backed
+    accounts (LDAP, NIS, ...) can block for milliseconds or more, so they run
+    with the hash verification in the verifier's worker pool, never on the
+    reactor thread.  The /etc/shadow lookups switch the effective user of
+    the process to root, so they run one at a time.  Account entries, including unknown users, are cached for
+    'cache_ttl' seconds.  The cache is cleared as soon as the modification
+    time of one of the account files changes; they are checked at most every
+    'stat_interval' seconds.
+    """
     credentialInterfaces = (IUsernamePassword, IUsernameHashedPassword,)
 
-    def __init__(self):
-        """passwords: a dict-like object mapping user names to passwords"""
-        super().__init__()
+    def __init__(self, verifier=DEFAULT_VERIFIER, cache_ttl=DEFAULT_ACCOUNT_CACHE_TTL,
+                 cache_size=DEFAULT_ACCOUNT_CACHE_SIZE, timer=time.monotonic,
+                 files=DEFAULT_ACCOUNT_FILES, stat_interval=DEFAULT_ACCOUNT_STAT_INTERVAL,
+                 get_by_name_functions=None):
+        """
+        :param verifier: (HashVerifier) Runs the password database lookups and hash verifications
+        :param cache_ttl: (float) Seconds an account entry is cached, None or zero to look
+                          up the account on every request
+        :param cache_size: (int) Maximum number of account entries cached
+        :param timer: (callable) Clock used for cache expiration, returns seconds
+        :param files: (iterable) Account files whose modification clears the cache
+        :param stat_interval: (float) Minimum number of seconds between checks of the account files
+        :param get_by_name_functions: (list) Password database lookup functions, see
+                                      UNIXPasswordDatabase.  Default is /etc/passwd then /etc/shadow
+        """
+        if get_by_name_functions is None:
+            get_by_name_functions = [_pwdGetByName, _shadow_get_by_name]
+
+        super().__init__(get_by_name_functions)
+        self._verifier = verifier
+        self._accounts = LRUCache(cache_size, ttl=cache_ttl, timer=timer) if cache_ttl else None
+        self._timer = timer
+        self._files = tuple(files)
+        self._stat_interval = stat_interval
+        self._next_stat = None
+        self._mtimes = None
+        self._generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.lookups = 0
+        self.invalidations = 0
 
     @property
     def users(self):
-        """ Provide users property for realm control """
-        # TODO: Future -> Return dict of username->full-usernames for tracing/log purposes
-        return None
+        """ Provide users property for realm control, a 'username' -> 'full name' mapping """
+        return UNIXUsers(self)
+
+    @property
+    def stats(self):
+        """ Account cache and verification statistics, see HashVerifier.stats.  The verifier may be shared """
+        requests = self.cache_hits + self.cache_misses
+        stats = {
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'hit_rate': self.cache_hits / requests if requests else 0.0,
+            'lookups': self.lookups,
+            'invalidations': self.invalidations,
+            'verifier': self._verifier.stats,
+        }
+        if self._accounts is not None:
+            stats['cache'] = self._accounts.stats
+        return stats
+
+    def invalidate(self):
+        """ Forget all cached account entries """
+        if self._accounts is not None:
+            self._accounts.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    def _check_files(self):
+        """ Clear the cache if an account file changed since the last check """
+        if self._accounts is None or not self._files:
+            return
+
+        now = self._timer()
+        if self._next_stat is not None and now < self._next_stat:
+            return
+        self._next_stat = now + self._stat_interval
+
+        mtimes = []
+        for path in self._files:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+
+            except OSError:
+                mtimes.append(None)
+
+        mtimes = tuple(mtimes)
+        if self._mtimes is not None and mtimes != self._mtimes:
+            self.invalidate()
+        self._mtimes = mtimes
+
+    def _cached(self, name):
+        """ Cached account entry, None for an unknown user, _MISSING if not cached """
+        if self._accounts is None:
+            return _MISSING
+
+        self._check_files()
+        account = self._accounts.get(name, _MISSING)
+        if account is _MISSING:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return account
+
+    def _lookup(self, name, functions=None):
+        """
+        Query the password databases.  Blocks, so this runs in a worker thread
+
+        :param name: (str) User name
+        :param functions: (list) Lookup functions to use, default is all of them
+        :return: (UNIXAccount) Account entry, None if there is no such user
+        """
+        fullname = None
+        crypted = []
+        found = False
+
+        for func in self._getByNameFunctions if functions is None else functions:
+            try:
+                record = func(name)
+
+            except KeyError:
+                break
+
+            except OSError:
+                # The shadow database can only be read with enough privileges
+                continue
+
+            if record is None:
+                continue
+
+            found = True
+            gecos = getattr(record, 'pw_gecos', None)
+            if fullname is None and gecos:
+                fullname = gecos.split(',')[0]
+            if record[1]:
+                crypted.append(record[1])
+
+        return UNIXAccount(name, fullname or name, tuple(crypted)) if found else None
+
+    def _check(self, name, password, account):
+        """
+        Look up the account if it was not cached and verify the password.  Runs in a worker thread
+
+        :return: (tuple) The account entry, and True if the password matches
+        """
+        if account is _MISSING:
+            account = self._lookup(name)
+
+        verified = account is not None and \
+            any(verifyCryptedPassword(crypted, password) for crypted in account.crypted)
+        return account, verified
+
+    def _store(self, name, account, generation):
+        """ Cache an account entry unless the account files changed while it was looked up """
+        self.lookups += 1
+        if self._accounts is not None and generation == self._generation:
+            self._accounts.put(name, account)
+
+    def account(self, username):
+        """
+        Account entry of a user.  The password database is queried on the
+        calling thread if the entry is not cached.
+
+        :param username: (bytes) User name
+        :return: (UNIXAccount) Account entry, None if there is no such user
+        """
+        name = username.decode(sys.getfilesystemencoding()) if isinstance(username, bytes) else username
+        account = self._cached(name)
+        if account is _MISSING:
+            generation = self._generation
+            account = self._lookup(name)
+            self._store(name, account, generation)
+        return account
+
+    def fullname(self, username):
+        """
+        Full name of a user.  If the account entry is not cached, the password
+        database is queried on the calling thread, leaving out the /etc/shadow
+        lookup that switches the effective user of the process.  That entry
+        lacks password hashes, so it is not cached.
+
+        :param username: (bytes) User name
+        :return: (str) Full name, None if there is no such user
+        """
+        name = username.decode(sys.getfilesystemencoding()) if isinstance(username, bytes) else username
+        account = self._cached(name)
+        if account is _MISSING:
+            account = self._lookup(name, [func for func in self._getByNameFunctions
+                                          if func is not _shadow_get_by_name])
+        return account.fullname if account is not None else None
 
     def requestAvatarId(self, credentials):         # pylint: disable=invalid-name
         """
@@ -156,27 +604,48 @@ class UNIXPasswordDatabaseChecker(UNIXPasswordDatabase):
         # I would like to provide in a future release
 
         if isinstance(credentials, UsernamePassword):
-            avatar = super().requestAvatarId(credentials)
+            password = credentials.password
 
         elif isinstance(credentials, DigestedCredentials):
-            username = credentials.username
             # TODO: Need to decode credentials..  Work in progress
             password = 'something'
 
-            avatar = super().requestAvatarId(UsernamePassword(username, password))
-
         else:
             return defer.fail(credError.UnauthorizedLogin("unable to validate credentials"))
 
-        def successful(username):
+        # Decode the same way as the pwd module decodes the files on disk
+        encoding = sys.getfilesystemencoding()
+        username = credentials.username
+        name = username.decode(encoding)
+        if isinstance(password, bytes):
+            password = password.decode(encoding)
+
+        account = self._cached(name)
+        generation = self._generation
+
+        # The lookups and verification run in a worker thread, the Deferred they
+        # return has already fired and is chained on the reactor thread
+        avatar = self._verifier.run(self._check, name, password, account)
+
+        def checked(result):
+            checked_account, verified = result
+            if account is _MISSING:
+                self._store(name, checked_account, generation)
+
+            if checked_account is None:
+                raise credError.UnauthorizedLogin("invalid username")
+
+            if not verified:
+                raise credError.UnauthorizedLogin("unable to verify password")
+
             # TODO: Add anything extra here
             return username
 
         def unauthorized(reason):
             # TODO: Add anything extra here
-            if isinstance(reason, credError.UnauthorizedLogin):
+            if reason.check(credError.UnauthorizedLogin):
                 return reason
 
-            return defer.fail(credError.UnauthorizedLogin("Access denied: {}".format(reason)))
+            return defer.fail(credError.UnauthorizedLogin("Access denied: {}".format(reason.value)))
 
-        return avatar.addCallbacks(successful, unauthorized)
+        return avatar.addCallback(checked).addErrback(unauthorized)
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from twisted.cred.portal import IRealm
-from twisted.web.resource import IResource
+from twisted.web.resource import IResource, Resource
 from zope.interface import implementer, Interface
 
 
@@ -38,6 +38,31 @@ class AuthorizedUserAvatar:
         return '{}: ({})'.format(self.username, self.fullname)
 
 
+class AvatarResource(Resource):
+    """
+    Hands requests to the API resource after recording the authenticated
+    avatar ID as 'request.avatar_id', so that handlers, response caches and
+    such can tell users apart.
+    """
+    def __init__(self, api_resource, avatar_id):
+        """
+        :param api_resource: (Resource) API resource
+        :param avatar_id: Avatar ID returned by the credentials checker
+        """
+        super().__init__()
+        self._api_resource = api_resource
+        self._avatar_id = avatar_id
+        self.isLeaf = api_resource.isLeaf                # pylint: disable=invalid-name
+
+    def getChildWithDefault(self, path, request):     # pylint: disable=invalid-name
+        request.avatar_id = self._avatar_id
+        return self._api_resource.getChildWithDefault(path, request)
+
+    def render(self, request):
+        request.avatar_id = self._avatar_id
+        return self._api_resource.render(request)
+
+
 @implementer(IRealm)
 class Realm:
     """
@@ -73,6 +98,6 @@ class Realm:
                     lambda: None)
 
         if IResource in interfaces:
-            return IResource, self._api_resource, lambda: None
+            return IResource, AvatarResource(self._api_resource, avatar_id), lambda: None
 
         raise NotImplementedError("None of the requested interfaces are supported")
@@ -12,19 +12,38 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+
+from collections import namedtuple
+
 from twisted.internet import reactor
-from twisted.internet.defer import Deferred, succeed, fail
+from twisted.internet.defer import DeferredList, FirstError, maybeDeferred, succeed, fail
+from twisted.internet.endpoints import serverFromString
 from twisted.internet.error import CannotListenError
 from twisted.python.failure import Failure
 from twisted.web.server import Site
 
 from .access.access import OpenAccessConfig
+from .asyncio_reactor import is_asyncio_reactor
+from .connections import ConnectionTracker, DEFAULT_STOP_TIMEOUT
+from .pools import DEFAULT_POOLS, WorkerPools
+from .txrestapi.cors import CorsResource
 from .txrestapi.json_resource import JsonAPIResource
 from .txrestapi.methods import GET
+from .workers import WorkerSupervisor, DEFAULT_RESTART_DELAY
 
 DEFAULT_PORT = 8888
 DEFAULT_INTERFACE = ''      # All interfaces=
 
+# Keyword arguments that are applied as attributes of a JsonAPIResource API when the server starts
+API_SETTINGS = ('json_encoder', 'offload_threshold', 'compression', 'etags', 'cors',
+                'asyncio_handlers', 'default_deadline', 'admission_limit', 'rate_limiter',
+                'worker_pools', 'blocking_pool', 'process_pool')
+
+
+# Worker process mode settings, see the 'workers' keyword arguments of RestServer
+_WorkerSettings = namedtuple('_WorkerSettings', ['workers', 'factory', 'restart_delay'])
+
 
 class DefaultRestAPI(JsonAPIResource):
     """ Default API used if not provided on initial startup """
@@ -36,26 +55,90 @@ class DefaultRestAPI(JsonAPIResource):
 
 class RestServer:
     """ REST Server """
-    def __init__(self, api=DefaultRestAPI(), interface=DEFAULT_INTERFACE,
+    def __init__(self, api=None, interface=DEFAULT_INTERFACE,
                  port=DEFAULT_PORT, **kwargs):
         """
         Server initialization
 
-        :param api: (Resource) API resource
+        :param api: (Resource) API resource, default is a new DefaultRestAPI.  The API
+                    settings below are set on a JsonAPIResource API when the server
+                    starts, so an API given here is modified
         :param interface: (str) Network Address
         :param port: (int) Network Port
         :param kwargs: (dict) Additional configuration.  Supported key/values include:
                        'access_config': None or one of the AccessConfig subclasses
+                       'json_encoder': JsonEncoder applied to a JsonAPIResource API when started
+                       'offload_threshold': Estimated result size above which a JsonAPIResource
+                                            API serializes results in a worker thread
+                       'offload_pool_size': Maximum number of serialization worker threads
+                       'worker_pools': WorkerPools of a JsonAPIResource API, give each server its
+                                       own to keep their worker threads apart.  An API using
+                                       the shared default pools is given pools of its own if
+                                       'offload_pool_size' or 'worker_pool_sizes' is set
+                       'worker_pool_sizes': (dict) pool-name -> maximum number of worker threads,
+                                            e.g. {'blocking': 8} for the default pool of
+                                            routes with the 'blocking' option
+                       'blocking_pool': (str) Worker pool of 'blocking' routes that do not name one
+                       'process_pool': ProcessPool of a JsonAPIResource API's 'process' routes
+                       'compression': CompressionPolicy applied to a JsonAPIResource API when started
+                       'etags': (bool) Enable ETag/If-None-Match handling of a JsonAPIResource API
+                       'cors': CorsPolicy of the API, None to disable CORS.  CORS preflight
+                               requests are answered ahead of HTTP authentication
+                       'asyncio_handlers': (bool) Run 'async def' handlers of a JsonAPIResource
+                                           API as asyncio tasks.  Requires the asyncio reactor,
+                                           see txrestserver.asyncio_reactor
+                       'default_deadline': (float) Seconds a JsonAPIResource route handler may
+                                           take to complete before a 504 error is returned
+                       'admission_limit': AdmissionLimit on the number of concurrent requests of
+                                          a JsonAPIResource API
+                       'rate_limiter': RateLimiter applied to the requests of each client (address
+                                       or authenticated user) of a JsonAPIResource API
+                       'workers': (int) Number of worker processes sharing the listening socket,
+                                  zero (the default) to serve requests in this process
+                       'worker_factory': (str) 'module:callable' that returns the RestServer
+                                         run by each worker process.  Required with 'workers'
+                       'worker_restart_delay': (float) Seconds before a worker that exited is
+                                               restarted
+                       'endpoints': (list) Listen on these endpoints instead of 'interface' and
+                                    'port'.  Each is an IStreamServerEndpoint or a Twisted endpoint
+                                    string such as 'tcp:8888:interface=127.0.0.1',
+                                    'unix:/run/api.sock' or 'ssl:8443:privateKey=key.pem'.
+                                    TLS must be given with 'ssl:' endpoints, a TLS
+                                    'access_config' cannot be combined with endpoints
+                       'stop_timeout': (float) Seconds stop() waits for requests in progress
+                                       to complete before their connections are aborted
         """
         self._interface = interface
         self._port = port
-        self._listener = None
+        self._listeners = []
+        self._connections = None
         self._running = False
-        self._api = api
+        self._api = api if api is not None else DefaultRestAPI()
         self._access_control = kwargs.pop('access_config', OpenAccessConfig())
+        self._api_settings = {name: kwargs.pop(name) for name in API_SETTINGS if name in kwargs}
+        self._offload_pool_size = kwargs.pop('offload_pool_size', None)
+        self._worker_pool_sizes = kwargs.pop('worker_pool_sizes', {})
+        self._worker_settings = _WorkerSettings(kwargs.pop('workers', 0),
+                                                kwargs.pop('worker_factory', None),
+                                                kwargs.pop('worker_restart_delay', DEFAULT_RESTART_DELAY))
+        self._stop_timeout = kwargs.pop('stop_timeout', DEFAULT_STOP_TIMEOUT)
+        self._supervisor = None
+        self._adopted = None                # (fd, family) of a socket to listen on
+        self._endpoints = [serverFromString(reactor, endpoint) if isinstance(endpoint, str) else endpoint
+                           for endpoint in kwargs.pop('endpoints', ())]
+
+        if self._endpoints and self._worker_settings.workers:
+            raise ValueError('Worker processes listen on the interface and port, not on endpoints')
+
+        if self._endpoints and self._access_control.is_tls_access:
+            raise ValueError("TLS is configured with 'ssl:' endpoints, not with a TLS access config")
+
+        if self._api_settings.get('asyncio_handlers') and not is_asyncio_reactor():
+            raise ValueError('asyncio handlers require the asyncio reactor, see install_asyncio_reactor()')
 
     def __del__(self):
-        self.stop()
+        # Release the listening sockets, there is no one left to wait for a drain
+        self.stop(timeout=0)
 
     @property
     def is_running(self):
@@ -70,13 +153,53 @@ class RestServer:
     @property
     def port(self):
         """ Return interface port number listener is configured for """
+        if self._supervisor is not None:
+            return self._supervisor.port
         return self._port
 
+    @property
+    def addresses(self):
+        """ Addresses being listened on, empty if not running """
+        return [listener.getHost() for listener in self._listeners]
+
+    @property
+    def connections(self):
+        """ ConnectionTracker of the open connections and requests, None until started """
+        return self._connections
+
+    @property
+    def aborted_requests(self):
+        """ Number of requests aborted because they did not complete before stop() timed out """
+        return self._connections.aborted if self._connections is not None else 0
+
+    @property
+    def workers(self):
+        """ Worker process supervisor, None unless running in worker mode """
+        return self._supervisor
+
+    def adopt(self, fd, family):
+        """
+        Serve requests on an already listening socket, such as one inherited
+        from a worker supervisor, instead of opening one when started
+
+        :param fd: (int) File descriptor of the listening socket
+        :param family: (int) Address family, socket.AF_INET or socket.AF_INET6
+        """
+        if self._running:
+            raise ValueError('The listening socket cannot be changed while the server is running')
+
+        self._adopted = (fd, family)
+
     @property
     def default_access_control(self):
         """ Default access mechanism if API does not specify it """
         return self._access_control
 
+    @property
+    def json_encoder(self):
+        """ JSON encoder applied to the API, None if the API's own encoder is used """
+        return self._api_settings.get('json_encoder')
+
     @property
     def api(self):
         """ Get the current resource/API """
@@ -96,18 +219,39 @@ class RestServer:
 
     def start(self):
         """ Start the server if it is not running """
+        # A worker's server adopts the supervisor's socket, even if it was built with 'workers'
+        if not self._running and self._worker_settings.workers and self._adopted is None:
+            return self._start_workers()
+
         if not self._running:
             try:
+                self._configure_api()
                 resource = self._access_control.secure_resource(self._api)
-                site = Site(resource=resource)
-                if self._access_control.is_tls_access:
-                    self._listener = reactor.listenSSL(self._port,           # pylint: disable=no-member
-                                                       site,
-                                                       interface=self._interface)
+                cors = getattr(self._api, 'cors', None)
+                if cors is not None and resource is not self._api:
+                    # Browsers send preflight requests without credentials
+                    resource = CorsResource(resource, cors)
+
+                site = self._connections = ConnectionTracker(Site(resource=resource))
+                if self._adopted is not None:
+                    fd, family = self._adopted
+                    listener = reactor.adoptStreamPort(fd, family, site)    # pylint: disable=no-member
+                    # The port holds its own copy of the socket
+                    os.close(fd)
+                    self._adopted = None
+
+                elif self._endpoints:
+                    return self._listen_endpoints(site)
+
+                elif self._access_control.is_tls_access:
+                    listener = reactor.listenSSL(self._port,           # pylint: disable=no-member
+                                                 site,
+                                                 interface=self._interface)
                 else:
-                    self._listener = reactor.listenTCP(self._port,           # pylint: disable=no-member
-                                                       site,
-                                                       interface=self._interface)
+                    listener = reactor.listenTCP(self._port,           # pylint: disable=no-member
+                                                 site,
+                                                 interface=self._interface)
+                self._listeners = [listener]
                 self._running = True
 
             except CannotListenError as ex:
@@ -116,17 +260,89 @@ class RestServer:
 
         return succeed(True)
 
-    def stop(self):
-        """ Stop the server """
+    def _listen_endpoints(self, site):
+        """
+        Listen on all endpoints.  If any of them fails, the others are closed
+        again and the failure of the first one is returned.
+        """
+        listening = []
+
+        def started(_):
+            self._listeners = listening
+            self._running = True
+            return True
+
+        def failed(reason):
+            reason.trap(FirstError)
+            results = DeferredList([maybeDeferred(listener.stopListening) for listener in listening])
+            return results.addCallback(lambda _: reason.value.subFailure)
+
+        results = DeferredList([endpoint.listen(site).addCallback(listening.append)
+                                for endpoint in self._endpoints],
+                               fireOnOneErrback=True, consumeErrors=True)
+        return results.addCallbacks(started, failed)
+
+    def _start_workers(self):
+        """ Start the worker processes, each runs its own RestServer on the shared socket """
+        if self._access_control.is_tls_access:
+            return fail(ValueError('Worker processes do not support TLS access'))
 
+        settings = self._worker_settings
+        if settings.factory is None:
+            return fail(ValueError("Worker processes require a 'worker_factory'"))
+
+        try:
+            self._supervisor = WorkerSupervisor(settings.factory, settings.workers, self._port,
+                                                interface=self._interface,
+                                                restart_delay=settings.restart_delay,
+                                                stop_timeout=self._stop_timeout)
+            results = self._supervisor.start()
+            self._running = True
+            return results
+
+        except (OSError, ValueError) as ex:
+            self._supervisor = None
+            return fail(Failure(ex))
+
+    def _configure_api(self):
+        """ Apply API settings provided at initialization to a JsonAPIResource API """
+        if isinstance(self._api, JsonAPIResource):
+            for name, value in self._api_settings.items():
+                setattr(self._api, name, value)
+
+            sizes = dict(self._worker_pool_sizes)
+            if self._offload_pool_size is not None:
+                sizes.setdefault(self._api.offload_pool, self._offload_pool_size)
+
+            if sizes and self._api.worker_pools is DEFAULT_POOLS and 'worker_pools' not in self._api_settings:
+                # Resizing the shared pools would change the thread limits of every other API
+                self._api.worker_pools = WorkerPools()
+
+            for name, max_threads in sizes.items():
+                self._api.worker_pools.configure(name, max_threads)
+
+    def stop(self, timeout=None):
+        """
+        Stop the server.  Listening stops at once, idle connections are closed
+        and requests in progress are given until the timeout to complete before
+        their connections are aborted.  The number of aborted requests is
+        logged and available from 'aborted_requests'.
+
+        :param timeout: (float) Seconds to wait for requests in progress, default is 'stop_timeout'
+        :return: (Deferred) Fires with True once all connections are closed
+        """
         results = succeed(True)
+        timeout = self._stop_timeout if timeout is None else timeout
 
         if self._running:
             self._running = False
-            listener, self._listener = self._listener, None
+            if self._supervisor is not None:
+                return self._supervisor.stop(timeout)
+
+            listeners, self._listeners = self._listeners, []
 
-            if listener is not None:
-                stop_results = listener.stopListening()
-                if isinstance(stop_results, Deferred):
-                    results = stop_results.addCallback(lambda _: True)
+            if listeners:
+                results = DeferredList([maybeDeferred(listener.stopListening) for listener in listeners])
+                results.addCallback(lambda _: self._connections.drain(timeout))
+                results.addCallback(lambda _: True)
         return results
@@ -0,0 +1,143 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import deque
+
+from twisted.internet.defer import Deferred, succeed, fail
+
+DEFAULT_RETRY_AFTER = 1
+
+
+class Overloaded(Exception):
+    """ A request was rejected by an AdmissionLimit """
+    def __init__(self, retry_after):
+        super().__init__('Server busy, retry after {} second(s)'.format(retry_after))
+        self.retry_after = retry_after
+
+
+class AdmissionLimit:
+    """
+    Limits the number of requests handled concurrently
+
+    Requests over the limit wait in a bounded FIFO queue.  Once the queue is
+    full, further requests are rejected immediately with a '503 Service
+    Unavailable' response so that a burst does not slow down every request.
+    """
+    def __init__(self, max_concurrent, max_queued=0, retry_after=DEFAULT_RETRY_AFTER):
+        """
+        Limit initialization
+
+        :param max_concurrent: (int) Maximum number of requests handled at the same time
+        :param max_queued: (int) Maximum number of requests waiting for their turn
+        :param retry_after: (int) Seconds the client is asked to wait before retrying
+        """
+        if max_concurrent <= 0:
+            raise ValueError('An admission limit must allow at least one request')
+
+        if max_queued < 0:
+            raise ValueError('The admission queue size cannot be negative')
+
+        self._max_concurrent = max_concurrent
+        self._max_queued = max_queued
+        self._retry_after = retry_after
+        self._active = 0
+        self._waiting = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.peak_queued = 0
+
+    @property
+    def active(self):
+        """ Number of requests currently admitted """
+        return self._active
+
+    @property
+    def queue_depth(self):
+        """ Number of requests waiting to be admitted """
+        return len(self._waiting)
+
+    @property
+    def retry_after(self):
+        """ Seconds rejected clients are asked to wait before retrying """
+        return self._retry_after
+
+    @property
+    def stats(self):
+        """ Limit statistics """
+        return {
+            'max_concurrent': self._max_concurrent,
+            'max_queued': self._max_queued,
+            'active': self._active,
+            'queue_depth': len(self._waiting),
+            'peak_queued': self.peak_queued,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rejected': self.rejected,
+        }
+
+    def acquire(self):
+        """
+        Request admission
+
+        :return: (Deferred) Fires when the request may proceed, or fails with
+                            Overloaded if the limit and its queue are full.  Cancel
+                            it to give up waiting.
+        """
+        if self._active < self._max_concurrent:
+            self._active += 1
+            self.admitted += 1
+            return succeed(self)
+
+        if len(self._waiting) >= self._max_queued:
+            self.rejected += 1
+            return fail(Overloaded(self._retry_after))
+
+        d = Deferred(self._waiting.remove)
+        self._waiting.append(d)
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, len(self._waiting))
+        return d
+
+    def release(self):
+        """ A request admitted by acquire() has completed """
+        if self._waiting:
+            self.admitted += 1
+            self._waiting.popleft().callback(self)
+        else:
+            self._active -= 1
+
+
+def admit(request, limits):
+    """
+    Admit a request through one or more limits in turn.  The limits are held
+    until the request finishes or its connection is lost.
+
+    :param request: (Request) Request
+    :param limits: (iterable) AdmissionLimits
+    :return: (Deferred) Fires once admitted by all limits, or fails with Overloaded
+    """
+    held = []
+
+    def release(_):
+        while held:
+            held.pop().release()
+
+    request.notifyFinish().addBoth(release)
+
+    d = succeed(None)
+    for limit in limits:
+        d.addCallback(lambda _, lim: lim.acquire(), limit)
+        d.addCallback(held.append)
+    return d
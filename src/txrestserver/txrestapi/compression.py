@@ -0,0 +1,141 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import zlib
+
+from ..cache import LRUCache
+
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_MIN_SIZE = 1024
+
+# zlib window bits for each supported content-coding
+_WBITS = {
+    b'gzip': 16 + zlib.MAX_WBITS,
+    b'deflate': zlib.MAX_WBITS,         # HTTP 'deflate' is the zlib format
+}
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header
+
+    :param header: (bytes) Header value
+    :return: (dict) content-coding -> quality value
+    """
+    codings = {}
+    for item in header.split(b','):
+        coding, _, params = item.partition(b';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in params.split(b';'):
+            name, _, value = param.partition(b'=')
+            if name.strip().lower() == b'q':
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+class CompressionPolicy:
+    """ Negotiated gzip/deflate compression of JSON responses """
+
+    def __init__(self, level=DEFAULT_COMPRESSION_LEVEL, min_size=DEFAULT_MIN_SIZE,
+                 encodings=(b'gzip', b'deflate')):
+        """
+        Policy initialization
+
+        :param level: (int) zlib compression level, 1 (fastest) to 9 (smallest)
+        :param min_size: (int) Responses smaller than this many bytes are sent uncompressed
+        :param encodings: (tuple) Supported content-codings in order of preference
+        """
+        if not 0 <= level <= 9:
+            raise ValueError('Compression level must be between 0 and 9')
+
+        unsupported = set(encodings) - set(_WBITS)
+        if unsupported or not encodings:
+            raise ValueError('Supported encodings are: {}'.format(', '.join(e.decode() for e in _WBITS)))
+
+        self._level = level
+        self._min_size = min_size
+        self._encodings = tuple(encodings)
+        self._negotiated = LRUCache(128)
+
+    @property
+    def level(self):
+        """ zlib compression level """
+        return self._level
+
+    @property
+    def min_size(self):
+        """ Minimum response size to compress """
+        return self._min_size
+
+    def negotiate(self, request):
+        """
+        Select the content-coding for a response
+
+        :param request: (Request) Request
+        :return: (bytes) Content-coding or None if the response should not be compressed
+        """
+        header = request.getHeader(b'accept-encoding')
+        if not header:
+            return None
+
+        encoding = self._negotiated.get(header, False)
+        if encoding is False:
+            accepted = parse_accept_encoding(header)
+            wildcard = accepted.get(b'*', 0.0)
+            candidates = [(accepted.get(coding, wildcard), -index, coding)
+                          for index, coding in enumerate(self._encodings)]
+            quality, _, encoding = max(candidates)
+            if quality <= 0.0:
+                encoding = None
+            self._negotiated.put(header, encoding)
+
+        return encoding
+
+    def select(self, body, encoding):
+        """
+        Content-coding to apply to a complete response body
+
+        :param body: (bytes) Response body
+        :param encoding: (bytes) Negotiated content-coding, may be None
+        :return: (bytes) 'encoding' or None if the body is too small to compress
+        """
+        return encoding if len(body) >= self._min_size else None
+
+    def compress(self, body, encoding):
+        """
+        Compress a complete response body
+
+        :param body: (bytes) Response body
+        :param encoding: (bytes) Negotiated content-coding, may be None
+        :return: (tuple) Response body and the content-coding applied, None if the
+                         body was too small or no encoding was negotiated
+        """
+        encoding = self.select(body, encoding) if encoding is not None else None
+        if encoding is None:
+            return body, None
+
+        compressor = self.compressor(encoding)
+        return compressor.compress(body) + compressor.flush(), encoding
+
+    def compressor(self, encoding):
+        """ Create a streaming compressor for a content-coding """
+        return zlib.compressobj(self._level, zlib.DEFLATED, _WBITS[encoding])
@@ -0,0 +1,198 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Cross-origin resource sharing (CORS) support, which allows API methods to be
+called from web browsers:
+
+    https://en.wikipedia.org/wiki/Cross-origin_resource_sharing
+"""
+from twisted.web.http import NO_CONTENT
+from twisted.web.resource import Resource
+
+from ..cache import LRUCache
+
+DEFAULT_METHODS = (b'GET', b'POST', b'PUT', b'DELETE', b'PATCH')
+DEFAULT_HEADERS = (b'x-requested-with', )
+DEFAULT_MAX_AGE = 10
+
+
+def _to_bytes(value):
+    return value.encode() if isinstance(value, str) else value
+
+
+class CorsPolicy:
+    """
+    CORS response headers and preflight (OPTIONS) responses
+
+    The header values are encoded once when the policy is created.  With a list
+    of allowed origins, the headers for each origin seen are built once and
+    kept in a small LRU cache.
+    """
+    def __init__(self, origins=b'*', methods=DEFAULT_METHODS, headers=DEFAULT_HEADERS,
+                 max_age=DEFAULT_MAX_AGE, expose_headers=(), allow_credentials=False):
+        """
+        Policy initialization
+
+        :param origins: (bytes or iterable) b'*' to allow any origin, or the allowed origins
+                        such as b'https://example.com'
+        :param methods: (iterable) Methods allowed in cross-origin requests
+        :param headers: (iterable) Request headers allowed in cross-origin requests
+        :param max_age: (int) Seconds that browsers may cache a preflight response
+        :param expose_headers: (iterable) Response headers that browsers may expose to scripts
+        :param allow_credentials: (bool) Allow requests with cookies or HTTP authentication.
+                                  Requires a list of origins
+        """
+        origins = _to_bytes(origins)
+        self._any_origin = origins == b'*'
+        self._origins = frozenset() if self._any_origin else frozenset(_to_bytes(o) for o in origins)
+
+        if allow_credentials and self._any_origin:
+            raise ValueError('Credentials cannot be allowed for any origin')
+
+        common = []
+        if allow_credentials:
+            common.append((b'Access-Control-Allow-Credentials', [b'true']))
+
+        self._headers = list(common)            # Simple (actual) requests
+        if expose_headers:
+            self._headers.append((b'Access-Control-Expose-Headers',
+                                  [b', '.join(_to_bytes(h) for h in expose_headers)]))
+
+        self._preflight_headers = common + [
+            (b'Access-Control-Allow-Methods', [b', '.join(_to_bytes(m) for m in methods)]),
+            (b'Access-Control-Allow-Headers', [b', '.join(_to_bytes(h) for h in headers)]),
+            (b'Access-Control-Max-Age', [str(int(max_age)).encode()]),
+        ]
+        self._max_age = max_age
+
+        if self._any_origin:
+            # Kept for compatibility, earlier releases sent the full header set with every response
+            origin = [(b'Access-Control-Allow-Origin', [b'*'])]
+            self._response_headers = origin + self._headers + self._preflight_headers
+            self._preflight_response = origin + self._preflight_headers
+        else:
+            self._by_origin = LRUCache(max(len(self._origins), 1))
+
+    @property
+    def max_age(self):
+        """ Seconds that browsers may cache a preflight response """
+        return self._max_age
+
+    def _origin_headers(self, request):
+        """ (response headers, preflight headers) for the request origin, or None if not allowed """
+        origin = request.getHeader(b'origin')
+        if origin not in self._origins:
+            return None
+
+        headers = self._by_origin.get(origin)
+        if headers is None:
+            allow = [(b'Access-Control-Allow-Origin', [origin])]
+            headers = (allow + self._headers, allow + self._preflight_headers)
+            self._by_origin.put(origin, headers)
+        return headers
+
+    @staticmethod
+    def _vary(request):
+        """
+        Responses differ by origin, including those to origins that are not
+        allowed, which shared caches must not serve to allowed ones
+        """
+        headers = request.responseHeaders
+        if b'Origin' not in (headers.getRawHeaders(b'Vary') or ()):
+            headers.addRawHeader(b'Vary', b'Origin')
+
+    def set_headers(self, request):
+        """ Add the CORS headers to a response """
+        if self._any_origin:
+            headers = self._response_headers
+        else:
+            self._vary(request)
+            headers = self._origin_headers(request)
+            if headers is None:
+                return
+            headers = headers[0]
+
+        set_raw_headers = request.responseHeaders.setRawHeaders
+        for name, values in headers:
+            set_raw_headers(name, values)
+
+    @staticmethod
+    def is_preflight(request):
+        """ True if the request is a CORS preflight request """
+        return request.method == b'OPTIONS' and \
+            request.requestHeaders.hasHeader(b'access-control-request-method')
+
+    def preflight(self, request):
+        """
+        Answer a preflight request
+
+        :param request: (Request) OPTIONS request
+        :return: (bytes) Empty response body
+        """
+        if self._any_origin:
+            headers = self._preflight_response
+        else:
+            self._vary(request)
+            headers = self._origin_headers(request)
+            headers = headers[1] if headers is not None else ()
+
+        set_raw_headers = request.responseHeaders.setRawHeaders
+        for name, values in headers:
+            set_raw_headers(name, values)
+
+        request.setResponseCode(NO_CONTENT)
+        return b''
+
+
+class PreflightResource(Resource):
+    """ Leaf resource that answers CORS preflight requests """
+    isLeaf = True
+
+    def __init__(self, policy):
+        super().__init__()
+        self._policy = policy
+
+    def render(self, request):
+        return self._policy.preflight(request)
+
+
+class CorsResource(Resource):
+    """
+    Answers CORS preflight requests and passes all other requests to the
+    wrapped resource.  Wrap the root resource with it, outside of any HTTP
+    authentication, since browsers send preflight requests without credentials.
+    """
+    def __init__(self, resource, policy):
+        """
+        :param resource: (Resource) Resource to wrap
+        :param policy: (CorsPolicy) CORS policy
+        """
+        super().__init__()
+        self._resource = resource
+        self._policy = policy
+        self._preflight = PreflightResource(policy)
+        self.isLeaf = resource.isLeaf                       # pylint: disable=invalid-name
+
+    def getChildWithDefault(self, path, request):         # pylint: disable=invalid-name
+        if self._policy.is_preflight(request):
+            return self._preflight
+        return self._resource.getChildWithDefault(path, request)
+
+    def render(self, request):
+        if self._policy.is_preflight(request):
+            return self._policy.preflight(request)
+        return self._resource.render(request)
+
+
+DEFAULT_CORS = CorsPolicy()
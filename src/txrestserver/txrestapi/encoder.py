@@ -0,0 +1,115 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+try:
+    import orjson
+
+except ImportError:         # pragma: no cover
+    orjson = None
+
+BACKENDS = ('json', 'orjson', 'auto')
+
+
+class EncodedJson(bytes):
+    """
+    A handler result that is already a serialized JSON document.  It is sent
+    as is, without being encoded again.
+    """
+    __slots__ = ()
+
+
+class JsonEncoder:
+    """
+    Serializes API handler results to compact JSON bytes
+
+    The 'json' backend uses the standard library and is the default.  The
+    'orjson' backend writes bytes directly and is considerably faster but
+    requires the optional orjson package.  'auto' selects orjson if it is
+    installed.  Values orjson cannot encode (such as integers larger than
+    64 bits) are encoded with the standard library.
+    """
+    def __init__(self, sort_keys=True, backend='json'):
+        """
+        Encoder initialization
+
+        :param sort_keys: (bool) Output dictionaries sorted by key
+        :param backend: (str) One of 'json', 'orjson', or 'auto'
+        """
+        if backend not in BACKENDS:
+            raise ValueError("JSON backend must be one of {}".format(', '.join(BACKENDS)))
+
+        if backend == 'auto':
+            backend = 'orjson' if orjson is not None else 'json'
+
+        if backend == 'orjson' and orjson is None:
+            raise ValueError('The orjson JSON backend is not installed')
+
+        self._backend = backend
+        self._sort_keys = sort_keys
+        self._encoder = json.JSONEncoder(separators=(',', ':'), sort_keys=sort_keys)
+        self._options = 0
+
+        if backend == 'orjson':
+            self._options = orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                self._options |= orjson.OPT_SORT_KEYS
+
+    def __repr__(self):
+        return 'JsonEncoder(sort_keys={}, backend={!r})'.format(self._sort_keys, self._backend)
+
+    @property
+    def backend(self):
+        """ Name of the JSON backend in use """
+        return self._backend
+
+    @property
+    def sort_keys(self):
+        """ True if dictionaries are output sorted by key """
+        return self._sort_keys
+
+    def encode(self, output_object):
+        """
+        Serialize an object
+
+        :param output_object: Object to serialize
+        :return: (bytes) JSON document
+        """
+        if isinstance(output_object, EncodedJson):
+            return output_object
+
+        if self._backend == 'orjson':
+            try:
+                return orjson.dumps(output_object, option=self._options)
+
+            except TypeError:
+                pass
+
+        return self._encoder.encode(output_object).encode()
+
+    def iterencode(self, output_object):
+        """
+        Serialize an object incrementally
+
+        Streaming always uses the standard library encoder since orjson can only
+        produce the complete document.
+
+        :param output_object: Object to serialize
+        :return: (iterator) (str) pieces of the JSON document
+        """
+        return self._encoder.iterencode(output_object)
+
+
+DEFAULT_ENCODER = JsonEncoder()
@@ -1,18 +1,247 @@
 # pylint: skip-file
+import asyncio
+import hashlib
 import re
-import json
 import time
 
+from collections import Counter
+
 from functools import wraps
+from inspect import getattr_static, iscoroutine, iscoroutinefunction, isfunction, ismethod
 
+from twisted.web.http import OK, NOT_MODIFIED, SERVICE_UNAVAILABLE, GATEWAY_TIMEOUT, \
+    datetimeToString, stringToDatetime
 from twisted.web.resource import Resource, NoResource
 from twisted.web.server import NOT_DONE_YET
-from twisted.internet.defer import Deferred
+from twisted.internet import reactor
+from twisted.internet import defer, error as twerror
+from twisted.internet.defer import CancelledError, Deferred, ensureDeferred, fail
 from twisted.python import log as twlog
+from twisted.python.failure import Failure
+
+from ..cache import LRUCache
+from ..pools import DEFAULT_POOLS
+from ..process_pool import ProcessPool, ProcessRequest, call_handler
+from .admission import Overloaded, admit
+from .cors import DEFAULT_CORS, PreflightResource
+from .encoder import DEFAULT_ENCODER, EncodedJson
+from .rate_limit import RateLimited, TOO_MANY_REQUESTS
+from .methods import collect_routes
+from .router import RouteTree
+from .streaming import JsonProducer, DEFAULT_CHUNK_SIZE
+
+# Route options accepted by JsonAPIResource.register() and the route decorators
+#   stream: (bool) Encode and write the response incrementally, see JsonProducer
+#   compress: (bool) False to never compress responses of the route, see JsonAPIResource.compression
+#   cache: (ResponseCache) Cache serialized GET/HEAD responses of the route
+#   deadline: (float) Seconds a Deferred result may take before it is cancelled and a
+#             504 error returned, None for no deadline.  See JsonAPIResource.default_deadline
+#   limit: (AdmissionLimit) Concurrency limit of the route, in addition to JsonAPIResource.admission_limit
+#   bypass_limits: (bool) Never queue, reject or rate limit requests of the route, e.g. for health checks
+#   cost: (float) Tokens a request of the route takes from JsonAPIResource.rate_limiter, default 1
+#   blocking: (bool or str) Call the handler in a worker thread, in the JsonAPIResource.blocking_pool
+#             worker pool if True or in the named pool.  For handlers that call blocking libraries
+#   process: (bool or ProcessPool) Call the handler in a worker process, in JsonAPIResource.process_pool
+#            if True.  For CPU-bound handlers, see txrestserver.process_pool
+ROUTE_OPTIONS = frozenset(('stream', 'compress', 'cache', 'deadline', 'limit', 'bypass_limits', 'cost',
+                           'blocking', 'process'))
+
+_NO_OPTIONS = {}
+
+_CONDITIONAL_METHODS = (b'GET', b'HEAD')
+
+# Handler failures reported as '504 Gateway Timeout', including expired route deadlines
+_TIMEOUT_ERRORS = (defer.TimeoutError, twerror.TimeoutError, TimeoutError)
+
+
+def _compile(regex):
+    if isinstance(regex, str):
+        regex = regex.encode()
+    return re.compile(regex)
+
+
+def _check_options(options, callback=None, bound=False):
+    unknown = set(options) - ROUTE_OPTIONS
+    if unknown:
+        raise TypeError('Unsupported route option(s): {}'.format(', '.join(sorted(unknown))))
+    if options.get('stream') and options.get('cache') is not None:
+        raise TypeError('Streamed routes cannot be cached')
+    if options.get('process') and (options.get('blocking') or options.get('stream')):
+        raise TypeError('Routes run in a process cannot also be blocking or streamed')
+    if (options.get('process') or options.get('blocking')) and iscoroutinefunction(callback):
+        # A coroutine cannot be pickled for a process, nor awaited in a worker thread
+        raise ValueError("'async def' handlers cannot be run in a process or worker thread")
+    if options.get('process') and bound:
+        # Pickling a bound method pickles its resource, with its pools and reactor
+        raise ValueError('Routes run in a process require a module level function or staticmethod handler')
+    return options or _NO_OPTIONS
+
+
+def _is_bound(callback):
+    """ True if the callback is a method bound to an instance """
+    return ismethod(callback) and not isinstance(callback.__self__, type)
+
+
+def _exceeds(output_object, limit):
+    """
+    Cheap estimate of serialization cost.  Counts one unit per JSON value plus
+    one per 64 characters of string data and stops as soon as 'limit' is passed.
+    """
+    count, stack = 0, [output_object]
+    while stack:
+        value = stack.pop()
+        count += 1
+        if isinstance(value, dict):
+            count += len(value)
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, str):
+            count += len(value) >> 6
+        if count > limit:
+            return True
+    return False
+
+
+def _etag(body, encoding=None):
+    """ Strong entity tag of a response body, distinct for each content-coding """
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    if encoding is not None:
+        digest += '-' + encoding.decode()
+    return '"{}"'.format(digest).encode()
+
+
+def _etag_matches(if_none_match, etag):
+    """ Weak comparison of an ETag with the tags of an If-None-Match header """
+    if if_none_match.strip() == b'*':
+        return True
+
+    for candidate in if_none_match.split(b','):
+        candidate = candidate.strip()
+        if candidate.startswith(b'W/'):
+            candidate = candidate[2:]
+        if candidate == etag or (etag.startswith(b'W/') and candidate == etag[2:]):
+            return True
+    return False
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """
+    Conditional GET support for route handlers.  Sets the ETag and/or
+    Last-Modified response headers and checks them against the request's
+    If-None-Match or If-Modified-Since header.  A handler that gets True back
+    can return None; the response is sent as '304 Not Modified' without
+    building or serializing a result.
+
+    :param request: (Request) Request
+    :param etag: (str or bytes) Version of the resource, quoted if it is not already
+    :param last_modified: (float) Modification time of the resource, seconds since the epoch
+    :return: (bool) True if the client's copy is current
+    """
+    if etag is not None:
+        if isinstance(etag, str):
+            etag = etag.encode()
+        if not etag.endswith(b'"'):
+            etag = b'"' + etag + b'"'
+        request.responseHeaders.setRawHeaders(b'ETag', [etag])
+
+    if last_modified is not None:
+        request.responseHeaders.setRawHeaders(b'Last-Modified', [datetimeToString(last_modified)])
+
+    if request.method not in _CONDITIONAL_METHODS:
+        return False
+
+    current = False
+    if_none_match = request.getHeader(b'if-none-match')
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 7232, 3.3)
+        current = etag is not None and _etag_matches(if_none_match, etag)
+
+    elif last_modified is not None:
+        since = request.getHeader(b'if-modified-since')
+        if since is not None:
+            try:
+                current = stringToDatetime(since) >= int(last_modified)
+            except ValueError:
+                pass
+
+    if current:
+        request.setResponseCode(NOT_MODIFIED)
+    return current
+
+
+def remaining_time(request):
+    """
+    Time left before the deadline of a request expires.  Pass it on as the
+    timeout of nested calls so they give up once the response is no longer wanted.
+
+    :param request: (Request) Request
+    :return: (float) Seconds remaining, or None if the request has no deadline
+    """
+    deadline = getattr(request, '_txrestapi_deadline', None)
+    if deadline is None:
+        return None
+
+    expires, clock = deadline
+    return max(0.0, expires - clock.seconds())
+
+
+def _waiting(d):
+    """ True if a Deferred has no result yet, including when it is waiting on another Deferred """
+    return not d.called or isinstance(d.result, Deferred)
+
+
+def _decode_args(args):
+    return {k: v.decode() if v is not None else v for k, v in args.items()} if args else {}
 
 
 def _to_json(output_object):
-    return (json.dumps(output_object, indent=None, separators=(',', ':'), sort_keys=True)).encode()
+    return DEFAULT_ENCODER.encode(output_object)
+
+
+def _set_headers(request, execution_time=None, cors=DEFAULT_CORS):
+    """
+    The CORS headers will allow you to call API methods from web browsers, see CorsPolicy
+    """
+    request.responseHeaders.addRawHeader(b'content-type', b'application/json')
+    if cors is not None:
+        cors.set_headers(request)
+    if execution_time is not None:
+        if not isinstance(execution_time, bytes):
+            execution_time = execution_time.encode('utf8')
+        request.responseHeaders.addRawHeader(b'X-Execution-Time', execution_time)
+
+        # Part of the execution time a blocking handler spent waiting for a worker thread
+        queue_time = getattr(request, '_txrestapi_queue_time', None)
+        if queue_time is not None:
+            request.responseHeaders.addRawHeader(b'X-Queue-Time', ('%3.6f' % queue_time).encode('utf8'))
+    return request
+
+
+def _execution_time(executed):
+    return '%3.6f' % (time.time() - executed)
+
+
+def _finish(request, raw):
+    if request.channel:
+        request.write(raw)
+        request.finish()
+    else:
+        twlog.err('REST API connection channel already closed')
+
+
+def _error(err):
+    return dict(status='ERROR', errors=[str(err), ])
+
+
+def _write_result(result, request, executed, encoder=DEFAULT_ENCODER):
+    _set_headers(request, execution_time=_execution_time(executed))
+    _finish(request, encoder.encode(result))
+
+
+def _write_error(err, request, executed, encoder=DEFAULT_ENCODER):
+    _set_headers(request, execution_time=_execution_time(executed))
+    _finish(request, encoder.encode(_error(err)))
 
 
 class _JsonResource(Resource):
@@ -25,23 +254,10 @@ class _JsonResource(Resource):
         self._executed = now
 
     def _setHeaders(self, request, execution_time=None):
-        """
-        Those headers will allow you to call API methods from web browsers, they require CORS:
-            https://en.wikipedia.org/wiki/Cross-origin_resource_sharing
-        """
-        request.responseHeaders.addRawHeader(b'content-type', b'application/json')
-        request.responseHeaders.addRawHeader(b'Access-Control-Allow-Origin', b'*')
-        request.responseHeaders.addRawHeader(b'Access-Control-Allow-Methods', b'GET, POST, PUT, DELETE, PATCH')
-        request.responseHeaders.addRawHeader(b'Access-Control-Allow-Headers', b'x-requested-with')
-        request.responseHeaders.addRawHeader(b'Access-Control-Max-Age', b'10')
-        if execution_time is not None:
-            if not isinstance(execution_time, bytes):
-                execution_time = execution_time.encode('utf8')
-            request.responseHeaders.addRawHeader(b'X-Execution-Time', execution_time)
-        return request
+        return _set_headers(request, execution_time=execution_time)
 
     def render(self, request):
-        exec_time = '%3.6f' % (time.time() - self._executed)
+        exec_time = _execution_time(self._executed)
         self._setHeaders(request, execution_time=exec_time)
         return _to_json(self._result)
 
@@ -53,27 +269,19 @@ class _DelayedJsonResource(_JsonResource):
     """
 
     def _cb(self, result, request):
-        exec_time = '%3.6f' % (time.time() - self._executed)
-        self._setHeaders(request, execution_time=exec_time)
-
-        raw = _to_json(result)
-        if request.channel:
-            request.write(raw)
-            request.finish()
-        else:
-            twlog.err('REST API connection channel already closed')
+        _write_result(result, request, self._executed)
 
     def _eb(self, err, request):
-        execution = '%3.6f' % (time.time() - self._executed)
-        self._setHeaders(request, execution_time=execution)
-        raw = _to_json(dict(status='ERROR', errors=[str(err), ]))
-        if request.channel:
-            request.write(raw)
-            request.finish()
-        else:
-            twlog.err('REST API connection channel already closed')
+        if err.check(CancelledError) and not request.channel:
+            return
+        _write_error(err, request, self._executed)
+
+    def _cancel(self, _reason):
+        if not self._result.called:
+            self._result.cancel()
 
     def render(self, request):
+        request.notifyFinish().addErrback(self._cancel)
         self._result.addCallback(self._cb, request)
         self._result.addErrback(self._eb, request)
         return NOT_DONE_YET
@@ -87,7 +295,10 @@ def maybeResource(f):
             result = f(*args, **kwargs)
 
         except Exception as exc:
-            return _JsonResource(dict(status='ERROR', errors=[str(exc), ]), _executed)
+            return _JsonResource(_error(exc), _executed)
+
+        if iscoroutine(result):
+            result = ensureDeferred(result)
 
         if isinstance(result, Deferred):
             return _DelayedJsonResource(result, _executed)
@@ -99,19 +310,255 @@ def maybeResource(f):
     return inner
 
 
+class _ResultRenderer(Resource):
+    """
+    Leaf resource shared by all requests of a JsonAPIResource.
+
+    JsonAPIResource.getChild runs the route handler and stores its result on
+    the request, so no wrapper function or Resource has to be created per
+    request just to render a value.
+    """
+    isLeaf = True
+
+    def __init__(self, api):
+        Resource.__init__(self)
+        self._api = api
+
+    def render(self, request):
+        result = request._txrestapi_result
+        request._txrestapi_result = None
+
+        if isinstance(result, Deferred):
+            timeout = remaining_time(request)
+            if timeout is not None:
+                result.addTimeout(timeout, request._txrestapi_deadline[1])
+
+            # Stop the handler's work if the client goes away before it completes
+            request.notifyFinish().addErrback(self._cancel, result)
+            # Chained so that a result that cannot be rendered still gets an error response
+            result.addCallback(self._write_result, request).addErrback(self._write_error, request)
+            return NOT_DONE_YET
+
+        return self._render_result(result, request)
+
+    def _cancel(self, _reason, result):
+        """ Connection lost, cancel the handler's Deferred which propagates to what it waits on """
+        if _waiting(result):
+            self._api._stats['cancelled'] += 1
+            result.cancel()
+
+    def _render_result(self, result, request):
+        """ Returns the encoded result, or NOT_DONE_YET if it is streamed or encoded off the reactor """
+        api = self._api
+        options = request._txrestapi_options
+
+        if request.code == NOT_MODIFIED:
+            # The handler found the client's copy to be current, see not_modified()
+            api._stats['not_modified'] += 1
+            _set_headers(request, execution_time=_execution_time(request._txrestapi_executed), cors=api.cors)
+            return b''
+
+        policy = api.compression if options.get('compress', True) else None
+        encoding = policy.negotiate(request) if policy is not None else None
+
+        if options.get('stream'):
+            self._set_headers(request, policy, encoding)
+            compressor = policy.compressor(encoding) if encoding is not None else None
+            JsonProducer(request, api.json_encoder.iterencode(result), api.stream_chunk_size,
+                         compressor=compressor).start()
+            return NOT_DONE_YET
+
+        tag = api.etags and request.method in _CONDITIONAL_METHODS and \
+            getattr(request, 'etag', None) is None and not request.responseHeaders.hasHeader(b'etag')
+        if_none_match = request.getHeader(b'if-none-match') if tag else None
+
+        if api.offload_threshold is not None and _exceeds(result, api.offload_threshold):
+            api._stats['offloaded'] += 1
+            d = api.worker_pools.get(api.offload_pool).run(self._encode, result, policy, encoding,
+                                                           tag, if_none_match)
+            d.addCallbacks(self._write_body, self._write_error,
+                           callbackArgs=(request, policy), errbackArgs=(request, ))
+            return NOT_DONE_YET
+
+        return self._response(request, policy, self._encode(result, policy, encoding, tag, if_none_match))
+
+    def _encode(self, result, policy, encoding, tag, if_none_match):
+        """
+        Serialize, tag, and if negotiated, compress a result.  Runs in a worker
+        thread for offloaded results.
+
+        :return: (tuple) Response body, the content-coding applied or None, the
+                         ETag or None, and the uncompressed JSON document.  The
+                         body is None if 'if_none_match' matches the ETag, in
+                         which case it is not compressed.
+        """
+        document = body = self._api.json_encoder.encode(result)
+        if policy is not None and encoding is not None:
+            encoding = policy.select(body, encoding)
+
+        etag = None
+        if tag:
+            etag = _etag(body, encoding)
+            if if_none_match is not None and _etag_matches(if_none_match, etag):
+                return None, encoding, etag, document
+
+        if encoding is not None:
+            body, encoding = policy.compress(body, encoding)
+        return body, encoding, etag, document
+
+    def _response(self, request, policy, encoded):
+        """ Set the response headers for an encoded result and return the body to send """
+        body, encoding, etag, document = encoded
+        cache_key = request._txrestapi_cache_key
+        if cache_key is not None and request.code == OK:
+            if not isinstance(document, EncodedJson):
+                document = EncodedJson(document)
+            request._txrestapi_options['cache'].put(cache_key, document)
+
+        if etag is not None:
+            request.responseHeaders.addRawHeader(b'ETag', etag)
+
+        if body is None:
+            self._api._stats['not_modified'] += 1
+            request.setResponseCode(NOT_MODIFIED)
+            _set_headers(request, execution_time=_execution_time(request._txrestapi_executed), cors=self._api.cors)
+            return b''
+
+        self._set_headers(request, policy, encoding)
+        return body
+
+    def _set_headers(self, request, policy, encoding):
+        _set_headers(request, execution_time=_execution_time(request._txrestapi_executed), cors=self._api.cors)
+        if policy is not None:
+            request.responseHeaders.addRawHeader(b'Vary', b'Accept-Encoding')
+            if encoding is not None:
+                request.responseHeaders.addRawHeader(b'Content-Encoding', encoding)
+                self._api._stats['compressed'] += 1
+
+    def _write_body(self, encoded, request, policy):
+        _finish(request, self._response(request, policy, encoded))
+
+    def _write_result(self, result, request):
+        if not request.channel:
+            twlog.err('REST API connection channel already closed')
+            return
+
+        body = self._render_result(result, request)
+        if body is not NOT_DONE_YET:
+            _finish(request, body)
+
+    def _write_error(self, err, request):
+        if err.check(CancelledError) and not request.channel:
+            return      # Cancelled since the client disconnected, see _cancel()
+
+        if err.check(RateLimited):
+            self._api._stats['rate_limited'] += 1
+            request.setResponseCode(TOO_MANY_REQUESTS)
+            request.setHeader(b'Retry-After', str(err.value.retry_after).encode())
+
+        elif err.check(Overloaded):
+            self._api._stats['rejected'] += 1
+            request.setResponseCode(SERVICE_UNAVAILABLE)
+            request.setHeader(b'Retry-After', str(err.value.retry_after).encode())
+
+        elif err.check(*_TIMEOUT_ERRORS):
+            self._api._stats['timed_out'] += 1
+            request.setResponseCode(GATEWAY_TIMEOUT)
+            if err.check(defer.TimeoutError):
+                err = 'Request deadline exceeded'
+
+        _set_headers(request, execution_time=_execution_time(request._txrestapi_executed), cors=self._api.cors)
+        _finish(request, self._api.json_encoder.encode(_error(err)))
+
+
 class JsonAPIResource(Resource):
 
     _registry = None
+    _router = None
+    _route_cache = None
+    _preflight = None
+
+    # Set to True (in a subclass or on an instance) to dispatch requests through
+    # a compiled route tree instead of a linear scan of the route registry.
+    compiled_routes = False
+
+    # Number of (method, path) route resolutions to remember in an LRU cache.
+    # Zero disables the cache.
+    route_cache_size = 0
+
+    # Serializer for handler results.  Use a JsonEncoder(sort_keys=False) to skip
+    # key sorting or backend='auto' to use orjson when it is installed.
+    json_encoder = DEFAULT_ENCODER
+
+    # Approximate size of each chunk written by routes with the 'stream' option
+    stream_chunk_size = DEFAULT_CHUNK_SIZE
+
+    # Results estimated to be larger than this (roughly the number of JSON values)
+    # are serialized in the 'offload_pool' worker pool instead of on the reactor
+    # thread.  None disables offloading.
+    offload_threshold = None
+    offload_pool = 'serialize'
+    worker_pools = DEFAULT_POOLS
+
+    # Worker pool of routes with the 'blocking' option, unless the route names its own
+    # pool.  Separate pools keep slow handlers from starving the threads of others.
+    blocking_pool = 'blocking'
+
+    # ProcessPool of routes with the 'process' option set to True, created with
+    # the default settings on first use if None.  Such handlers receive a
+    # ProcessRequest and their results are JSON encoded in the worker process.
+    process_pool = None
+
+    # CompressionPolicy used to gzip/deflate responses the client accepts in
+    # compressed form.  None disables compression.
+    compression = None
+
+    # Set to True to send a strong ETag, computed from the serialized body, with
+    # every GET/HEAD response and answer a matching If-None-Match with '304 Not
+    # Modified'.  Handlers can avoid building their result with not_modified().
+    etags = False
+
+    # CorsPolicy for the CORS headers of each response and for answering preflight
+    # (OPTIONS) requests without dispatching them to a route.  None disables CORS.
+    cors = DEFAULT_CORS
+
+    # Set to True to run 'async def' handlers as asyncio tasks so they can await
+    # asyncio-native libraries.  Requires the asyncio reactor, see
+    # txrestserver.asyncio_reactor.  Otherwise handlers are run with ensureDeferred()
+    # and can await Deferreds.
+    asyncio_handlers = False
+
+    # Seconds a Deferred result may take before it is cancelled and a '504 Gateway
+    # Timeout' error returned, unless a route has its own 'deadline' option.  None
+    # for no deadline.  Handlers can get the time left with remaining_time().
+    default_deadline = None
+    clock = reactor
+
+    # AdmissionLimit shared by all routes except those with the 'bypass_limits' option.
+    # Requests over the limit are queued and, once the queue is full, rejected with
+    # '503 Service Unavailable'.  None for no limit.
+    admission_limit = None
+
+    # RateLimiter applied to all routes except those with the 'bypass_limits' option.
+    # Clients over their rate get '429 Too Many Requests'.  None for no rate limit.
+    rate_limiter = None
+
+    # (attribute-name, method, compiled-regex, options) for each decorated route of the class
+    _routes = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Handlers defined as plain functions in the class are bound to each instance
+        cls._routes = tuple((name, method, _compile(regex),
+                             _check_options(options, getattr(cls, name), isfunction(getattr_static(cls, name))))
+                            for name, method, regex, options in collect_routes(cls))
 
     def __new__(cls, *args, **kwds):
-        instance = super().__new__(cls, *args, **kwds)
-        instance._registry = []
-        for name in dir(instance):
-            attribute = getattr(instance, name)
-            annotations = getattr(attribute, "__txrestapi__", [])
-            for annotation in annotations:
-                method, regex = annotation
-                instance.register(method, regex, attribute)
+        instance = super().__new__(cls)
+        instance._registry = [(method, regex, instance._handler(getattr(instance, name)), options)
+                              for name, method, regex, options in cls._routes]
+        instance._renderer = _ResultRenderer(instance)
+        instance._stats = Counter()
         return instance
 
     def __init__(self, *args, **kwargs):
@@ -120,46 +567,247 @@ class JsonAPIResource(Resource):
         #     self._registry = []
 
     def _get_callback(self, request):
+        callback, _, args = self._get_route(request)
+        return callback, args
+
+    def _get_route(self, request):
+        """ Find the route for a request, returns (callback, options, args) """
         request_method = request.method
         path_to_check = getattr(request, '_remaining_path', request.path)
-        if not isinstance(path_to_check, str):
-            path_to_check = path_to_check.decode()
+        if isinstance(path_to_check, str):
+            path_to_check = path_to_check.encode()
+
+        cache = self._route_cache
+        if self.route_cache_size:
+            if cache is None or cache.max_size != self.route_cache_size:
+                cache = self._route_cache = LRUCache(self.route_cache_size)
+
+            key = (request_method, path_to_check)
+            route = cache.get(key)
+            if route is None:
+                route = self._resolve(request_method, path_to_check)
+                cache.put(key, route)
+        else:
+            route = self._resolve(request_method, path_to_check)
 
-        for m, r, cb in self._registry:
+        callback, options, args, remaining_path = route
+        if callback is None:
+            return None, None, None
+
+        request._remaining_path = remaining_path
+        return callback, options, args
+
+    def _resolve(self, request_method, path_to_check):
+        """ Find the route for a method and path, returns (callback, options, args, remaining-path) """
+        if self.compiled_routes:
+            router = self._router
+            if router is None:
+                router = self._router = RouteTree([(m, r, (cb, opts)) for m, r, cb, opts in self._registry])
+
+            target, args, end = router.lookup(request_method, path_to_check)
+            if target is None:
+                return None, None, None, None
+            return target[0], target[1], _decode_args(args), path_to_check[end:]
+
+        for m, r, cb, opts in self._registry:
             if m == request_method or m == b'ALL':
                 result = r.search(path_to_check)
                 if result:
-                    request._remaining_path = path_to_check[result.span()[1]:]
-                    return cb, result.groupdict()
-        return None, None
+                    return cb, opts, _decode_args(result.groupdict()), path_to_check[result.span()[1]:]
+        return None, None, None, None
+
+    def _handler(self, callback):
+        """
+        Route handler to register for a callback.  Coroutines returned by 'async def'
+        callbacks are run with ensureDeferred(), or as asyncio tasks if
+        'asyncio_handlers' is set, and rendered once they complete.
+        """
+        if not iscoroutinefunction(callback):
+            return callback
+
+        @wraps(callback)
+        def handler(*args, **kwargs):
+            coroutine = callback(*args, **kwargs)
+            if self.asyncio_handlers:
+                return Deferred.fromFuture(asyncio.ensure_future(coroutine))
+            return ensureDeferred(coroutine)
+
+        return handler
+
+    def _blocking_pools(self):
+        """ Names of the worker pools used by 'blocking' routes """
+        return {self.blocking_pool if options['blocking'] is True else options['blocking']
+                for _, _, _, options in self._registry if options.get('blocking')}
+
+    def _call(self, callback, options, request, args):
+        """ Call a route handler, in a worker thread or process if the route's options say so """
+        if options.get('blocking'):
+            return self._call_blocking(options['blocking'], callback, request, args)
+        if options.get('process'):
+            return self._call_process(options['process'], callback, request, args)
+        return callback(request, **args)
+
+    def _call_blocking(self, pool, callback, request, args):
+        """
+        Call a handler in a worker thread
+
+        :return: (Deferred) Fires with the handler's result on the reactor thread
+        """
+        pool = self.blocking_pool if pool is True else pool
+        queued = time.time()
 
-    def register(self, method, regex, callback):
-        if not isinstance(regex, str):
-            regex = regex.decode()
-        self._registry.append((method, re.compile(regex), callback))
+        def call():
+            request._txrestapi_queue_time = time.time() - queued
+            return callback(request, **args)
+
+        self._stats['blocking'] += 1
+        return self.worker_pools.get(pool).run(call)
+
+    def _call_process(self, pool, callback, request, args):
+        """
+        Call a handler in a worker process
+
+        :return: (Deferred) Fires with the JSON encoded result on the reactor thread
+        """
+        if pool is True:
+            if self.process_pool is None:
+                self.process_pool = ProcessPool()
+            pool = self.process_pool
+
+        self._stats['process'] += 1
+        d = pool.run(call_handler, callback, ProcessRequest(request), args, self.json_encoder)
+        return d.addCallback(EncodedJson)
+
+    def _preflight_resource(self):
+        preflight = self._preflight
+        if preflight is None or preflight[0] is not self.cors:
+            preflight = self._preflight = (self.cors, PreflightResource(self.cors))
+        return preflight[1]
+
+    def _routes_changed(self):
+        self._router = None
+        if self._route_cache is not None:
+            self._route_cache.clear()
+
+    @property
+    def stats(self):
+        """ Dispatch statistics for this resource """
+        stats = dict(self._stats)
+        if self._route_cache is not None:
+            stats['route_cache'] = self._route_cache.stats
+        if self.offload_pool in self.worker_pools:
+            stats['offload_pool'] = self.worker_pools.get(self.offload_pool).stats
+
+        pools = {name: self.worker_pools.get(name).stats for name in self._blocking_pools()
+                 if name in self.worker_pools}
+        if pools:
+            stats['blocking_pools'] = pools
+
+        pools = {regex.pattern.decode(): options['process'].stats
+                 for _, regex, _, options in self._registry if isinstance(options.get('process'), ProcessPool)}
+        if self.process_pool is not None:
+            pools['*'] = self.process_pool.stats
+        if pools:
+            stats['process_pools'] = pools
+
+        limits = {regex.pattern.decode(): options['limit'].stats
+                  for _, regex, _, options in self._registry if options.get('limit') is not None}
+        if self.admission_limit is not None:
+            limits['*'] = self.admission_limit.stats
+        if limits:
+            stats['admission'] = limits
+
+        if self.rate_limiter is not None:
+            stats['rate_limiter'] = self.rate_limiter.stats
+
+        caches = {regex.pattern.decode(): options['cache'].stats
+                  for _, regex, _, options in self._registry if options.get('cache') is not None}
+        if caches:
+            stats['response_cache'] = caches
+        return stats
+
+    def register(self, method, regex, callback, **options):
+        """
+        Add a route
+
+        :param method: (bytes) HTTP method or b'ALL'
+        :param regex: (bytes) Regular expression the request path must match
+        :param callback: (callable) Route handler
+        :param options: (dict) Route options, see ROUTE_OPTIONS
+        """
+        self._registry.append((method, _compile(regex), self._handler(callback),
+                               _check_options(options, callback, _is_bound(callback))))
+        self._routes_changed()
 
     def unregister(self, method=None, regex=None, callback=None):
         if regex is not None:
-            if not isinstance(regex, str):
-                regex = regex.decode()
-            regex = re.compile(regex)
+            regex = _compile(regex)
 
-        for m, r, cb in self._registry[:]:
+        for route in self._registry[:]:
+            m, r, cb, _ = route
             if not method or (method and m == method):
                 if not regex or (regex and r == regex):
-                    if not callback or (callback and cb == callback):
-                        self._registry.remove((m, r, cb))
+                    if not callback or (callback and callback in (cb, getattr(cb, '__wrapped__', None))):
+                        self._registry.remove(route)
+        self._routes_changed()
 
     def getChild(self, name, request):
         r = self.children.get(name, None)
-        if r is None:
-            # Go into the thing
-            callback, args = self._get_callback(request)
-            if callback is None:
-                if isinstance(name, bytes):
-                    name = name.decode()
-                return NoResource(message='path %r not found' % name)
-            else:
-                return maybeResource(callback)(request, **args)
-        else:
+        if r is not None:
             return r
+
+        if request.method == b'OPTIONS' and self.cors is not None and self.cors.is_preflight(request):
+            return self._preflight_resource()
+
+        # Go into the thing
+        callback, options, args = self._get_route(request)
+        if callback is None:
+            if isinstance(name, bytes):
+                name = name.decode()
+            return NoResource(message='path %r not found' % name)
+
+        executed = time.time()
+        deadline = options.get('deadline', self.default_deadline)
+        if deadline is not None:
+            request._txrestapi_deadline = (self.clock.seconds() + deadline, self.clock)
+
+        result = cache_key = admitted = None
+        if self.rate_limiter is not None and not options.get('bypass_limits'):
+            retry_after = self.rate_limiter.consume(request, options.get('cost', 1))
+            if retry_after:
+                admitted = fail(RateLimited(retry_after))
+
+        cache = options.get('cache')
+        if admitted is None and cache is not None and request.method in _CONDITIONAL_METHODS:
+            cache_key = cache.key(request, callback, args)
+            result = cache.get(cache_key)
+
+        if result is not None:
+            cache_key = None
+        elif admitted is None and (self.admission_limit is not None or 'limit' in options) \
+                and not options.get('bypass_limits'):
+            limits = [limit for limit in (options.get('limit'), self.admission_limit) if limit is not None]
+            admitted = admit(request, limits)
+
+        if admitted is not None and (_waiting(admitted) or isinstance(admitted.result, Failure)):
+            # Queued, the handler is called once admitted, or rejected
+            result = admitted.addCallback(lambda _: self._call(callback, options, request, args))
+
+        elif result is None:
+            try:
+                if options.get('blocking') or options.get('process'):
+                    result = self._call(callback, options, request, args)
+                else:
+                    result = callback(request, **args)
+
+            except Exception as exc:
+                result, cache_key = _error(exc), None
+
+            if isinstance(result, Resource):
+                return result
+
+        request._txrestapi_result = result
+        request._txrestapi_executed = executed
+        request._txrestapi_options = options
+        request._txrestapi_cache_key = cache_key
+        return self._renderer
@@ -30,11 +30,16 @@ def method_factory_factory(method):
     #     addClassAdvisor(advisor)
     #     return decorator
 
-    def factory_py3(regex):
+    def factory_py3(regex, **options):
+        """
+        Route decorator
 
+        :param regex: (bytes) Regular expression the request path must match
+        :param options: (dict) Route options, see JsonAPIResource.register()
+        """
         def decorator(f):
             current_methods = getattr(f, '__txrestapi__', [])
-            current_methods.append((method, regex, ))
+            current_methods.append((method, regex, options))
             f.__txrestapi__ = current_methods
             return f
 
@@ -44,6 +49,24 @@ def method_factory_factory(method):
     return factory
 
 
+def collect_routes(cls):
+    """
+    Find the decorated route handlers of a class
+
+    Routes are returned in dir() order, which is the order they are registered in
+    and therefore the order in which they are matched.
+
+    :param cls: (type) Resource class
+    :return: (list) (attribute-name, method, regex, options) tuples
+    """
+    routes = []
+    for name in dir(cls):
+        attribute = getattr(cls, name, None)
+        for method, regex, options in getattr(attribute, '__txrestapi__', []):
+            routes.append((name, method, regex, options))
+    return routes
+
+
 ALL = method_factory_factory(b'ALL')
 GET = method_factory_factory(b'GET')
 POST = method_factory_factory(b'POST')
@@ -0,0 +1,157 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import time
+
+from collections import OrderedDict
+
+DEFAULT_MAX_CLIENTS = 10000
+
+TOO_MANY_REQUESTS = 429         # Not defined by twisted.web.http
+
+
+class RateLimited(Exception):
+    """ A request was rejected by a RateLimiter """
+    def __init__(self, retry_after):
+        super().__init__('Rate limit exceeded, retry after {} second(s)'.format(retry_after))
+        self.retry_after = retry_after
+
+
+def peer_key(request):
+    """ Rate limit key of the client's network address """
+    address = request.getClientAddress()
+    return getattr(address, 'host', None) or str(address)
+
+
+def client_key(request):
+    """ Rate limit key of the authenticated user, or of the network address without authentication """
+    avatar_id = getattr(request, 'avatar_id', None)
+    return ('avatar', avatar_id) if avatar_id is not None else peer_key(request)
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter with one bucket per client
+
+    Each client may make 'burst' requests at once and 'rate' requests per
+    second on average.  A bucket that has been idle long enough to refill is
+    indistinguishable from a new one, so it is dropped; only clients seen in
+    the last burst/rate seconds take up memory.  Routes can weigh their
+    requests with the 'cost' option.
+    """
+    def __init__(self, rate, burst=None, key=client_key, max_clients=DEFAULT_MAX_CLIENTS,
+                 timer=time.monotonic):
+        """
+        Limiter initialization
+
+        :param rate: (float) Requests per second allowed per client, on average
+        :param burst: (float) Bucket size, the number of requests a client can make at once.
+                      Defaults to one second of requests
+        :param key: (callable) Returns the client key of a request, see client_key() and peer_key()
+        :param max_clients: (int) Maximum number of clients tracked, least recently seen
+                            clients are dropped first
+        :param timer: (callable) Clock, returns seconds
+        """
+        if rate <= 0:
+            raise ValueError('Rate must be greater than zero')
+
+        burst = rate if burst is None else burst
+        if burst < 1:
+            raise ValueError('Burst size must allow at least one request')
+
+        self._rate = float(rate)
+        self._burst = float(burst)
+        self._refill_time = self._burst / self._rate
+        self._key = key
+        self._max_clients = max_clients
+        self._timer = timer
+        self._buckets = OrderedDict()      # key -> [tokens, time of last update]
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    @property
+    def stats(self):
+        """ Limiter statistics """
+        return {
+            'rate': self._rate,
+            'burst': self._burst,
+            'clients': len(self._buckets),
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'evicted': self.evicted,
+        }
+
+    def consume(self, request, cost=1):
+        """
+        Take tokens for a request from its client's bucket
+
+        :param request: (Request) Request
+        :param cost: (float) Number of tokens the request costs
+        :return: (int) 0 if the request is allowed, otherwise the number of seconds
+                       until the client has enough tokens for it
+        """
+        now = self._timer()
+        key = self._key(request)
+        buckets = self._buckets
+        cost = min(cost, self._burst)
+
+        bucket = buckets.get(key)
+        if bucket is None:
+            tokens = self._burst
+            bucket = buckets[key] = [tokens, now]
+        else:
+            tokens = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+            buckets.move_to_end(key)
+
+        if tokens >= cost:
+            bucket[0], bucket[1] = tokens - cost, now
+            self.allowed += 1
+            retry_after = 0
+        else:
+            bucket[0], bucket[1] = tokens, now
+            self.limited += 1
+            retry_after = max(1, math.ceil((cost - tokens) / self._rate))
+
+        self._evict(now)
+        return retry_after
+
+    def _evict(self, now):
+        """ Drop buckets that are full again, and the least recently used ones over 'max_clients' """
+        buckets = self._buckets
+        while len(buckets) > self._max_clients:
+            buckets.popitem(last=False)
+            self.evicted += 1
+
+        # Each call adds at most one bucket, so removing up to two drains idle
+        # buckets over time while consume() remains O(1)
+        for _ in range(2):
+            if not buckets:
+                break
+            key = next(iter(buckets))
+            if now - buckets[key][1] < self._refill_time:
+                break
+            del buckets[key]
+            self.evicted += 1
+
+    def reset(self, request=None):
+        """ Forget the state of one client, or of all clients """
+        if request is None:
+            self._buckets.clear()
+        else:
+            self._buckets.pop(self._key(request), None)
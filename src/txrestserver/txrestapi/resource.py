@@ -2,6 +2,7 @@
 import re
 from functools import wraps
 from twisted.web.resource import Resource, NoResource
+from .methods import collect_routes
 
 
 class _FakeResource(Resource):
@@ -28,16 +29,17 @@ def maybeResource(f):
 
 class APIResource(Resource):
     _registry = None
+    _routes = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._routes = tuple((name, method, re.compile(regex.decode()))
+                            for name, method, regex, _ in collect_routes(cls))
 
     def __new__(cls, *args, **kwds):
         instance = super().__new__(cls, *args, **kwds)
-        instance._registry = []
-        for name in dir(instance):
-            attribute = getattr(instance, name)
-            annotations = getattr(attribute, "__txrestapi__", [])
-            for annotation in annotations:
-                method, regex = annotation
-                instance.register(method, regex, attribute)
+        instance._registry = [(method, regex, getattr(instance, name))
+                              for name, method, regex in cls._routes]
         return instance
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,116 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+from ..cache import LRUCache
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+class ResponseCache:
+    """
+    Cache of serialized GET/HEAD responses for one or more JsonAPIResource routes
+
+    Pass an instance with the 'cache' route option:
+
+        class MyRestAPI(JsonAPIResource):
+            summary_cache = ResponseCache(ttl=5, query_args=('window', ))
+
+            @GET('^/summary/(?P<name>[^/]+)', cache=summary_cache)
+            def _on_summary(self, request, name):
+                ...
+
+    Responses are keyed by route, path parameters, the values of the selected
+    query arguments and, if 'per_avatar' is set, the authenticated user.  Only
+    successful (200 OK) results are cached; for a handler that returns a
+    Deferred the response is cached when the Deferred fires.
+    """
+    def __init__(self, ttl, max_size=DEFAULT_CACHE_SIZE, query_args=(), per_avatar=False,
+                 timer=time.monotonic):
+        """
+        Cache initialization
+
+        :param ttl: (float) Seconds a response remains valid
+        :param max_size: (int) Maximum number of responses to keep
+        :param query_args: (iterable) Names of the query arguments that select the response
+        :param per_avatar: (bool) Cache responses separately for each authenticated user
+        :param timer: (callable) Clock used for expiration, returns seconds
+        """
+        self._cache = LRUCache(max_size, ttl=ttl, timer=timer)
+        self._query_args = tuple(arg.encode() if isinstance(arg, str) else arg
+                                 for arg in query_args)
+        self._per_avatar = per_avatar
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def ttl(self):
+        """ Seconds a response remains valid """
+        return self._cache.ttl
+
+    @property
+    def stats(self):
+        """ Cache statistics """
+        return self._cache.stats
+
+    def key(self, request, route, args):
+        """
+        Cache key of a request
+
+        :param request: (Request) Request
+        :param route: Route identifier, the route handler
+        :param args: (dict) Path parameters of the route
+        :return: (tuple) Cache key
+        """
+        query = tuple(tuple(request.args.get(name, ())) for name in self._query_args) \
+            if self._query_args else ()
+        avatar_id = getattr(request, 'avatar_id', None) if self._per_avatar else None
+        return route, tuple(sorted(args.items())), query, avatar_id
+
+    def get(self, key):
+        """ Cached response body (EncodedJson) or None """
+        return self._cache.get(key)
+
+    def put(self, key, body):
+        """ Cache a response body (EncodedJson) """
+        self._cache.put(key, body)
+
+    def invalidate(self, params=None, avatar_id=None):
+        """
+        Remove cached responses
+
+        :param params: (dict) Path parameter values that the responses to remove
+                              were requested with.  None matches all responses
+        :param avatar_id: User whose responses to remove, None for all users
+        :return: (int) Number of responses removed
+        """
+        params = tuple(params.items()) if params else ()
+        removed = 0
+
+        for key in self._cache:
+            _, key_params, _, key_avatar_id = key
+            if avatar_id is not None and key_avatar_id != avatar_id:
+                continue
+            if params and not set(params).issubset(key_params):
+                continue
+            self._cache.pop(key)
+            removed += 1
+
+        return removed
+
+    def clear(self):
+        """ Remove all cached responses """
+        self._cache.clear()
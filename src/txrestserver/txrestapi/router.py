@@ -0,0 +1,269 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compiled route dispatch for the JsonAPIResource registry.
+
+Route patterns that are anchored ('^') and made up only of literal path
+segments and simple named parameter segments such as '(?P<key>[^/]*)' are
+placed into a per-method prefix tree.  All other patterns are matched with
+their compiled regular expression.  Paths are matched as raw (bytes) request
+paths.  A lookup always returns the same route as a linear scan of the
+registry would, i.e. the first registered route that matches.
+"""
+import re
+
+_LITERAL_RE = re.compile(r'[\w\-~%:@,;=]+')
+_PARAM_RE = re.compile(r'\(\?P<(?P<name>[A-Za-z_]\w*)>\[\^/\](?P<kind>[*+])\)')
+
+# Supported pattern endings after the last path segment
+_TERMINATORS = ('', '$', '/', '/$', '/?', '/?$')
+
+# Pattern endings that may match only part of the final literal segment
+_PREFIX_TERMINATORS = ('', '/?')
+
+_NO_MATCH = (None, None, None)
+
+
+def parse_route(pattern):
+    """
+    Split a route pattern into path segments
+
+    :param pattern: (str or bytes) Regular expression used to register the route
+
+    :return: (tuple) A list of (literal, parameter-name, non-empty) segment
+                     tuples and the pattern terminator, or None if the pattern
+                     requires regular expression matching
+    """
+    if isinstance(pattern, bytes):
+        pattern = pattern.decode()
+
+    if not pattern.startswith('^'):
+        return None
+
+    segments = []
+    pos, end = 1, len(pattern)
+
+    while pos < end and pattern[pos] == '/' and pattern[pos + 1:pos + 2] not in ('', '?', '$'):
+        pos += 1
+        match = _PARAM_RE.match(pattern, pos)
+        if match is not None:
+            segments.append((None, match.group('name'), match.group('kind') == '+'))
+        else:
+            match = _LITERAL_RE.match(pattern, pos)
+            if match is None:
+                return None
+            segments.append((match.group().encode(), None, False))
+        pos = match.end()
+
+    terminator = pattern[pos:]
+    if terminator not in _TERMINATORS:
+        return None
+
+    return segments, terminator
+
+
+def _terminate(path, pos, terminator):
+    """ Return end of match for a route ending at 'pos' or None if no match """
+    if not terminator:
+        return pos
+
+    length = len(path)
+    slash = path[pos:pos + 1] == b'/'
+    end = pos + 1 if slash else pos         # After an optional '/'
+
+    if terminator == '/?':
+        return end
+
+    if terminator == '/':
+        return end if slash else None
+
+    if terminator == '$':
+        return pos if pos == length else None
+
+    # '/$' and '/?$'
+    if terminator == '/$' and not slash:
+        return None
+    return end if end == length else None
+
+
+class _Node:
+    """ Route tree node for a single path segment """
+    __slots__ = ('literals', 'params', 'routes', 'prefixes', 'first')
+
+    def __init__(self):
+        self.literals = {}      # segment -> _Node
+        self.params = {}        # non-empty required -> _Node
+        self.routes = []        # (index, terminator, names, target)
+        self.prefixes = []      # (index, literal, terminator, names, target)
+        self.first = None       # Lowest route index in this subtree
+
+    def insert(self, index, segments, terminator, target):
+        """ Add a parsed route below this node """
+        names = tuple(name for _, name, _ in segments if name is not None)
+        node = self
+        last = len(segments) - 1
+
+        for position, (literal, name, non_empty) in enumerate(segments):
+            if node.first is None:
+                node.first = index
+
+            if name is None and position == last and terminator in _PREFIX_TERMINATORS:
+                # A trailing literal without a '/' or '$' after it also matches longer segments
+                node.prefixes.append((index, literal, terminator, names, target))
+                return
+
+            if name is None:
+                node = node.literals.setdefault(literal, _Node())
+            else:
+                node = node.params.setdefault(non_empty, _Node())
+
+        if node.first is None:
+            node.first = index
+        node.routes.append((index, terminator, names, target))
+
+    def search(self, path, pos, values, best):
+        """
+        Depth first search for the lowest indexed route that matches
+
+        :param path: (bytes) Path being matched
+        :param pos: (int) Current offset into the path
+        :param values: (list) Parameter values collected so far
+        :param best: (list) [index, end, names, values, target] of best match so far
+        """
+        if self.first is None or self.first >= best[0]:
+            return
+
+        for index, terminator, names, target in self.routes:
+            if index >= best[0]:
+                break
+            end = _terminate(path, pos, terminator)
+            if end is not None:
+                best[:] = [index, end, names, tuple(values), target]
+                break
+
+        if path[pos:pos + 1] != b'/':
+            return
+
+        seg_end = path.find(b'/', pos + 1)
+        if seg_end < 0:
+            seg_end = len(path)
+        segment = path[pos + 1:seg_end]
+        self._search_prefixes(path, pos, segment, values, best)
+
+        child = self.literals.get(segment)
+        if child is not None:
+            child.search(path, seg_end, values, best)
+
+        for non_empty, child in self.params.items():
+            if segment or not non_empty:
+                values.append(segment)
+                child.search(path, seg_end, values, best)
+                values.pop()
+
+    def _search_prefixes(self, path, pos, segment, values, best):
+        """ Match the routes that end with a literal prefix of the next segment """
+        for index, literal, terminator, names, target in self.prefixes:
+            if index >= best[0]:
+                break
+            if segment.startswith(literal):
+                end = pos + 1 + len(literal)
+                if terminator and path[end:end + 1] == b'/':
+                    end += 1
+                best[:] = [index, end, names, tuple(values), target]
+                break
+
+
+class _MethodRoutes:
+    """ Route tree and regular expression fallbacks for one HTTP method """
+    __slots__ = ('tree', 'fallbacks')
+
+    def __init__(self):
+        self.tree = _Node()
+        self.fallbacks = []     # (index, compiled regex, target)
+
+    def lookup(self, path):
+        """
+        Find the first route that matches a path
+
+        :param path: (bytes) Request path
+        :return: (tuple) (target, args, end of match), all None if no route matches
+        """
+        best = [float('inf'), None, None, None, None]
+        self.tree.search(path, 0, [], best)
+
+        for index, regex, target in self.fallbacks:
+            if index >= best[0]:
+                break
+            result = regex.search(path)
+            if result:
+                return target, result.groupdict(), result.end()
+
+        index, end, names, values, target = best
+        if target is None:
+            return _NO_MATCH
+
+        return target, dict(zip(names, values)), end
+
+
+class RouteTree:
+    """
+    Compiled dispatcher built from a JsonAPIResource route registry
+
+    The registry is a list of (method, compiled-regex, target) tuples and the
+    first entry whose method is either the request method or b'ALL' and whose
+    regular expression matches wins.  lookup() returns the target of that route.
+    """
+    def __init__(self, registry):
+        """
+        Build the route trees
+
+        :param registry: (list) (method, compiled-regex, target) tuples in registration order
+        """
+        methods = {m for m, _, _ in registry if m != b'ALL'}
+        self._routes = {method: _MethodRoutes() for method in methods}
+        self._all_routes = _MethodRoutes()
+        self._regex_routes = 0
+
+        for index, (method, regex, target) in enumerate(registry):
+            parsed = parse_route(regex.pattern)
+            if parsed is None:
+                self._regex_routes += 1
+
+            if method == b'ALL':
+                method_routes = list(self._routes.values()) + [self._all_routes]
+            else:
+                method_routes = (self._routes[method],)
+
+            for routes in method_routes:
+                if parsed is None:
+                    routes.fallbacks.append((index, regex, target))
+                else:
+                    routes.tree.insert(index, parsed[0], parsed[1], target)
+
+    @property
+    def regex_routes(self):
+        """ Number of registered routes that require regular expression matching """
+        return self._regex_routes
+
+    def lookup(self, method, path):
+        """
+        Find the route for a request
+
+        :param method: (bytes) HTTP request method
+        :param path: (bytes) Path to match
+
+        :return: (tuple) target, keyword arguments, and end offset of the match
+                         within the path.  All three are None if no route matched
+        """
+        return self._routes.get(method, self._all_routes).lookup(path)
@@ -0,0 +1,89 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from twisted.internet.interfaces import IPullProducer
+from twisted.python import log as twlog
+from zope.interface import implementer
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+@implementer(IPullProducer)
+class JsonProducer:
+    """
+    Writes a JSON document to a request while it is being encoded
+
+    The transport asks for the next chunk only after the previous one has been
+    sent, so at most about one chunk of encoded output is held in memory at a
+    time regardless of the size of the document.
+    """
+    def __init__(self, request, pieces, chunk_size=DEFAULT_CHUNK_SIZE, compressor=None):
+        """
+        Producer initialization
+
+        :param request: (Request) Request to write the document to
+        :param pieces: (iterator) (str) pieces of the JSON document, see JsonEncoder.iterencode()
+        :param chunk_size: (int) Approximate number of characters to write per chunk
+        :param compressor: (zlib.Compress) Optional compressor applied to each chunk,
+                           see CompressionPolicy.compressor()
+        """
+        self._request = request
+        self._pieces = pieces
+        self._chunk_size = chunk_size
+        self._compressor = compressor
+
+    def start(self):
+        """ Register with the request, which then pulls the document a chunk at a time """
+        self._request.registerProducer(self, False)
+
+    def resumeProducing(self):          # pylint: disable=invalid-name
+        """ Encode and write the next chunk """
+        if self._pieces is None:
+            return
+
+        chunk, size = [], 0
+        try:
+            while size < self._chunk_size:
+                piece = next(self._pieces)
+                chunk.append(piece)
+                size += len(piece)
+
+        except StopIteration:
+            self._pieces = None
+
+        except Exception as exc:            # pylint: disable=broad-except
+            # The response headers are already out, so drop the connection rather
+            # than leaving the client with a truncated but apparently valid response
+            twlog.err(exc, 'REST API streaming JSON encoding failed')
+            self._pieces = None
+            self._request.unregisterProducer()
+            self._request.loseConnection()
+            return
+
+        data = ''.join(chunk).encode()
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+            if self._pieces is None:
+                data += self._compressor.flush()
+
+        if data:
+            self._request.write(data)
+
+        if self._pieces is None:
+            self._request.unregisterProducer()
+            self._request.finish()
+
+    def stopProducing(self):            # pylint: disable=invalid-name
+        """ Connection lost, stop encoding """
+        self._pieces = None
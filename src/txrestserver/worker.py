@@ -0,0 +1,59 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Worker process entry point, started by the WorkerSupervisor:
+
+    python -m txrestserver.worker --factory module:callable --fd N [--family AF_INET]
+"""
+import argparse
+import socket
+import sys
+
+from twisted.internet import reactor
+from twisted.python import log as twlog
+
+from .workers import load_factory
+
+
+def _started(_, server):
+    twlog.msg('REST server worker listening on {}:{}'.format(server.interface, server.port))
+
+
+def _failed(reason):
+    twlog.err(reason, 'REST server worker failed to start')
+    reactor.stop()                  # pylint: disable=no-member
+
+
+def main(argv=None):
+    """ Build the RestServer with the factory and serve the inherited socket until SIGTERM """
+    parser = argparse.ArgumentParser(description='txrestserver worker process')
+    parser.add_argument('--factory', required=True, help="'module:callable' that returns a RestServer")
+    parser.add_argument('--fd', required=True, type=int, help='Listening socket file descriptor')
+    parser.add_argument('--family', default='AF_INET', choices=('AF_INET', 'AF_INET6'))
+    args = parser.parse_args(argv)
+
+    twlog.startLogging(sys.stderr, setStdout=False)
+
+    server = load_factory(args.factory)()
+    server.adopt(args.fd, getattr(socket, args.family))
+
+    # SIGTERM stops the reactor, which stops the server first
+    reactor.addSystemEventTrigger('before', 'shutdown', server.stop)      # pylint: disable=no-member
+    reactor.callWhenRunning(lambda: server.start().addCallbacks(_started, _failed,   # pylint: disable=no-member
+                                                                callbackArgs=(server, )))
+    reactor.run()                   # pylint: disable=no-member
+
+
+if __name__ == '__main__':
+    main()
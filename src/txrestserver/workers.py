@@ -0,0 +1,225 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Multi-process worker mode
+
+The supervisor opens the listening socket once and spawns worker processes
+that each adopt it, so the kernel spreads incoming connections across all of
+them.  Each worker runs 'python -m txrestserver.worker', which builds its
+RestServer by calling a 'module:callable' factory.
+"""
+import importlib
+import os
+import socket
+import sys
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, DeferredList, succeed
+from twisted.internet.error import ProcessDone, ProcessExitedAlready
+from twisted.internet.protocol import ProcessProtocol
+from twisted.python import log as twlog
+
+DEFAULT_RESTART_DELAY = 1.0
+DEFAULT_STOP_TIMEOUT = 30.0
+DEFAULT_BACKLOG = 128
+
+
+def load_factory(factory):
+    """
+    Resolve a worker factory
+
+    :param factory: (str) 'package.module:callable'
+    :return: (callable) Factory that returns a RestServer
+    """
+    module_name, _, name = factory.partition(':')
+    if not module_name or not name:
+        raise ValueError("Worker factory must be given as 'module:callable', not {!r}".format(factory))
+
+    target = importlib.import_module(module_name)
+    for attribute in name.split('.'):
+        target = getattr(target, attribute)
+    return target
+
+
+class _WorkerProtocol(ProcessProtocol):
+    """ Tracks one worker process for the supervisor """
+    def __init__(self, supervisor, index):
+        self.supervisor = supervisor
+        self.index = index
+        self.ended = Deferred()
+
+    @property
+    def pid(self):
+        """ Process ID, None once the process has ended """
+        return self.transport.pid if self.transport is not None else None
+
+    def signal(self, signal_name):
+        """ Send a signal ('TERM', 'KILL', ...) to the process if it is still running """
+        try:
+            self.transport.signalProcess(signal_name)
+
+        except ProcessExitedAlready:
+            pass
+
+    def processEnded(self, reason):          # pylint: disable=invalid-name
+        self.supervisor._worker_ended(self, reason)         # pylint: disable=protected-access
+        self.ended.callback(None)
+
+
+class WorkerSupervisor:
+    """ Runs RestServer worker processes that share a single listening socket """
+
+    def __init__(self, factory, workers, port, interface='', restart_delay=DEFAULT_RESTART_DELAY,
+                 stop_timeout=DEFAULT_STOP_TIMEOUT, backlog=DEFAULT_BACKLOG):
+        """
+        Supervisor initialization
+
+        :param factory: (str) 'module:callable' that returns a RestServer in each worker
+        :param workers: (int) Number of worker processes
+        :param port: (int) Network port, zero for any free port
+        :param interface: (str) Network address
+        :param restart_delay: (float) Seconds to wait before restarting a worker that exited
+        :param stop_timeout: (float) Seconds stop() waits for workers to exit before killing them
+        :param backlog: (int) Listen queue size
+        """
+        if workers <= 0:
+            raise ValueError('At least one worker process is required')
+
+        module_name, _, name = factory.partition(':')
+        if not module_name or not name:
+            raise ValueError("Worker factory must be given as 'module:callable', not {!r}".format(factory))
+
+        self._factory = factory
+        self._workers = workers
+        self._port = port
+        self._interface = interface
+        self._restart_delay = restart_delay
+        self._stop_timeout = stop_timeout
+        self._backlog = backlog
+        self._socket = None
+        self._processes = {}            # index -> _WorkerProtocol
+        self._pending_restarts = {}     # index -> DelayedCall
+        self._running = False
+        self.restarts = 0
+
+    @property
+    def port(self):
+        """ Port being listened on """
+        return self._socket.getsockname()[1] if self._socket is not None else self._port
+
+    @property
+    def pids(self):
+        """ Process IDs of the running workers """
+        return [process.pid for process in self._processes.values() if process.pid is not None]
+
+    @property
+    def stats(self):
+        """ Supervisor statistics """
+        return {
+            'workers': self._workers,
+            'running': len(self._processes),
+            'restarts': self.restarts,
+        }
+
+    def start(self):
+        """
+        Open the listening socket and spawn the workers
+
+        :return: (Deferred) Fires with True once the workers have been spawned
+        """
+        if not self._running:
+            family = socket.AF_INET6 if ':' in self._interface else socket.AF_INET
+            self._socket = socket.create_server((self._interface, self._port), family=family,
+                                                backlog=self._backlog)
+            self._socket.setblocking(False)
+            self._socket.set_inheritable(True)
+            self._running = True
+
+            for index in range(self._workers):
+                self._spawn(index)
+
+        return succeed(True)
+
+    def _spawn(self, index):
+        self._pending_restarts.pop(index, None)
+        if not self._running:
+            return
+
+        fd = self._socket.fileno()
+        family = 'AF_INET6' if self._socket.family == socket.AF_INET6 else 'AF_INET'
+        args = [sys.executable, '-m', 'txrestserver.worker',
+                '--factory', self._factory, '--fd', str(fd), '--family', family]
+
+        # Workers import the same modules as this process
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+
+        process = _WorkerProtocol(self, index)
+        reactor.spawnProcess(process, sys.executable, args, env=env,        # pylint: disable=no-member
+                             childFDs={1: 1, 2: 2, fd: fd})
+        self._processes[index] = process
+
+    def _worker_ended(self, process, reason):
+        if self._processes.get(process.index) is process:
+            del self._processes[process.index]
+
+        if self._running:
+            if not reason.check(ProcessDone):
+                twlog.err(reason, 'REST server worker {} exited'.format(process.index))
+
+            self.restarts += 1
+            self._pending_restarts[process.index] = reactor.callLater(   # pylint: disable=no-member
+                self._restart_delay, self._spawn, process.index)
+
+    def stop(self, timeout=None):
+        """
+        Stop the workers.  Each worker is sent SIGTERM, stops listening and
+        finishes its requests, and is killed if it has not exited within the
+        timeout.
+
+        :param timeout: (float) Seconds to wait for the workers, default is 'stop_timeout'
+        :return: (Deferred) Fires with True once all workers have exited
+        """
+        if not self._running:
+            return succeed(True)
+
+        self._running = False
+        for restart in self._pending_restarts.values():
+            restart.cancel()
+        self._pending_restarts.clear()
+
+        # The workers have their own copies of the socket
+        self._socket.close()
+        self._socket = None
+
+        processes = list(self._processes.values())
+        for process in processes:
+            process.signal('TERM')
+
+        timeout = self._stop_timeout if timeout is None else timeout
+        kill = reactor.callLater(timeout, self._kill, processes)       # pylint: disable=no-member
+
+        def stopped(_):
+            if kill.active():
+                kill.cancel()
+            return True
+
+        return DeferredList([process.ended for process in processes]).addCallback(stopped)
+
+    @staticmethod
+    def _kill(processes):
+        for process in processes:
+            if process.pid is not None:
+                twlog.msg('REST server worker {} did not stop, killing it'.format(process.index))
+                process.signal('KILL')
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Benchmark of the JSON encoder backends over a large nested payload
+#
+#   PYTHONPATH=src python test/benchmarks/bench_encoder.py [records] [iterations]
+#
+# pylint: disable=import-error
+import json
+import sys
+import timeit
+
+from txrestserver.txrestapi.encoder import JsonEncoder, orjson
+
+
+def build_payload(records):
+    """ Nested payload similar to a large list/detail API response """
+    return {
+        'count': records,
+        'items': [
+            {
+                'id': index,
+                'name': 'item-{}'.format(index),
+                'enabled': index % 2 == 0,
+                'ratio': index / 7.0,
+                'tags': ['alpha', 'beta', 'gamma'][:index % 4],
+                'attributes': {'key{}'.format(key): key * index for key in range(10)},
+                'children': [{'id': child, 'value': None} for child in range(5)],
+            }
+            for index in range(records)
+        ],
+    }
+
+
+def main(records=10000, iterations=10):
+    payload = build_payload(records)
+
+    def legacy():
+        return json.dumps(payload, indent=None, separators=(',', ':'), sort_keys=True).encode()
+
+    candidates = [('json.dumps (previous _to_json)', legacy)]
+    backends = ['json'] + (['orjson'] if orjson is not None else [])
+    for backend in backends:
+        for sort_keys in (True, False):
+            encoder = JsonEncoder(sort_keys=sort_keys, backend=backend)
+            candidates.append(('{}, sort_keys={}'.format(backend, sort_keys),
+                               lambda encoder=encoder: encoder.encode(payload)))
+
+    print('Payload: {} records, {} bytes'.format(records, len(legacy())))
+    baseline = None
+    for name, encode in candidates:
+        elapsed = timeit.timeit(encode, number=iterations) / iterations
+        baseline = baseline or elapsed
+        print('{:32s} {:10.2f} ms  {:6.2f}x'.format(name, elapsed * 1000, baseline / elapsed))
+
+    if orjson is None:
+        print('orjson is not installed, only the standard library backend was measured')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
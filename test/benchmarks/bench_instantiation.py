@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Startup benchmark: time to instantiate a JsonAPIResource subclass with many routes
+#
+#   PYTHONPATH=src python test/benchmarks/bench_instantiation.py [routes] [instances]
+#
+# pylint: disable=import-error
+import re
+import sys
+import timeit
+
+from collections import Counter
+
+from twisted.web.resource import Resource
+
+from txrestserver.txrestapi.json_resource import JsonAPIResource, _ResultRenderer
+from txrestserver.txrestapi.methods import GET
+
+
+def build_api_class(routes):
+    """ Create a JsonAPIResource subclass with 'routes' decorated handlers """
+    namespace = {}
+    for index in range(routes):
+        def handler(self, _request, key=None):
+            return key
+
+        namespace['_on_get_{:04d}'.format(index)] = \
+            GET('^/resource{}/(?P<key>[^/]*)/?'.format(index).encode())(handler)
+
+    return type('Api{}'.format(routes), (JsonAPIResource,), namespace)
+
+
+def dir_scan_instantiate(cls):
+    """ Per-instance dir() scan and compile used before route tables were cached per class """
+    instance = Resource.__new__(cls)
+    # Per-instance state that JsonAPIResource.__new__ sets up, needed by its properties
+    instance._renderer = _ResultRenderer(instance)
+    instance._stats = Counter()
+    instance._registry = []
+    for name in dir(instance):
+        attribute = getattr(instance, name)
+        for method, regex, options in getattr(attribute, '__txrestapi__', []):
+            instance._registry.append((method, re.compile(regex.decode()), attribute, options))
+    Resource.__init__(instance)
+    return instance
+
+
+def main(routes=1000, instances=100):
+    start = timeit.default_timer()
+    cls = build_api_class(routes)
+    class_time = timeit.default_timer() - start
+
+    assert len(cls()._registry) == routes
+
+    cached = timeit.timeit(cls, number=instances) / instances
+    scanned = timeit.timeit(lambda: dir_scan_instantiate(cls), number=instances) / instances
+
+    print('Routes per class:           {}'.format(routes))
+    print('Class creation (one time):  {:10.3f} ms'.format(class_time * 1000))
+    print('Instantiation, dir() scan:  {:10.3f} ms'.format(scanned * 1000))
+    print('Instantiation, class table: {:10.3f} ms'.format(cached * 1000))
+    print('Speedup:                    {:10.1f}x'.format(scanned / cached))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Microbenchmark: resource traversal and rendering of the DefaultRestAPI hello-world route
+#
+#   PYTHONPATH=src python test/benchmarks/bench_render.py [requests]
+#
+# pylint: disable=import-error
+import re
+import sys
+import timeit
+
+from twisted.web.resource import getChildForRequest, NoResource
+from twisted.web.test.requesthelper import DummyRequest
+
+from txrestserver.rest_server import DefaultRestAPI
+from txrestserver.txrestapi.json_resource import maybeResource
+
+
+class WrapperRestAPI(DefaultRestAPI):
+    """
+    The DefaultRestAPI dispatched the way JsonAPIResource did before the direct
+    render path: str path matching, a maybeResource() closure and a _JsonResource
+    per request.
+    """
+    def __init__(self):
+        super().__init__()
+        self._str_registry = [(m, re.compile(r.pattern.decode()), cb) for m, r, cb, _ in self._registry]
+
+    def getChild(self, name, request):
+        path_to_check = getattr(request, '_remaining_path', request.path).decode()
+        for m, r, cb in self._str_registry:
+            if m in (request.method, b'ALL'):
+                result = r.search(path_to_check)
+                if result:
+                    request._remaining_path = path_to_check[result.span()[1]:]
+                    return maybeResource(cb)(request, **result.groupdict())
+        return NoResource()
+
+
+class _Request(DummyRequest):
+    """ DummyRequest with the response code attribute of a twisted.web Request """
+    code = 200
+
+    def setResponseCode(self, code, message=None):
+        super().setResponseCode(code, message)
+        self.code = code
+
+
+def _request():
+    request = _Request([b'hello'])
+    request.path = b'/hello'
+    request.channel = True
+    return request
+
+
+def requests_per_second(api, count):
+    """ Traverse to and render the hello-world route 'count' times """
+    def one_request():
+        request = _request()
+        body = getChildForRequest(api, request).render(request)
+        assert body == b'"Hello world"'
+
+    return count / timeit.timeit(one_request, number=count)
+
+
+def main(count=100000):
+    before = requests_per_second(WrapperRestAPI(), count)
+    after = requests_per_second(DefaultRestAPI(), count)
+
+    print('Requests:                          {}'.format(count))
+    print('maybeResource + _JsonResource:     {:10.0f} requests/sec'.format(before))
+    print('Direct render path:                {:10.0f} requests/sec'.format(after))
+    print('Speedup:                           {:10.2f}x'.format(after / before))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -203,3 +203,20 @@ def test_rest_basic_plain_text_server_no_credential_fail(test_basic_plain_text_s
 
     body = yield readBody(response)
     assert 'unauthorized' in body.decode('utf8').lower()
+
+
+@pytest_twisted.inlineCallbacks
+def test_rest_basic_plain_text_server_cors_preflight(test_basic_plain_text_server):
+    # Browsers send CORS preflight requests without credentials
+    agent = Agent(reactor)
+    url = 'http://localhost:{}/anything'.format(DEFAULT_PORT)
+
+    response = yield agent.request(b'OPTIONS',
+                                   url.encode('utf8'),
+                                   Headers({b'origin': [b'https://example.com'],
+                                            b'access-control-request-method': [b'GET']}),
+                                   None)
+
+    assert response.code == 204
+    assert response.headers.getRawHeaders(b'access-control-allow-origin') == [b'*']
+    yield readBody(response)
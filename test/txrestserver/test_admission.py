@@ -0,0 +1,96 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionLost
+from twisted.python.failure import Failure
+
+from txrestserver.txrestapi.admission import AdmissionLimit
+from txrestserver.txrestapi.json_resource import JsonAPIResource
+
+from test_json_resource import _body, _render, _request
+
+
+class _SlowAPI(JsonAPIResource):
+    def __init__(self, **options):
+        super().__init__()
+        self.pending = []
+        self.register(b'GET', b'^/slow', self._on_slow, **options)
+        self.register(b'GET', b'^/health', lambda request: 'ok', bypass_limits=True)
+
+    def _on_slow(self, _request):
+        d = Deferred()
+        self.pending.append(d)
+        return d
+
+
+def test_admission_limit_validation():
+    with pytest.raises(ValueError):
+        AdmissionLimit(0)
+    with pytest.raises(ValueError):
+        AdmissionLimit(1, max_queued=-1)
+
+
+def test_route_limit_queue_and_reject():
+    api = _SlowAPI(limit=AdmissionLimit(2, max_queued=1, retry_after=3))
+    requests = [_request(b'/slow') for _ in range(4)]
+    for request in requests:
+        _render(api, request)
+
+    # Two running, one queued, and the fourth rejected immediately
+    assert len(api.pending) == 2
+    assert requests[3].responseCode == 503
+    assert requests[3].responseHeaders.getRawHeaders(b'retry-after') == [b'3']
+    assert _body(requests[3])['status'] == 'ERROR'
+
+    stats = api.stats['admission']['^/slow']
+    assert (stats['active'], stats['queue_depth'], stats['rejected']) == (2, 1, 1)
+
+    # Health checks are never limited
+    request = _request(b'/health')
+    _render(api, request)
+    assert _body(request) == 'ok'
+
+    api.pending[0].callback('first')
+    assert _body(requests[0]) == 'first'
+    assert len(api.pending) == 3
+
+    for d in api.pending[1:]:
+        d.callback('done')
+    assert all(request.finished for request in requests)
+
+    stats = api.stats['admission']['^/slow']
+    assert (stats['active'], stats['queue_depth'], stats['admitted']) == (0, 0, 3)
+    assert api.stats['rejected'] == 1
+
+
+def test_server_limit_and_disconnect_while_queued():
+    api = _SlowAPI()
+    api.admission_limit = AdmissionLimit(1, max_queued=1)
+
+    running, queued = _request(b'/slow'), _request(b'/slow')
+    _render(api, running)
+    _render(api, queued)
+    assert api.admission_limit.queue_depth == 1
+
+    queued.channel = None
+    queued.processingFailed(Failure(ConnectionLost()))
+    assert api.admission_limit.queue_depth == 0
+
+    api.pending[0].callback('done')
+    assert api.admission_limit.active == 0
+    assert len(api.pending) == 1
+    assert api.stats['admission']['*']['admitted'] == 1
@@ -0,0 +1,198 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import pytest_twisted
+from twisted.cred.credentials import UsernamePassword
+from twisted.cred.error import UnauthorizedLogin
+import os
+import threading
+import time
+
+from twisted.internet.defer import DeferredList, inlineCallbacks
+
+from txrestserver.pools import WorkerPools
+from txrestserver.realm import checkers
+from txrestserver.realm.checkers import CryptedPasswordDictChecker, HashVerifier, \
+    UNIXPasswordDatabaseChecker
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+crypt = pytest.importorskip('crypt')
+pwd = pytest.importorskip('pwd')
+
+
+def _crypted(password):
+    return crypt.crypt(password, crypt.mksalt(crypt.METHOD_SHA512))
+
+
+@inlineCallbacks
+def _login(checker, username, password):
+    try:
+        avatar_id = yield checker.requestAvatarId(UsernamePassword(username, password))
+    except UnauthorizedLogin:
+        return None
+    return avatar_id
+
+
+@pytest.fixture()
+def verifier():
+    pools = WorkerPools({'auth': 2})
+    yield HashVerifier(worker_pools=pools)
+    pools.stop()
+
+
+@pytest_twisted.inlineCallbacks
+def test_crypted_checker_caches_verifications(verifier):
+    now = [0.0]
+    checker = CryptedPasswordDictChecker({b'admin': 'Administrator'}, {b'admin': _crypted('secret')},
+                                         cache_ttl=60, timer=lambda: now[0], verifier=verifier)
+
+    assert (yield _login(checker, b'admin', b'secret')) == b'admin'
+    assert (yield _login(checker, b'admin', b'secret')) == b'admin'
+    stats = checker.stats
+    assert stats['verifier']['verifications'] == 1
+    assert stats['cache_hits'] == 1
+    assert stats['hit_rate'] == 0.5
+    assert stats['verifier']['max_verify_time'] > 0
+    assert stats['verifier']['max_latency'] >= stats['verifier']['max_verify_time']
+
+    # Failures are never cached, and the cache holds no plaintext
+    assert (yield _login(checker, b'admin', b'wrong')) is None
+    assert (yield _login(checker, b'admin', b'wrong')) is None
+    assert checker.stats['verifier']['verifications'] == 3
+    assert checker.stats['cache']['size'] == 1
+    assert all(b'secret' not in key for key in checker._cache)
+
+    # Expired
+    now[0] = 61
+    assert (yield _login(checker, b'admin', b'secret')) == b'admin'
+    assert checker.stats['verifier']['verifications'] == 4
+
+    # A changed password hash invalidates the cached verification
+    checker.set_password(b'admin', _crypted('changed'))
+    assert (yield _login(checker, b'admin', b'secret')) is None
+    assert (yield _login(checker, b'admin', b'changed')) == b'admin'
+
+    checker.remove_user(b'admin')
+    assert (yield _login(checker, b'admin', b'changed')) is None
+    assert verifier.stats['limit']['active'] == 0
+
+
+@pytest_twisted.inlineCallbacks
+def test_crypted_checker_without_cache(verifier):
+    checker = CryptedPasswordDictChecker({}, {b'admin': _crypted('secret')}, cache_ttl=None,
+                                         verifier=verifier)
+    for _ in range(2):
+        assert (yield _login(checker, b'admin', b'secret')) == b'admin'
+    assert checker.stats['verifier']['verifications'] == 2
+    assert 'cache' not in checker.stats
+
+
+@pytest_twisted.inlineCallbacks
+def test_verification_concurrency_cap():
+    pools = WorkerPools()
+    verifier = HashVerifier(worker_pools=pools, max_concurrent=1, max_queued=1)
+    checker = CryptedPasswordDictChecker({}, {b'admin': _crypted('secret')}, cache_ttl=None,
+                                         verifier=verifier)
+    try:
+        results = yield DeferredList([_login(checker, b'admin', b'bad') for _ in range(3)])
+        assert [result for _, result in results] == [None, None, None]
+        assert verifier.stats['rejected'] == 1
+        assert verifier.stats['verifications'] == 2
+        assert verifier.stats['limit']['peak_queued'] == 1
+
+    finally:
+        pools.stop()
+
+
+@pytest_twisted.inlineCallbacks
+def test_unix_checker_caches_accounts(verifier, tmp_path):
+    now = [0.0]
+    passwd = tmp_path / 'passwd'
+    passwd.write_text('admin:x:1000:1000:Administrator,,,:/home/admin:/bin/sh\n')
+    shadow = {'admin': ('admin', _crypted('secret'))}
+    lookups = []
+
+    def get_passwd(name):
+        lookups.append(threading.current_thread())
+        if name != 'admin':
+            raise KeyError(name)
+        return pwd.struct_passwd(('admin', 'x', 1000, 1000, 'Administrator,,,', '/home/admin', '/bin/sh'))
+
+    def get_shadow(name):
+        return shadow[name]
+
+    checker = UNIXPasswordDatabaseChecker(verifier=verifier, cache_ttl=60, timer=lambda: now[0],
+                                          files=[str(passwd)], stat_interval=1,
+                                          get_by_name_functions=[get_passwd, get_shadow])
+
+    assert (yield _login(checker, b'admin', b'secret')) == b'admin'
+    assert (yield _login(checker, b'admin', b'wrong')) is None
+    assert (yield _login(checker, b'nobody', b'secret')) is None
+    assert (yield _login(checker, b'nobody', b'secret')) is None
+    assert len(lookups) == 2
+    assert threading.main_thread() not in lookups
+    assert checker.stats['cache_hits'] == 2
+    assert checker.stats['verifier']['verifications'] == 4
+
+    # The realm finds the full name of a user that logged in without a lookup
+    assert checker.users[b'admin'] == 'Administrator'
+    assert b'nobody' not in checker.users
+    assert len(lookups) == 2
+
+    # A changed account file clears the cache, once the stat interval has passed
+    shadow['admin'] = ('admin', _crypted('changed'))
+    stat = os.stat(str(passwd))
+    os.utime(str(passwd), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert (yield _login(checker, b'admin', b'changed')) is None
+    now[0] = 2
+    assert (yield _login(checker, b'admin', b'changed')) == b'admin'
+    assert checker.stats['invalidations'] == 1
+    assert len(lookups) == 3
+
+    # Expired
+    now[0] = 70
+    assert (yield _login(checker, b'admin', b'changed')) == b'admin'
+    assert len(lookups) == 4
+
+
+def test_unix_shadow_lookups_do_not_overlap(monkeypatch):
+    # The shadow lookup switches the effective user of the whole process
+    active, overlapped = [], []
+
+    def get_shadow(name):
+        active.append(name)
+        overlapped.append(len(active) > 1)
+        time.sleep(0.01)
+        active.pop()
+        return (name, '')
+
+    monkeypatch.setattr(checkers, '_shadowGetByName', get_shadow)
+    checker = UNIXPasswordDatabaseChecker(cache_ttl=None)
+    name = pwd.getpwuid(os.getuid()).pw_name
+
+    threads = [threading.Thread(target=checker._lookup, args=(name, )) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(overlapped) == 4
+    assert not any(overlapped)
+
+    # The realm's full name lookups run on the reactor thread, without switching to root
+    assert checker.users[name.encode()]
+    assert len(overlapped) == 4
+    assert b'no-such-user' not in checker.users
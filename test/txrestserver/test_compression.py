@@ -0,0 +1,122 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import zlib
+import pytest
+import pytest_twisted
+
+from txrestserver.pools import WorkerPools
+from txrestserver.txrestapi.compression import CompressionPolicy, parse_accept_encoding
+
+from test_json_resource import LARGE_RESULT, _RenderAPI, _render, _request
+
+
+def _compressed_request(path, accept_encoding=b'gzip, deflate'):
+    request = _request(path)
+    request.requestHeaders.setRawHeaders(b'accept-encoding', [accept_encoding])
+    return request
+
+
+def _decompress(request):
+    encoding = request.responseHeaders.getRawHeaders(b'content-encoding', [None])[0]
+    body = b''.join(request.written)
+    if encoding == b'gzip':
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif encoding == b'deflate':
+        body = zlib.decompress(body)
+    return encoding, json.loads(body)
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding(b'gzip, deflate;q=0.5, br;q=0') == {b'gzip': 1.0, b'deflate': 0.5, b'br': 0.0}
+    assert parse_accept_encoding(b'GZIP;q=bad') == {b'gzip': 0.0}
+
+
+@pytest.mark.parametrize('header, expected', [
+    (b'gzip, deflate', b'gzip'),
+    (b'deflate', b'deflate'),
+    (b'gzip;q=0.2, deflate;q=0.8', b'deflate'),
+    (b'*', b'gzip'),
+    (b'*, gzip;q=0', b'deflate'),
+    (b'identity', None),
+    (b'gzip;q=0', None),
+])
+def test_negotiation(header, expected):
+    policy = CompressionPolicy()
+    assert policy.negotiate(_compressed_request(b'/hello', header)) == expected
+    assert policy.negotiate(_request(b'/hello')) is None
+
+
+def test_policy_validation():
+    with pytest.raises(ValueError):
+        CompressionPolicy(level=10)
+    with pytest.raises(ValueError):
+        CompressionPolicy(encodings=(b'br', ))
+
+
+def test_compressed_responses():
+    api = _RenderAPI()
+    api.compression = CompressionPolicy(min_size=100)
+
+    for path, accept in ((b'/large', b'gzip'), (b'/stream', b'deflate'), (b'/stream/deferred', b'gzip')):
+        request = _compressed_request(path, accept)
+        _render(api, request)
+        assert request.responseHeaders.getRawHeaders(b'vary') == [b'Accept-Encoding']
+        assert _decompress(request) == (accept, LARGE_RESULT)
+
+    # Below the size threshold, not accepted by the client, or opted out by the route
+    for request in (_compressed_request(b'/hello'), _request(b'/large'),
+                    _compressed_request(b'/uncompressed')):
+        _render(api, request)
+        assert _decompress(request)[0] is None
+
+    assert api.stats['compressed'] == 3
+
+
+@pytest_twisted.inlineCallbacks
+def test_offloaded_compression():
+    api = _RenderAPI()
+    api.compression = CompressionPolicy(level=1)
+    api.offload_threshold = 1000
+    api.worker_pools = WorkerPools({'serialize': 1})
+
+    try:
+        request = _compressed_request(b'/large')
+        finished = request.notifyFinish()
+        _render(api, request)
+        yield finished
+        assert _decompress(request) == (b'gzip', LARGE_RESULT)
+        assert api.stats['offloaded'] == 1
+
+    finally:
+        api.worker_pools.stop()
+
+
+def test_compressed_etags():
+    api = _RenderAPI()
+    api.compression = CompressionPolicy()
+    api.etags = True
+
+    etags = []
+    for request in (_request(b'/large'), _compressed_request(b'/large')):
+        _render(api, request)
+        etags.append(request.responseHeaders.getRawHeaders(b'etag')[0])
+    assert etags[0] != etags[1]
+
+    request = _compressed_request(b'/large')
+    request.requestHeaders.setRawHeaders(b'if-none-match', [etags[1]])
+    _render(api, request)
+    assert request.responseCode == 304
+    assert request.written == [b'']
@@ -0,0 +1,97 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from txrestserver.txrestapi.cors import CorsPolicy
+
+from test_json_resource import _RenderAPI, _body, _render, _request
+
+
+def _preflight(path, origin=b'https://example.com'):
+    request = _request(path, method=b'OPTIONS')
+    request.requestHeaders.setRawHeaders(b'origin', [origin])
+    request.requestHeaders.setRawHeaders(b'access-control-request-method', [b'GET'])
+    return request
+
+
+def test_default_cors_headers():
+    request = _request(b'/hello')
+    _render(_RenderAPI(), request)
+    headers = request.responseHeaders
+
+    assert headers.getRawHeaders(b'access-control-allow-origin') == [b'*']
+    assert headers.getRawHeaders(b'access-control-allow-methods') == [b'GET, POST, PUT, DELETE, PATCH']
+    assert headers.getRawHeaders(b'access-control-allow-headers') == [b'x-requested-with']
+    assert headers.getRawHeaders(b'access-control-max-age') == [b'10']
+
+
+def test_preflight_bypasses_dispatch():
+    api = _RenderAPI()
+    api.cors = CorsPolicy(max_age=600)
+
+    request = _preflight(b'/no/such/route')
+    _render(api, request)
+    assert request.responseCode == 204
+    assert request.written == [b'']
+    assert request.responseHeaders.getRawHeaders(b'access-control-max-age') == [b'600']
+
+    # A plain OPTIONS request is dispatched as usual
+    request = _request(b'/hello', method=b'OPTIONS')
+    assert _render(api, request).code == 404
+
+
+def test_allowed_origins():
+    api = _RenderAPI()
+    api.cors = CorsPolicy(origins=(b'https://example.com', 'https://other.com'), allow_credentials=True)
+
+    request = _request(b'/hello')
+    request.requestHeaders.setRawHeaders(b'origin', [b'https://other.com'])
+    _render(api, request)
+    headers = request.responseHeaders
+    assert headers.getRawHeaders(b'access-control-allow-origin') == [b'https://other.com']
+    assert headers.getRawHeaders(b'access-control-allow-credentials') == [b'true']
+    assert headers.getRawHeaders(b'vary') == [b'Origin']
+    assert not headers.hasHeader(b'access-control-max-age')
+
+    request = _preflight(b'/hello', origin=b'https://evil.com')
+    _render(api, request)
+    assert request.responseCode == 204
+    assert not request.responseHeaders.hasHeader(b'access-control-allow-origin')
+    assert request.responseHeaders.getRawHeaders(b'vary') == [b'Origin']
+
+    request = _request(b'/hello')
+    _render(api, request)
+    assert _body(request) == 'Hello world'
+    assert not request.responseHeaders.hasHeader(b'access-control-allow-origin')
+    assert request.responseHeaders.getRawHeaders(b'vary') == [b'Origin']
+
+    # Added to, not replacing, the Vary header of the handler
+    api.register(b'GET', b'^/varies', lambda request: request.setHeader(b'Vary', b'Accept-Language'))
+    request = _request(b'/varies')
+    request.requestHeaders.setRawHeaders(b'origin', [b'https://example.com'])
+    _render(api, request)
+    assert request.responseHeaders.getRawHeaders(b'vary') == [b'Accept-Language', b'Origin']
+
+    with pytest.raises(ValueError):
+        CorsPolicy(allow_credentials=True)
+
+
+def test_cors_disabled():
+    api = _RenderAPI()
+    api.cors = None
+
+    request = _request(b'/hello')
+    _render(api, request)
+    assert not request.responseHeaders.hasHeader(b'access-control-allow-origin')
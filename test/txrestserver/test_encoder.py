@@ -0,0 +1,65 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import pytest
+import pytest_twisted
+
+from txrestserver.rest_server import RestServer
+from txrestserver.txrestapi.encoder import JsonEncoder, orjson
+
+from apis.api import MyRestAPI, test_entries
+
+PAYLOAD = {'b': [1, 2.5, None, True], 'a': {'z': 'café', 'y': {1: 'one'}}}
+
+BACKENDS = ['json'] + (['orjson'] if orjson is not None else [])
+
+
+def test_default_matches_stdlib():
+    expected = json.dumps(PAYLOAD, indent=None, separators=(',', ':'), sort_keys=True).encode()
+    assert JsonEncoder().encode(PAYLOAD) == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends(backend):
+    encoder = JsonEncoder(backend=backend)
+    assert encoder.backend == backend
+    assert json.loads(encoder.encode(PAYLOAD)) == json.loads(json.dumps(PAYLOAD))
+    assert encoder.encode({'b': 1, 'a': 2}) == b'{"a":2,"b":1}'
+
+    unsorted = JsonEncoder(sort_keys=False, backend=backend)
+    assert unsorted.encode({'b': 1, 'a': 2}) == b'{"b":1,"a":2}'
+
+    # Falls back to the standard library for values the backend cannot encode
+    assert encoder.encode(2 ** 70) == str(2 ** 70).encode()
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError):
+        JsonEncoder(backend='yaml')
+
+
+@pytest_twisted.inlineCallbacks
+def test_server_applies_encoder():
+    api = MyRestAPI()
+    encoder = JsonEncoder(sort_keys=False, backend='auto')
+    server = RestServer(api, json_encoder=encoder)
+    assert server.json_encoder is encoder
+
+    success = yield server.start()
+    assert success, 'Server failed to start'
+    assert api.json_encoder is encoder
+    assert json.loads(api.json_encoder.encode(test_entries)) == test_entries
+
+    assert (yield server.stop())
@@ -0,0 +1,615 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+import time
+import pytest
+import pytest_twisted
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, succeed, fail
+from twisted.internet.error import ConnectionLost, ReactorAlreadyInstalledError
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+from twisted.web.client import Agent, readBody
+from twisted.web.iweb import UNKNOWN_LENGTH
+from twisted.web.resource import getChildForRequest, NoResource
+from twisted.web.server import NOT_DONE_YET, Site
+from twisted.web.test.requesthelper import DummyRequest
+
+from txrestserver.asyncio_reactor import install_asyncio_reactor, is_asyncio_reactor
+from txrestserver.pools import WorkerPools
+from txrestserver.process_pool import ProcessPool
+from txrestserver.rest_server import RestServer
+from txrestserver.txrestapi.json_resource import JsonAPIResource, not_modified, remaining_time
+from txrestserver.txrestapi.methods import GET, POST
+
+from apis.api import MyRestAPI, VERSION_PATH
+
+
+class _Request(DummyRequest):
+    """ DummyRequest with the response code attribute of a twisted.web Request """
+    code = 200
+
+    def setResponseCode(self, code, message=None):
+        super().setResponseCode(code, message)
+        self.code = code
+
+
+def _request(path, method=b'GET'):
+    request = _Request(path.split(b'/')[1:])
+    request.method = method
+    request.path = path
+    request.channel = True
+    return request
+
+
+def _render(api, request):
+    resource = getChildForRequest(api, request)
+    body = resource.render(request)
+    if body is not NOT_DONE_YET:
+        request.write(body)
+        request.finish()
+    return resource
+
+
+def _body(request):
+    return json.loads(b''.join(request.written))
+
+
+class _SubclassAPI(MyRestAPI):
+    """ Inherits routes, overrides one without a decorator and adds bound method routes """
+    def __init__(self):
+        super().__init__()
+        self.greeting = 'hi'
+
+    @staticmethod
+    def _on_get_all(_request):
+        return None
+
+    @GET(b'^/greeting')
+    @POST(b'^/greeting')
+    def _on_greeting(self, _request):
+        return self.greeting
+
+
+def test_route_table_built_per_class():
+    first, second = MyRestAPI(), MyRestAPI()
+
+    assert len(first._registry) == 4
+    assert [regex for _, regex, _, _ in first._registry] == [regex for _, regex, _, _ in second._registry]
+    assert all(a is b for (_, a, _, _), (_, b, _, _) in zip(first._registry, second._registry))
+
+
+def test_route_table_subclass():
+    api = _SubclassAPI()
+    patterns = [(method, regex.pattern) for method, regex, _, _ in api._registry]
+
+    assert (b'GET', b'^/everything') not in patterns
+    assert (b'GET', VERSION_PATH) in patterns
+    assert (b'GET', b'^/greeting') in patterns
+    assert (b'POST', b'^/greeting') in patterns
+
+    callbacks = [cb for _, regex, cb, _ in api._registry if regex.pattern == b'^/greeting']
+    assert all(cb(None) == 'hi' for cb in callbacks)
+
+
+def test_route_cache_counters_and_eviction():
+    api = MyRestAPI()
+    api.route_cache_size = 2
+    assert api.stats == {}
+
+    for path in (b'/version', b'/version', b'/examples', b'/version', b'/example/abc', b'/examples'):
+        api._get_callback(_request(path))
+
+    stats = api.stats['route_cache']
+    assert stats['hits'] == 2
+    assert stats['misses'] == 4
+    assert stats['evictions'] == 2
+    assert stats['size'] == 2
+
+    request = _request(b'/example/abc/')
+    callback, args = api._get_callback(request)
+    assert args == {'key': 'abc'}
+    assert request._remaining_path == b''
+
+    # Cached results must match a cache miss
+    request = _request(b'/example/abc/')
+    assert api._get_callback(request) == (callback, args)
+    assert request._remaining_path == b''
+
+
+def test_route_cache_invalidated_by_registry_changes():
+    api = MyRestAPI()
+    api.route_cache_size = 16
+
+    assert api._get_callback(_request(b'/greeting')) == (None, None)
+    assert api._get_callback(_request(b'/greeting')) == (None, None)
+
+    def greeting(_request):
+        return 'hi'
+
+    api.register(b'GET', b'^/greeting', greeting)
+    assert api.stats['route_cache']['size'] == 0
+    assert api._get_callback(_request(b'/greeting')) == (greeting, {})
+
+    api.unregister(callback=greeting)
+    assert api._get_callback(_request(b'/greeting')) == (None, None)
+
+
+LARGE_RESULT = [{'index': index, 'name': 'entry {}'.format(index)} for index in range(20000)]
+
+
+class _RenderAPI(JsonAPIResource):
+    @staticmethod
+    @GET(b'^/hello')
+    def _on_hello(_request):
+        return 'Hello world'
+
+    @staticmethod
+    @GET(b'^/deferred')
+    def _on_deferred(_request):
+        return succeed({'b': 2, 'a': 1})
+
+    @staticmethod
+    @GET(b'^/failed')
+    def _on_failed(_request):
+        return fail(ValueError('nope'))
+
+    @staticmethod
+    @GET(b'^/unserializable')
+    def _on_unserializable(_request):
+        return succeed(object())
+
+    @staticmethod
+    @GET(b'^/raises')
+    def _on_raises(_request):
+        raise KeyError('missing')
+
+    @staticmethod
+    @GET(b'^/resource')
+    def _on_resource(_request):
+        return NoResource('gone')
+
+    @staticmethod
+    @GET(b'^/item/(?P<key>[^/]*)')
+    def _on_item(_request, key):
+        return key
+
+    @staticmethod
+    @GET(b'^/large')
+    def _on_large(_request):
+        return LARGE_RESULT
+
+    @staticmethod
+    @GET(b'^/versioned/(?P<version>[^/]*)')
+    def _on_versioned(request, version):
+        if not_modified(request, etag=version, last_modified=1600000000):
+            return None
+        return {'version': version}
+
+    @staticmethod
+    @GET(b'^/uncompressed', compress=False)
+    def _on_uncompressed(_request):
+        return LARGE_RESULT
+
+    @staticmethod
+    @GET(b'^/stream/deferred', stream=True)
+    def _on_stream_deferred(_request):
+        return succeed(LARGE_RESULT)
+
+    @staticmethod
+    @GET(b'^/stream', stream=True)
+    def _on_stream(_request):
+        return LARGE_RESULT
+
+
+def test_direct_render_path():
+    api = _RenderAPI()
+
+    first, second = _request(b'/hello'), _request(b'/deferred')
+    assert _render(api, first) is _render(api, second)
+    assert _body(first) == 'Hello world'
+    assert first.finished == 1
+    assert first.responseHeaders.getRawHeaders(b'content-type') == [b'application/json']
+    assert first.responseHeaders.hasHeader(b'X-Execution-Time')
+
+    request = _request('/item/caf\u00e9'.encode())
+    _render(api, request)
+    assert _body(request) == 'caf\u00e9'
+
+
+def test_direct_render_deferred_and_errors():
+    api = _RenderAPI()
+
+    request = _request(b'/deferred')
+    _render(api, request)
+    assert b''.join(request.written) == b'{"a":1,"b":2}'
+    assert request.finished == 1
+
+    for path, error in ((b'/failed', 'nope'), (b'/raises', 'missing'),
+                        (b'/unserializable', 'not JSON serializable')):
+        request = _request(path)
+        _render(api, request)
+        assert request.finished == 1
+        body = _body(request)
+        assert body['status'] == 'ERROR'
+        assert error in body['errors'][0]
+
+    request = _request(b'/resource')
+    assert isinstance(_render(api, request), NoResource)
+
+
+def test_streaming_route():
+    api = _RenderAPI()
+    api.stream_chunk_size = 4096
+
+    for path in (b'/stream', b'/stream/deferred'):
+        request = _request(path)
+        _render(api, request)
+
+        assert request.finished == 1
+        assert len(request.written) > 100
+        assert max(len(chunk) for chunk in request.written) < 2 * 4096
+        assert _body(request) == LARGE_RESULT
+
+
+def test_unknown_route_option():
+    with pytest.raises(TypeError):
+        _RenderAPI().register(b'GET', b'^/x', lambda request: None, steam=True)
+
+
+@pytest_twisted.inlineCallbacks
+def test_streaming_over_http():
+    port = reactor.listenTCP(0, Site(_RenderAPI()), interface='127.0.0.1')
+    try:
+        url = 'http://127.0.0.1:{}/stream'.format(port.getHost().port)
+        response = yield Agent(reactor).request(b'GET', url.encode())
+        assert response.code == 200
+        assert response.length is UNKNOWN_LENGTH
+
+        body = yield readBody(response)
+        assert json.loads(body) == LARGE_RESULT
+
+    finally:
+        yield port.stopListening()
+
+
+@pytest_twisted.inlineCallbacks
+def test_offloaded_serialization():
+    api = _RenderAPI()
+    api.offload_threshold = 1000
+    api.worker_pools = WorkerPools({'serialize': 2})
+
+    try:
+        request = _request(b'/hello')
+        _render(api, request)
+        assert _body(request) == 'Hello world'
+        assert 'offloaded' not in api.stats
+
+        for path in (b'/large', b'/large'):
+            request = _request(path)
+            finished = request.notifyFinish()
+            _render(api, request)
+            yield finished
+            assert _body(request) == LARGE_RESULT
+            assert request.responseHeaders.hasHeader(b'X-Execution-Time')
+
+        stats = api.stats
+        assert stats['offloaded'] == 2
+        assert stats['offload_pool']['completed'] == 2
+        assert stats['offload_pool']['max_threads'] == 2
+
+    finally:
+        api.worker_pools.stop()
+
+
+def test_etags():
+    api = _RenderAPI()
+    api.etags = True
+
+    request = _request(b'/deferred')
+    _render(api, request)
+    etag = request.responseHeaders.getRawHeaders(b'etag')[0]
+    assert etag.startswith(b'"') and etag.endswith(b'"')
+    assert request.responseCode is None
+
+    for header in (etag, b'"other", W/' + etag, b'*'):
+        request = _request(b'/deferred')
+        request.requestHeaders.setRawHeaders(b'if-none-match', [header])
+        _render(api, request)
+        assert request.responseCode == 304
+        assert request.written == [b'']
+        assert request.responseHeaders.getRawHeaders(b'etag') == [etag]
+
+    request = _request(b'/deferred')
+    request.requestHeaders.setRawHeaders(b'if-none-match', [b'"other"'])
+    _render(api, request)
+    assert request.responseCode is None
+    assert _body(request) == {'a': 1, 'b': 2}
+
+    # Streamed responses are not tagged
+    request = _request(b'/stream')
+    _render(api, request)
+    assert not request.responseHeaders.hasHeader(b'etag')
+    assert api.stats['not_modified'] == 3
+
+
+def test_handler_not_modified():
+    api = _RenderAPI()
+
+    request = _request(b'/versioned/v1')
+    _render(api, request)
+    assert _body(request) == {'version': 'v1'}
+    assert request.responseHeaders.getRawHeaders(b'etag') == [b'"v1"']
+    assert request.responseHeaders.hasHeader(b'last-modified')
+
+    request = _request(b'/versioned/v1')
+    request.requestHeaders.setRawHeaders(b'if-none-match', [b'"v0", "v1"'])
+    _render(api, request)
+    assert request.responseCode == 304
+    assert request.written == [b'']
+
+    # If-None-Match takes precedence over If-Modified-Since
+    request = _request(b'/versioned/v2')
+    request.requestHeaders.setRawHeaders(b'if-none-match', [b'"v1"'])
+    request.requestHeaders.setRawHeaders(b'if-modified-since', [b'Sun, 13 Sep 2020 12:26:40 GMT'])
+    _render(api, request)
+    assert _body(request) == {'version': 'v2'}
+
+    request = _request(b'/versioned/v2')
+    request.requestHeaders.setRawHeaders(b'if-modified-since', [b'Sun, 13 Sep 2020 12:26:40 GMT'])
+    _render(api, request)
+    assert request.responseCode == 304
+    assert api.stats['not_modified'] == 2
+
+
+class _AsyncAPI(JsonAPIResource):
+    @GET(b'^/async/(?P<key>[^/]*)')
+    async def _on_async(self, _request, key):
+        value = await succeed(key.upper())
+        return {'key': value}
+
+    @staticmethod
+    @GET(b'^/async-error')
+    async def _on_async_error(_request):
+        await succeed(None)
+        raise ValueError('async failure')
+
+
+def test_async_handlers():
+    api = _AsyncAPI()
+
+    request = _request(b'/async/abc')
+    _render(api, request)
+    assert _body(request) == {'key': 'ABC'}
+
+    request = _request(b'/async-error')
+    _render(api, request)
+    assert 'async failure' in _body(request)['errors'][0]
+
+    async def registered(_request):
+        return [1, 2]
+
+    api.register(b'GET', b'^/registered', registered)
+    request = _request(b'/registered')
+    _render(api, request)
+    assert _body(request) == [1, 2]
+
+    api.unregister(callback=registered)
+    assert len(api._registry) == 2
+
+    # A coroutine can neither be pickled for a process nor awaited in a worker thread
+    for option in ('blocking', 'process'):
+        with pytest.raises(ValueError):
+            api.register(b'GET', b'^/offloaded', registered, **{option: True})
+
+        with pytest.raises(ValueError):
+            type('_OffloadedAsyncAPI', (JsonAPIResource,), {
+                '_on_async': GET(b'^/offloaded', **{option: True})(registered)})
+
+
+def test_asyncio_handlers_require_asyncio_reactor():
+    assert not is_asyncio_reactor()
+    with pytest.raises(ReactorAlreadyInstalledError):
+        install_asyncio_reactor()
+    with pytest.raises(ValueError):
+        RestServer(api=_AsyncAPI(), asyncio_handlers=True)
+
+
+def test_disconnect_cancels_handler():
+    cancelled = []
+    pending = Deferred(cancelled.append)
+
+    api = JsonAPIResource()
+    api.register(b'GET', b'^/slow', lambda request: pending)
+
+    async def slow_async(_request):
+        await Deferred(lambda d: cancelled.append('async'))
+
+    api.register(b'GET', b'^/async', slow_async)
+
+    for path in (b'/slow', b'/async'):
+        request = _request(path)
+        _render(api, request)
+        request.channel = None
+        request.processingFailed(Failure(ConnectionLost()))
+        assert request.written == []
+
+    assert cancelled == [pending, 'async']
+    assert api.stats['cancelled'] == 2
+
+    # Completed requests are not cancelled
+    api.register(b'GET', b'^/done', lambda request: succeed('done'))
+    request = _request(b'/done')
+    _render(api, request)
+    assert _body(request) == 'done'
+    assert api.stats['cancelled'] == 2
+
+
+def test_deadlines():
+    clock = Clock()
+    budgets, cancelled = [], []
+
+    def slow(request):
+        budgets.append(remaining_time(request))
+        return Deferred(cancelled.append)
+
+    api = JsonAPIResource()
+    api.clock = clock
+    api.default_deadline = 5
+    api.register(b'GET', b'^/slow', slow)
+    api.register(b'GET', b'^/short', slow, deadline=1)
+    api.register(b'GET', b'^/unbounded', slow, deadline=None)
+
+    requests = [_request(path) for path in (b'/slow', b'/short', b'/unbounded')]
+    for request in requests:
+        _render(api, request)
+    assert budgets == [5, 1, None]
+
+    clock.advance(2)
+    assert remaining_time(requests[0]) == 3
+    assert requests[1].responseCode == 504
+    assert _body(requests[1]) == {'status': 'ERROR', 'errors': ['Request deadline exceeded']}
+    assert requests[1].finished == 1
+
+    clock.advance(3)
+    assert requests[0].responseCode == 504
+    assert remaining_time(requests[0]) == 0
+    assert len(cancelled) == 2
+    assert requests[2].written == []
+    assert api.stats['timed_out'] == 2
+
+    api.register(b'GET', b'^/fast', lambda request: succeed('fast'), deadline=1)
+    request = _request(b'/fast')
+    _render(api, request)
+    assert _body(request) == 'fast'
+    assert not clock.getDelayedCalls()[1:]
+
+
+@pytest_twisted.inlineCallbacks
+def test_blocking_handlers():
+    class _BlockingAPI(JsonAPIResource):
+        @staticmethod
+        @GET(b'^/blocking$', blocking=True)
+        def _on_blocking(_request):
+            return threading.current_thread().name
+
+        @staticmethod
+        @GET(b'^/reports$', blocking='reports')
+        def _on_reports(_request):
+            return threading.current_thread().name
+
+    api = _BlockingAPI()
+    api.worker_pools = WorkerPools({'reports': 1})
+    try:
+        for path, pool in ((b'/blocking', 'blocking'), (b'/reports', 'reports')):
+            request = _request(path)
+            finished = request.notifyFinish()
+            _render(api, request)
+            yield finished
+            assert 'txrestserver-{}'.format(pool) in _body(request)
+            assert request.responseHeaders.hasHeader(b'X-Execution-Time')
+            assert float(request.responseHeaders.getRawHeaders(b'X-Queue-Time')[0]) >= 0
+
+        stats = api.stats
+        assert stats['blocking'] == 2
+        assert stats['blocking_pools']['reports'] == dict(stats['blocking_pools']['reports'],
+                                                          max_threads=1, completed=1)
+
+    finally:
+        api.worker_pools.stop()
+
+
+def _square(request, value):
+    """ Process route handler, must be importable by the worker process """
+    if value == 'sleep':
+        time.sleep(30)
+    return {'square': int(value) ** 2, 'method': request.method.decode(), 'pid': os.getpid(),
+            'client': (request.getHeader('X-Client') or b'').decode()}
+
+
+@pytest_twisted.inlineCallbacks
+def test_process_handlers():
+    pool = ProcessPool(max_workers=1, max_tasks_per_worker=2, timeout=10)
+    api = JsonAPIResource()
+    slow_pool = ProcessPool(max_workers=1, timeout=0.5)
+    api.register(b'GET', b'^/square/(?P<value>[^/]+)$', _square, process=pool)
+    api.register(b'GET', b'^/slow/(?P<value>[^/]+)$', _square, process=slow_pool)
+
+    def get(path):
+        request = _request(path)
+        request.requestHeaders.setRawHeaders(b'x-client', [b'tester'])
+        finished = request.notifyFinish()
+        _render(api, request)
+        return finished.addCallback(lambda _: request)
+
+    try:
+        results = []
+        for value in range(3):
+            request = yield get(b'/square/%d' % value)
+            results.append(_body(request))
+
+        assert [result['square'] for result in results] == [0, 1, 4]
+        assert results[0]['method'] == 'GET'
+        assert results[0]['client'] == 'tester'
+        assert results[0]['pid'] != os.getpid()
+        # Recycled after two tasks
+        assert results[0]['pid'] == results[1]['pid'] != results[2]['pid']
+
+        request = yield get(b'/square/x')
+        assert _body(request)['status'] == 'ERROR'
+
+        request = yield get(b'/slow/sleep')
+        assert request.responseCode == 504
+        assert slow_pool.stats['timed_out'] == 1
+
+        request = yield get(b'/square/3')
+        assert _body(request)['square'] == 9
+
+        stats = api.stats
+        assert stats['process'] == 6
+        assert stats['process_pools']['^/square/(?P<value>[^/]+)$'] == dict(
+            pool.stats, submitted=5, completed=4, failed=1, timed_out=0, recycled=2, pending=0)
+
+    finally:
+        pool.stop()
+        slow_pool.stop()
+
+
+def test_process_handlers_must_be_picklable():
+    pool = ProcessPool(max_workers=1)
+
+    class _BoundAPI(JsonAPIResource):
+        def handler(self, request, value):
+            return _square(request, value)
+
+    # Pickling a bound method would pickle the resource with it
+    with pytest.raises(ValueError):
+        _BoundAPI().register(b'GET', b'^/square/(?P<value>[^/]+)$', _BoundAPI().handler, process=pool)
+
+    with pytest.raises(ValueError):
+        type('_DecoratedBoundAPI', (JsonAPIResource,), {
+            '_on_square': GET(b'^/square/(?P<value>[^/]+)$', process=pool)(lambda self, request, value: None)})
+
+    class _StaticAPI(JsonAPIResource):
+        @staticmethod
+        @GET(b'^/square/(?P<value>[^/]+)$', process=pool)
+        def _on_square(request, value):
+            return _square(request, value)
+
+    assert len(_StaticAPI()._registry) == 1
+    JsonAPIResource().register(b'GET', b'^/square/(?P<value>[^/]+)$', _square, process=pool)
@@ -0,0 +1,114 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from twisted.internet.address import IPv4Address
+
+from txrestserver.txrestapi.json_resource import JsonAPIResource
+from txrestserver.txrestapi.rate_limit import RateLimiter
+
+from test_json_resource import _body, _render, _request
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _client_request(path, host='10.0.0.1', avatar_id=None):
+    request = _request(path)
+    request.client = IPv4Address('TCP', host, 40000)
+    if avatar_id is not None:
+        request.avatar_id = avatar_id
+    return request
+
+
+def _api(limiter):
+    api = JsonAPIResource()
+    api.rate_limiter = limiter
+    api.register(b'GET', b'^/cheap', lambda request: 'cheap')
+    api.register(b'GET', b'^/expensive', lambda request: 'expensive', cost=5)
+    api.register(b'GET', b'^/health', lambda request: 'ok', bypass_limits=True)
+    return api
+
+
+def test_rate_limiter_validation():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
+    with pytest.raises(ValueError):
+        RateLimiter(10, burst=0.5)
+
+
+def test_rate_limited_responses():
+    clock = _Clock()
+    api = _api(RateLimiter(rate=2, burst=4, timer=clock))
+
+    codes = []
+    for _ in range(5):
+        request = _client_request(b'/cheap')
+        _render(api, request)
+        codes.append(request.responseCode)
+    assert codes == [None] * 4 + [429]
+    assert request.responseHeaders.getRawHeaders(b'retry-after') == [b'1']
+    assert _body(request)['status'] == 'ERROR'
+
+    # Other clients have their own bucket and health checks are not limited
+    request = _client_request(b'/cheap', host='10.0.0.2')
+    _render(api, request)
+    assert _body(request) == 'cheap'
+    request = _client_request(b'/health')
+    _render(api, request)
+    assert _body(request) == 'ok'
+
+    # A cost of 5 is capped at the bucket size, and a full refill takes 2 seconds
+    request = _client_request(b'/expensive')
+    _render(api, request)
+    assert request.responseHeaders.getRawHeaders(b'retry-after') == [b'2']
+
+    clock.now += 2
+    request = _client_request(b'/expensive')
+    _render(api, request)
+    assert _body(request) == 'expensive'
+
+    stats = api.stats
+    assert stats['rate_limited'] == 2
+    assert stats['rate_limiter']['allowed'] == 6
+
+
+def test_rate_limit_keyed_by_avatar():
+    api = _api(RateLimiter(rate=1, timer=_Clock()))
+
+    for avatar_id, expected in ((b'admin', None), (b'jblow', None), (b'admin', 429)):
+        request = _client_request(b'/cheap', avatar_id=avatar_id)
+        _render(api, request)
+        assert request.responseCode == expected
+
+
+def test_idle_buckets_evicted():
+    clock = _Clock()
+    limiter = RateLimiter(rate=10, burst=10, max_clients=3, timer=clock)
+
+    for index in range(5):
+        limiter.consume(_client_request(b'/', host='10.0.0.{}'.format(index)))
+    assert len(limiter) == 3
+
+    clock.now += 1
+    limiter.consume(_client_request(b'/', host='10.0.1.1'))
+    limiter.consume(_client_request(b'/', host='10.0.1.2'))
+    assert len(limiter) == 2
+    assert limiter.stats['evicted'] == 5
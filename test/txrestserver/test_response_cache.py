@@ -0,0 +1,185 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from twisted.internet.defer import Deferred
+from twisted.web.resource import getChildForRequest
+
+from txrestserver.cache import LRUCache
+from txrestserver.realm.realm import AvatarResource
+from txrestserver.txrestapi.encoder import EncodedJson
+from txrestserver.txrestapi.json_resource import JsonAPIResource
+from txrestserver.txrestapi.methods import GET, POST
+from txrestserver.txrestapi.response_cache import ResponseCache
+
+from test_json_resource import _body, _render, _request
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _CachedAPI(JsonAPIResource):
+    clock = _Clock()
+    totals_cache = ResponseCache(ttl=5, max_size=3, query_args=('window', ), timer=clock)
+    user_cache = ResponseCache(ttl=5, per_avatar=True, timer=clock)
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.pending = []
+
+    @GET(b'^/totals/(?P<name>[^/]*)$', cache=totals_cache)
+    def _on_totals(self, request, name):
+        self.calls += 1
+        if name == 'error':
+            raise ValueError('nope')
+        if name == 'deferred':
+            d = Deferred()
+            self.pending.append(d)
+            return d
+        return {'name': name, 'window': request.args.get(b'window', [b''])[0].decode(), 'calls': self.calls}
+
+    @POST(b'^/totals/(?P<name>[^/]*)$', cache=totals_cache)
+    def _on_post_totals(self, _request, name):
+        self.calls += 1
+        return self.calls
+
+    @GET(b'^/mine$', cache=user_cache)
+    def _on_mine(self, request):
+        self.calls += 1
+        return {'user': request.avatar_id.decode(), 'calls': self.calls}
+
+
+@pytest.fixture()
+def api():
+    _CachedAPI.totals_cache.clear()
+    _CachedAPI.user_cache.clear()
+    return _CachedAPI()
+
+
+def _get(api, path, window=None):
+    request = _request(path)
+    if window is not None:
+        request.args = {b'window': [window]}
+    _render(api, request)
+    return _body(request)
+
+
+def test_lru_cache_ttl():
+    clock = _Clock()
+    cache = LRUCache(2, ttl=10, timer=clock)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    assert 'a' in cache
+
+    clock.now += 10
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.stats['expirations'] == 1
+    assert len(cache) == 0
+
+    cache.put('b', None)
+    assert cache.pop('b', 'default') is None
+    assert cache.pop('b', 'default') == 'default'
+
+    with pytest.raises(ValueError):
+        LRUCache(2, ttl=0)
+
+
+def test_cached_responses(api):
+    first = _get(api, b'/totals/a', b'1h')
+    assert first == {'name': 'a', 'window': '1h', 'calls': 1}
+    assert _get(api, b'/totals/a', b'1h') == first
+    assert _get(api, b'/totals/a', b'1d')['calls'] == 2
+    assert _get(api, b'/totals/b', b'1h')['calls'] == 3
+    assert api.calls == 3
+
+    # Other methods and errors are not cached
+    request = _request(b'/totals/a', method=b'POST')
+    _render(api, request)
+    assert _body(request) == 4
+    assert _get(api, b'/totals/error')['status'] == 'ERROR'
+    assert _get(api, b'/totals/error')['status'] == 'ERROR'
+    assert api.calls == 6
+
+    assert _get(api, b'/totals/c')['calls'] == 7
+    _CachedAPI.clock.now += 5
+    assert _get(api, b'/totals/b', b'1h')['calls'] == 8
+
+    stats = api.stats['response_cache']['^/totals/(?P<name>[^/]*)$']
+    assert stats['hits'] == 1
+    assert stats['expirations'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_cached_deferred_response(api):
+    request = _request(b'/totals/deferred')
+    _render(api, request)
+    assert api.stats['response_cache']['^/totals/(?P<name>[^/]*)$']['size'] == 0
+
+    api.pending.pop().callback([1, 2, 3])
+    assert _body(request) == [1, 2, 3]
+    assert _get(api, b'/totals/deferred') == [1, 2, 3]
+    assert api.calls == 1
+
+
+def test_invalidation(api):
+    for name in (b'a', b'b'):
+        _get(api, b'/totals/' + name)
+    assert len(_CachedAPI.totals_cache) == 2
+
+    assert _CachedAPI.totals_cache.invalidate({'name': 'a'}) == 1
+    assert _get(api, b'/totals/a')['calls'] == 3
+    assert _get(api, b'/totals/b')['calls'] == 2
+
+    _CachedAPI.totals_cache.clear()
+    assert _get(api, b'/totals/b')['calls'] == 4
+
+
+def test_per_avatar_cache(api):
+    resources = {user: AvatarResource(api, user) for user in (b'admin', b'jblow')}
+
+    def get_as(user):
+        request = _request(b'/mine')
+        resource = getChildForRequest(resources[user], request)
+        request.write(resource.render(request))
+        return _body(request)
+
+    assert get_as(b'admin') == {'user': 'admin', 'calls': 1}
+    assert get_as(b'jblow') == {'user': 'jblow', 'calls': 2}
+    assert get_as(b'admin') == {'user': 'admin', 'calls': 1}
+
+    assert _CachedAPI.user_cache.invalidate(avatar_id=b'admin') == 1
+    assert get_as(b'admin')['calls'] == 3
+    assert get_as(b'jblow')['calls'] == 2
+
+
+def test_encoded_json_result():
+    api = JsonAPIResource()
+    api.register(b'GET', b'^/raw', lambda request: EncodedJson(b'{"raw":true}'))
+    request = _request(b'/raw')
+    _render(api, request)
+    assert request.written == [b'{"raw":true}']
+
+
+def test_stream_cache_rejected():
+    with pytest.raises(TypeError):
+        JsonAPIResource().register(b'GET', b'^/x', lambda request: None, stream=True,
+                                   cache=ResponseCache(ttl=1))
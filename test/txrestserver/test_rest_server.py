@@ -14,11 +14,22 @@
 
 import pytest
 import pytest_twisted
+from twisted.internet import reactor, task
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.endpoints import UNIXClientEndpoint
 from twisted.internet.error import CannotListenError
+from twisted.web.client import Agent, HTTPConnectionPool, readBody
+from twisted.web.iweb import IAgentEndpointFactory
+from zope.interface import implementer
 # from mock import MagicMock
 
 from txrestserver.rest_server import RestServer, DEFAULT_INTERFACE, DEFAULT_PORT
 from txrestserver.access.access import DEFAULT_ACCESS_CONTROL
+from txrestserver.access.tls_access import TlsSrpAccessConfig
+from txrestserver.realm.checkers import PasswordDictChecker
+from txrestserver.pools import DEFAULT_POOLS, WorkerPools
+from txrestserver.txrestapi.json_resource import JsonAPIResource
+from txrestserver.txrestapi.methods import GET
 
 from apis.api import MyRestAPI
 
@@ -145,3 +156,164 @@ def test_no_api_change_while_running():
     server.api = MyRestAPI()
 
     assert isinstance(server.api, MyRestAPI)
+
+
+@pytest_twisted.inlineCallbacks
+def test_api_settings_applied_on_start():
+    api = MyRestAPI()
+    api.worker_pools = WorkerPools()
+    server = RestServer(api, offload_threshold=5000, offload_pool_size=3)
+
+    assert api.offload_threshold is None
+    success = yield server.start()
+    assert success, 'Server failed to start'
+
+    assert api.offload_threshold == 5000
+    assert api.worker_pools.get(api.offload_pool).max_threads == 3
+    assert (yield server.stop())
+
+
+def test_pool_sizes_leave_default_pools_alone():
+    api = MyRestAPI()
+    assert api.worker_pools is DEFAULT_POOLS
+
+    server = RestServer(api, port=0, offload_pool_size=3, worker_pool_sizes={'blocking': 2})
+    server._configure_api()
+
+    assert api.worker_pools is not DEFAULT_POOLS
+    assert api.worker_pools.get(api.offload_pool).max_threads == 3
+    assert api.worker_pools.get('blocking').max_threads == 2
+    assert 'blocking' not in DEFAULT_POOLS._sizes
+    assert api.offload_pool not in DEFAULT_POOLS._sizes
+
+
+def test_default_api_not_shared():
+    configured = RestServer(port=0, etags=True)
+    configured._configure_api()
+
+    plain = RestServer(port=0)
+    assert plain.api is not configured.api
+    assert not plain.api.etags
+
+
+@pytest_twisted.inlineCallbacks
+def test_rest_server_multiple_endpoints(tmp_path):
+    path = str(tmp_path / 'api.sock')
+    server = RestServer(endpoints=['tcp:0:interface=127.0.0.1', 'unix:' + path])
+    assert (yield server.start())
+    assert server.is_running
+
+    tcp, unix = sorted(server.addresses, key=lambda address: hasattr(address, 'name'))
+    agent = Agent(reactor)
+    response = yield agent.request(b'GET', 'http://127.0.0.1:{}/tcp'.format(tcp.port).encode())
+    assert b'Hello world' in (yield readBody(response))
+
+    @implementer(IAgentEndpointFactory)
+    class _UnixFactory:
+        @staticmethod
+        def endpointForURI(_uri):
+            return UNIXClientEndpoint(reactor, path)
+
+    agent = Agent.usingEndpointFactory(reactor, _UnixFactory())
+    response = yield agent.request(b'GET', b'http://localhost/unix')
+    assert b'Hello world' in (yield readBody(response))
+
+    assert (yield server.stop())
+    assert not server.addresses
+
+
+def test_rest_server_endpoints_reject_tls_access():
+    # A 'tcp:' endpoint would serve the TLS protected API in cleartext
+    access_config = TlsSrpAccessConfig(PasswordDictChecker({}, {}))
+    with pytest.raises(ValueError):
+        RestServer(endpoints=['tcp:0:interface=127.0.0.1'], access_config=access_config)
+
+
+@pytest_twisted.inlineCallbacks
+def test_rest_server_endpoint_failure_closes_others():
+    server1 = RestServer(endpoints=['tcp:0:interface=127.0.0.1'])
+    assert (yield server1.start())
+    port = server1.addresses[0].port
+
+    server2 = RestServer(endpoints=['tcp:0:interface=127.0.0.1',
+                                    'tcp:{}:interface=127.0.0.1'.format(port)])
+    with pytest.raises(CannotListenError):
+        yield server2.start()
+
+    assert not server2.is_running
+    assert not server2.addresses
+    assert (yield server1.stop())
+
+
+class _SlowAPI(JsonAPIResource):
+    pending = []
+
+    @staticmethod
+    @GET(b'^/slow$')
+    def _on_slow(_request):
+        d = Deferred()
+        _SlowAPI.pending.append(d)
+        return d
+
+    @staticmethod
+    @GET(b'^/fast$')
+    def _on_fast(_request):
+        return 'fast'
+
+
+@inlineCallbacks
+def _start_slow_server():
+    _SlowAPI.pending.clear()
+    server = RestServer(api=_SlowAPI(), endpoints=['tcp:0:interface=127.0.0.1'])
+    assert (yield server.start())
+    url = 'http://127.0.0.1:{}'.format(server.addresses[0].port)
+    return server, url
+
+
+@inlineCallbacks
+def _wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        yield task.deferLater(reactor, 0.01, lambda: None)
+    assert condition()
+
+
+@pytest_twisted.inlineCallbacks
+def test_rest_server_stop_drains_requests():
+    server, url = yield _start_slow_server()
+    pool = HTTPConnectionPool(reactor, persistent=True)
+    agent = Agent(reactor, pool=pool)
+
+    # An idle keep-alive connection and a request in progress
+    response = yield agent.request(b'GET', (url + '/fast').encode())
+    yield readBody(response)
+    slow = Agent(reactor).request(b'GET', (url + '/slow').encode())
+    yield _wait_for(lambda: _SlowAPI.pending)
+    assert server.connections.stats['in_flight'] == 1
+
+    stopped = server.stop(timeout=10)
+    assert not stopped.called
+    assert not server.is_running
+
+    _SlowAPI.pending[0].callback('done')
+    response = yield slow
+    assert response.code == 200
+    assert (yield readBody(response)) == b'"done"'
+
+    assert (yield stopped)
+    assert server.connections.stats['connections'] == 0
+    assert server.aborted_requests == 0
+    yield pool.closeCachedConnections()
+
+
+@pytest_twisted.inlineCallbacks
+def test_rest_server_stop_aborts_after_timeout():
+    server, url = yield _start_slow_server()
+    slow = Agent(reactor).request(b'GET', (url + '/slow').encode())
+    slow.addErrback(lambda _: None)
+    yield _wait_for(lambda: _SlowAPI.pending)
+
+    assert (yield server.stop(timeout=0.05))
+    assert server.aborted_requests == 1
+    assert server.connections.stats['connections'] == 0
@@ -0,0 +1,97 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import pytest
+
+from txrestserver.txrestapi.router import RouteTree, parse_route
+
+from apis.api import MyRestAPI, VERSION_PATH
+
+PATTERNS = [
+    (b'GET', br'^/version'),
+    (b'GET', br'^/examples$'),
+    (b'GET', br'^/example/(?P<key>[^/]*)/?'),
+    (b'PUT', br'^/example/(?P<key>[^/]+)/?$'),
+    (b'GET', br'^/example/(?P<key>[^/]*)/entry/(?P<entry>[^/]+)'),
+    (b'ALL', br'^/any/'),
+    (b'GET', br'^/a/(?P<b>[^/]*)/c/?'),
+    (b'GET', br'^/a/b/c'),
+    (b'GET', br'/tail$'),
+    (b'POST', br'^/v1\.0/items'),
+    (b'GET', br'^/$'),
+    (b'ALL', br'^/.*$'),
+]
+
+PATHS = [b'/version', b'/versions/1', b'/examples', b'/examples/', b'/example', b'/example/',
+         b'/example/abc', b'/example/abc/', b'/example/abc/entry/1', b'/example/abc/entry/',
+         b'/any', b'/any/', b'/any/thing', b'/a/b/c', b'/a/x/c/d', b'/a//c', b'/tail', b'/x/tail',
+         b'/v1.0/items', b'/v1x0/items', b'/', b'', b'relative/path', b'/nothing/here']
+
+
+def _linear(registry, method, path):
+    for m, r, cb in registry:
+        if m in (method, b'ALL'):
+            result = r.search(path)
+            if result:
+                return cb, result.groupdict(), result.end()
+    return None, None, None
+
+
+@pytest.mark.parametrize('count', range(1, len(PATTERNS) + 1))
+def test_tree_matches_linear_scan(count):
+    registry = [(m, re.compile(p), i) for i, (m, p) in enumerate(PATTERNS[:count])]
+    tree = RouteTree(registry)
+
+    for method in (b'GET', b'PUT', b'POST', b'DELETE', b'ALL'):
+        for path in PATHS:
+            assert tree.lookup(method, path) == _linear(registry, method, path), (method, path)
+
+
+def test_reversed_registration_order():
+    registry = [(m, re.compile(p), i) for i, (m, p) in enumerate(reversed(PATTERNS))]
+    tree = RouteTree(registry)
+
+    for path in PATHS:
+        assert tree.lookup(b'GET', path) == _linear(registry, b'GET', path), path
+
+
+def test_only_complex_patterns_use_regex():
+    assert parse_route(r'^/example/(?P<key>[^/]*)/?') is not None
+    assert parse_route(r'^/version') is not None
+    assert parse_route(r'^/.*$') is None
+    assert parse_route(r'/tail$') is None
+
+    registry = [(m, re.compile(p), i) for i, (m, p) in enumerate(PATTERNS)]
+    assert RouteTree(registry).regex_routes == 3
+
+
+class _Request:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+
+
+def test_compiled_api_resource():
+    linear_api, compiled_api = MyRestAPI(), MyRestAPI()
+    compiled_api.compiled_routes = True
+
+    for path in (b'/version', b'/examples', b'/example/abc', b'/example/abc/more', b'/unknown'):
+        linear_request, compiled_request = _Request(b'GET', path), _Request(b'GET', path)
+        assert compiled_api._get_callback(compiled_request) == linear_api._get_callback(linear_request)
+        assert getattr(compiled_request, '_remaining_path', None) == getattr(linear_request, '_remaining_path', None)
+
+    # Registry changes rebuild the tree
+    compiled_api.unregister(regex=VERSION_PATH)
+    assert compiled_api._get_callback(_Request(b'GET', b'/version')) == (None, None)
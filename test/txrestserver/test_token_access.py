@@ -0,0 +1,135 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import json
+
+import pytest
+import pytest_twisted
+from twisted.internet import reactor
+from twisted.web.client import Agent, readBody
+from twisted.web.http_headers import Headers
+
+from txrestserver.access.access import AccessConfig, AuthenticationMethods
+from txrestserver.access.token_access import InvalidToken, WebTokenAccessConfig, WebTokenSigner
+from txrestserver.realm.checkers import PasswordDictChecker
+from txrestserver.rest_server import RestServer
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+def test_web_token_method_is_distinct():
+    assert AuthenticationMethods.WebToken != AuthenticationMethods.TLS_SRP
+    assert AccessConfig(AuthenticationMethods.WebToken).access_method == AuthenticationMethods.WebToken
+
+
+def test_signer_issue_and_verify():
+    now = [1000.0]
+    signer = WebTokenSigner({'k1': b'x' * 32}, ttl=60, timer=lambda: now[0])
+    token = signer.issue(b'admin', role='ops')
+
+    claims = signer.verify(token)
+    assert claims['sub'] == 'admin' and claims['role'] == 'ops' and claims['exp'] == 1060
+
+    header, payload, signature = token.split(b'.')
+    forged = json.loads(base64.urlsafe_b64decode(payload + b'==='))
+    forged['sub'] = 'root'
+    forged = base64.urlsafe_b64encode(json.dumps(forged).encode()).rstrip(b'=')
+    unsigned = base64.urlsafe_b64encode(b'{"alg":"none","kid":"k1"}').rstrip(b'=')
+
+    for bad in (header + b'.' + forged + b'.' + signature, unsigned + b'.' + payload + b'.',
+                b'garbage', token[:-2]):
+        with pytest.raises(InvalidToken):
+            signer.verify(bad)
+
+    now[0] = 1060
+    with pytest.raises(InvalidToken, match='expired'):
+        signer.verify(token)
+    assert signer.stats == {'keys': 1, 'issued': 1, 'verified': 1, 'rejected': 5, 'revoked': 0}
+
+
+def test_signer_key_rotation_and_revocation():
+    now = [1000.0]
+    signer = WebTokenSigner({'k1': b'x' * 32}, ttl=60, timer=lambda: now[0])
+    old = signer.issue('admin')
+
+    signer.add_key('k2', b'y' * 32, signing=True)
+    new = signer.issue('admin')
+    assert signer.verify(old) and signer.verify(new)
+
+    with pytest.raises(ValueError):
+        signer.remove_key('k2')
+    signer.remove_key('k1')
+    with pytest.raises(InvalidToken):
+        signer.verify(old)
+
+    other = signer.issue('jblow')
+    signer.revoke(new)
+    with pytest.raises(InvalidToken, match='revoked'):
+        signer.verify(new)
+    assert signer.verify(other)
+
+    now[0] = 1001
+    signer.revoke_subject('jblow')
+    with pytest.raises(InvalidToken, match='revoked'):
+        signer.verify(other)
+
+    # Revocations are forgotten once the tokens have expired
+    now[0] = 1100
+    signer.revoke(signer.issue('admin'))
+    assert signer.stats['revoked'] == 1
+
+
+@pytest_twisted.inlineCallbacks
+def test_web_token_server():
+    checker = PasswordDictChecker({b'admin': 'Administrator'}, {b'admin': b'admin'})
+    config = WebTokenAccessConfig(checker)
+    server = RestServer(access_config=config, endpoints=['tcp:0:interface=127.0.0.1'])
+    yield server.start()
+    try:
+        agent = Agent(reactor)
+        base = 'http://127.0.0.1:{}/'.format(server.addresses[0].port)
+
+        def get(path, headers):
+            return agent.request(b'GET', (base + path).encode(), Headers(headers))
+
+        basic = b'Basic ' + base64.b64encode(b'admin:admin')
+        response = yield get('anything', {b'authorization': [basic]})
+        assert response.code == 401
+        assert response.headers.getRawHeaders(b'www-authenticate')[0].lower().startswith(b'bearer')
+        yield readBody(response)
+
+        response = yield agent.request(b'POST', (base + 'token').encode(),
+                                       Headers({b'authorization': [b'Basic ' + base64.b64encode(b'admin:bad')]}))
+        assert response.code == 401
+        yield readBody(response)
+
+        response = yield agent.request(b'POST', (base + 'token').encode(),
+                                       Headers({b'authorization': [basic]}))
+        assert response.code == 200
+        body = json.loads((yield readBody(response)))
+        assert body['token_type'] == 'Bearer'
+
+        bearer = b'Bearer ' + body['access_token'].encode()
+        response = yield get('anything', {b'authorization': [bearer]})
+        assert response.code == 200
+        assert b'hello world' in (yield readBody(response)).lower()
+
+        config.signer.revoke(body['access_token'].encode())
+        response = yield get('anything', {b'authorization': [bearer]})
+        assert response.code == 401
+        yield readBody(response)
+
+    finally:
+        yield server.stop()
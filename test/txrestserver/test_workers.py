@@ -0,0 +1,134 @@
+# Copyright 2020, Boling Consulting Solutions
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##################################################################################
+#
+#  Multi-process worker mode, runs real worker processes
+#
+##################################################################################
+
+import json
+import os
+import signal
+import socket
+
+import pytest
+import pytest_twisted
+from twisted.internet import reactor, task
+from twisted.web.client import Agent, readBody
+
+from txrestserver.rest_server import RestServer
+from txrestserver.txrestapi.json_resource import JsonAPIResource
+from txrestserver.txrestapi.methods import GET
+from txrestserver.workers import WorkerSupervisor, load_factory
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+class _PidAPI(JsonAPIResource):
+    @staticmethod
+    @GET(b'^/pid$')
+    def _on_pid(_request):
+        return {'pid': os.getpid()}
+
+
+def make_server():
+    """ Worker factory """
+    return RestServer(api=_PidAPI())
+
+
+def make_supervising_server():
+    """ Worker factory that reuses the supervisor's configuration, including 'workers' """
+    return RestServer(api=_PidAPI(), port=0, interface='127.0.0.1', workers=2,
+                      worker_factory='test_workers:make_supervising_server')
+
+
+def test_load_factory():
+    assert load_factory('test_workers:make_server') is make_server
+
+    with pytest.raises(ValueError):
+        load_factory('test_workers')
+
+
+def test_worker_mode_requires_factory():
+    with pytest.raises(ValueError):
+        WorkerSupervisor('no_callable', 1, 0)
+
+    server = RestServer(port=0, workers=2)
+    d = server.start()
+    failures = []
+    d.addErrback(failures.append)
+    assert failures and failures[0].check(ValueError)
+    assert not server.is_running
+
+
+@pytest_twisted.inlineCallbacks
+def test_workers_share_socket_and_restart():
+    server = RestServer(port=0, interface='127.0.0.1', workers=2, worker_restart_delay=0.1,
+                        worker_factory='test_workers:make_server')
+    yield server.start()
+    try:
+        assert server.port != 0
+        supervisor = server.workers
+        assert len(supervisor.pids) == 2
+
+        agent = Agent(reactor)
+        url = 'http://127.0.0.1:{}/pid'.format(server.port).encode()
+        body = None
+        for _ in range(100):            # Wait for the workers to start serving
+            try:
+                response = yield agent.request(b'GET', url)
+                body = yield readBody(response)
+                break
+            except Exception:           # pylint: disable=broad-except
+                yield task.deferLater(reactor, 0.1, lambda: None)
+
+        assert json.loads(body)['pid'] in supervisor.pids
+
+        os.kill(supervisor.pids[0], signal.SIGKILL)
+        for _ in range(100):
+            if supervisor.stats['restarts'] == 1 and supervisor.stats['running'] == 2:
+                break
+            yield task.deferLater(reactor, 0.1, lambda: None)
+
+        assert supervisor.stats == {'workers': 2, 'running': 2, 'restarts': 1}
+
+    finally:
+        stopped = yield server.stop()
+
+    assert stopped is True
+    assert not server.workers.pids
+
+
+@pytest_twisted.inlineCallbacks
+def test_worker_server_with_workers_adopts_socket():
+    listening = socket.create_server(('127.0.0.1', 0))
+    listening.setblocking(False)
+    port = listening.getsockname()[1]
+    try:
+        server = make_supervising_server()
+        server.adopt(os.dup(listening.fileno()), socket.AF_INET)
+        yield server.start()
+        try:
+            # Serves on the adopted socket rather than spawning workers of its own
+            assert server.workers is None
+            assert [address.port for address in server.addresses] == [port]
+
+            response = yield Agent(reactor).request(b'GET', 'http://127.0.0.1:{}/pid'.format(port).encode())
+            body = yield readBody(response)
+            assert json.loads(body)['pid'] == os.getpid()
+
+        finally:
+            yield server.stop()
+    finally:
+        listening.close()